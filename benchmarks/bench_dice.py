@@ -0,0 +1,47 @@
+"""
+Compares Dice.roll_many(n) against n calls to Dice.roll() for every roll
+mode. Run from the repository root:
+    python -m benchmarks.bench_dice [n]
+"""
+import sys
+from timeit import timeit
+from entities import Dice
+
+
+CONFIGURATIONS = {
+    "1d20": dict(dice_size=20),
+    "12d8": dict(dice_size=8, dice_number=12),
+    "1d20 advantage": dict(dice_size=20, roll_type="advantage"),
+    "12d8 disadvantage": dict(dice_size=8, dice_number=12, roll_type="disadvantage"),
+    "4d6 drop lowest": dict(dice_size=6, dice_number=4, drop_number=1),
+    "5d6 drop 2 highest": dict(dice_size=6, dice_number=5, drop_number=2,
+                               highest=False),
+}
+
+
+def run(n=100_000, repeat=3):
+    """
+    Times both rolling paths for each configuration and returns a list of
+    (name, loop_seconds, batch_seconds) tuples. The best of repeat runs is
+    kept for each path.
+    :param n: int, number of rolls per run
+    :param repeat: int, number of runs per path
+    :return: list of tuple
+    """
+    results = []
+    for name, kwargs in CONFIGURATIONS.items():
+        die = Dice(**kwargs)
+        loop_time = min(timeit(lambda: [die.roll() for _ in range(n)], number=1)
+                        for _ in range(repeat))
+        batch_time = min(timeit(lambda: die.roll_many(n), number=1)
+                         for _ in range(repeat))
+        results.append((name, loop_time, batch_time))
+    return results
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{'configuration':<22}{'roll() x n':>14}{'roll_many(n)':>14}{'speedup':>10}")
+    for name, loop_time, batch_time in run(n):
+        print(f"{name:<22}{loop_time:>13.4f}s{batch_time:>13.4f}s"
+              f"{loop_time / batch_time:>9.1f}x")
@@ -0,0 +1,46 @@
+"""
+Scaling benchmark for generate_world() with 1, 2, 4, and 8 workers. Also
+checks that every worker count produces identical output. Run from the
+repository root:
+    python -m benchmarks.bench_parallel [pois_per_type]
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+from benchmarks.synthetic_workbook import write_synthetic_workbook
+from entities import generate_world
+
+
+def run(count=200_000, worker_counts=(1, 2, 4, 8), seed=1234):
+    """
+    Times generate_world() for each worker count.
+    :param count: int, POIs of each type
+    :param worker_counts: tuple of int
+    :param seed: int
+    :return: list of tuple, (workers, seconds, identical_to_first)
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        workbook = os.path.join(directory, "tables.xlsx")
+        write_synthetic_workbook(workbook)
+        requests = {'adventure_site': count, 'divine_poi': count}
+        reference = None
+        for workers in worker_counts:
+            start = perf_counter()
+            world = generate_world(requests, workbook, seed, workers=workers)
+            elapsed = perf_counter() - start
+            if reference is None:
+                reference = world
+            identical = all(world[k].equals(reference[k]) for k in requests)
+            results.append((workers, elapsed, identical))
+    return results
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"{'workers':>8}{'seconds':>10}{'speedup':>10}  identical")
+    baseline = None
+    for workers, elapsed, identical in run(count):
+        baseline = baseline or elapsed
+        print(f"{workers:>8}{elapsed:>10.3f}{baseline / elapsed:>9.2f}x  {identical}")
@@ -0,0 +1,91 @@
+"""
+Guards the light startup path: importing Dice, return_die_roll, and
+get_dice_info must not import pandas or openpyxl. The import is run in a
+fresh interpreter under -X importtime, and the slowest imports are listed.
+Run from the repository root:
+    python -m benchmarks.import_time [--budget-ms 400]
+The exit status is 1 when a heavy module is imported or, with --budget-ms,
+when the import takes longer than the budget.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+LIGHT_IMPORT = ("from entities import Dice, return_die_roll; "
+                "from functions import get_dice_info")
+
+# Modules the light path must never load.
+HEAVY_MODULES = ("pandas", "openpyxl")
+
+
+def measure(statement=LIGHT_IMPORT, runs=3):
+    """
+    Runs statement in fresh interpreters under -X importtime.
+    :param statement: str, Python code to run
+    :param runs: int, the best of runs is reported, defaults to 3
+    :return: tuple, (total_us, modules) from parse_importtime() for the
+        run with the smallest total
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                                   cwd=root, capture_output=True, text=True, check=True)
+        total, modules = parse_importtime(completed.stderr)
+        if best is None or total < best[0]:
+            best = (total, modules)
+    return best
+
+
+def parse_importtime(output):
+    """
+    Parses -X importtime output.
+    :param output: str, the interpreter's stderr
+    :return: tuple, (total_us, modules) where total_us sums the cumulative
+        times of the outermost imports and modules maps every module name to
+        its cumulative microseconds
+    """
+    total_us = 0
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented two spaces per level after the one
+        # space that follows the bar.
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative_us)
+        modules[name.strip()] = int(cumulative_us)
+    return total_us, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of the "
+                                                 "light Dice path.")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    total_us, modules = measure()
+    print(f"import: {LIGHT_IMPORT}")
+    print(f"total: {total_us / 1000:.1f} ms")
+    for name, us in sorted(modules.items(), key=lambda item: item[1],
+                           reverse=True)[:args.top]:
+        print(f"{us / 1000:>10.1f} ms  {name}")
+
+    failed = False
+    heavy = [m for m in HEAVY_MODULES if m in modules]
+    if heavy:
+        print(f"FAIL: the light path imported {heavy}.")
+        failed = True
+    if args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+        print(f"FAIL: {total_us / 1000:.1f} ms is over the budget of "
+              f"{args.budget_ms:.1f} ms.")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Load test for poi_server.py. Starts the server on a synthetic workbook (or
+targets a running one with --port), opens --connections keep-alive
+connections, and sends a mix of small unseeded roll, lookup, and generate
+requests as fast as the server answers them. Reports requests per second
+and the p50 and p99 latency of each kind of request. Run from the
+repository root:
+    python -m benchmarks.load_test [--requests 5000] [--connections 32]
+    python -m benchmarks.load_test --window-ms 0     batching turned off
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+import numpy as np
+from benchmarks.synthetic_workbook import write_synthetic_workbook
+
+
+# Each kind of request, with its path and body. Kept small, as the tools
+# that call the server send them.
+REQUESTS = {
+    'roll': ("/roll", {'expression': "3d6", 'n': 1}),
+    'lookup': ("/lookup", {'table': "Divine POI", 'roll': 7}),
+    'generate': ("/generate", {'type': "divine_poi", 'n': 5}),
+}
+
+
+async def _request(reader, writer, path, body):
+    data = json.dumps(body).encode()
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                 f"\r\n".encode() + data)
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    payload = await reader.readexactly(length)
+    status = int(status_line.split()[1])
+    if status != 200:
+        raise RuntimeError(f"load_test: {path} returned {status}: {payload.decode()}")
+    return payload
+
+
+async def _client(port, kinds, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for kind in kinds:
+            path, body = REQUESTS[kind]
+            start = perf_counter()
+            await _request(reader, writer, path, body)
+            latencies[kind].append(perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load(port, requests, connections, seed=0):
+    """
+    Sends requests requests, spread evenly over the kinds in REQUESTS and
+    over connections concurrent connections.
+    :param port: int
+    :param requests: int
+    :param connections: int
+    :param seed: int, shuffles the mix, defaults to 0
+    :return: tuple, (seconds, latencies) where latencies maps each kind to
+        a list of seconds
+    """
+    kinds = np.resize(list(REQUESTS), requests)
+    np.random.default_rng(seed).shuffle(kinds)
+    latencies = {kind: [] for kind in REQUESTS}
+    start = perf_counter()
+    await asyncio.gather(*(_client(port, kinds[i::connections].tolist(), latencies)
+                           for i in range(connections)))
+    return perf_counter() - start, latencies
+
+
+def start_server(workbook, window_ms):
+    """
+    Starts poi_server.py on a free port in a subprocess.
+    :param workbook: str
+    :param window_ms: float
+    :return: tuple, (process, port)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, "poi_server.py", workbook, "--port", "0",
+                                "--window-ms", str(window_ms), "--no-cache"],
+                               cwd=root, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if "http://" not in line:
+        process.kill()
+        raise RuntimeError(f"load_test: The server did not start: {line!r}")
+    return process, int(line.rsplit(":", 1)[1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test poi_server.py.")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--port", type=int, default=None,
+                        help="test a server already running on this port")
+    parser.add_argument("--window-ms", type=float, default=2.0,
+                        help="batching window of the server started here")
+    args = parser.parse_args(argv)
+
+    process = None
+    with tempfile.TemporaryDirectory() as directory:
+        port = args.port
+        if port is None:
+            workbook = os.path.join(directory, "tables.xlsx")
+            write_synthetic_workbook(workbook)
+            process, port = start_server(workbook, args.window_ms)
+        try:
+            # A short warm-up, so the timings do not include first calls.
+            asyncio.run(load(port, 100, 4))
+            seconds, latencies = asyncio.run(load(port, args.requests, args.connections))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    print(f"{args.requests} requests over {args.connections} connections in "
+          f"{seconds:.2f} s: {args.requests / seconds:.0f} requests/s")
+    print(f"{'request':<12}{'count':>8}{'p50':>12}{'p99':>12}")
+    every = []
+    for kind, times in latencies.items():
+        every.extend(times)
+        p50, p99 = np.percentile(times, [50, 99]) * 1000
+        print(f"{kind:<12}{len(times):>8}{p50:>10.2f}ms{p99:>10.2f}ms")
+    p50, p99 = np.percentile(every, [50, 99]) * 1000
+    print(f"{'all':<12}{len(every):>8}{p50:>10.2f}ms{p99:>10.2f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
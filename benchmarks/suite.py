@@ -0,0 +1,279 @@
+"""
+Regression benchmark suite for dice, range parsing, table lookups, workbook
+checks, and POI construction. Every benchmark runs against synthetic
+workbooks written to a temporary directory, so nothing depends on
+../data_orig/tables.xlsx. Run from the repository root:
+    python -m benchmarks.suite                record nothing, just report
+    python -m benchmarks.suite --save         record the results as baseline
+    python -m benchmarks.suite -k lookup      run the matching benchmarks only
+When a baseline exists, each result is compared with it and benchmarks that
+got slower by more than the threshold (25% by default) are flagged. The
+exit status is 1 when any benchmark is flagged, so the suite can gate CI.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from timeit import Timer
+import numpy as np
+from benchmarks.bench_dice import CONFIGURATIONS
+from benchmarks.synthetic_workbook import make_table, write_synthetic_workbook
+from entities import AdventureSite, Dice, return_die_roll
+from entities.generation import roll_on_table, sample_table
+from functions import TableRegistry, check_workbook, compile_table, get_dice_info, \
+    get_table_result, return_range
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Relative slowdown, against the baseline, at which a benchmark is flagged.
+THRESHOLD = 1.25
+
+# Each benchmark maps a name to a setup function. The setup function takes
+# the shared context and returns the zero-argument callable that is timed.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers the decorated setup function under name.
+    :param name: str
+    :return: decorator
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+for _name, _kwargs in CONFIGURATIONS.items():
+    @benchmark(f"dice.roll[{_name}]")
+    def _dice_roll(context, _kwargs=_kwargs):
+        return Dice(**_kwargs, rng=0).roll
+
+
+@benchmark("return_die_roll[3d6]")
+def _return_die_roll(context):
+    return lambda: return_die_roll('3d6', rng=context['rng'])
+
+
+@benchmark("return_die_roll[4d6kh3+2]")
+def _return_die_roll_expression(context):
+    return lambda: return_die_roll('4d6kh3+2', rng=context['rng'])
+
+
+@benchmark("get_dice_info[2d10]")
+def _get_dice_info(context):
+    return lambda: get_dice_info('2d10')
+
+
+@benchmark("return_range[11-19]")
+def _return_range(context):
+    return lambda: return_range('11-19')
+
+
+@benchmark("return_range[ 6 - 10 ]")
+def _return_range_spaces(context):
+    return lambda: return_range(' 6 - 10 ')
+
+
+for _rows in (10, 100, 1000):
+    @benchmark(f"get_table_result[{_rows} rows, DataFrame]")
+    def _lookup_frame(context, _rows=_rows):
+        table = context['tables'][_rows]
+        return lambda: get_table_result(table, _rows)
+
+    @benchmark(f"get_table_result[{_rows} rows, compiled]")
+    def _lookup_compiled(context, _rows=_rows):
+        compiled = compile_table(context['tables'][_rows])
+        return lambda: get_table_result(compiled, _rows)
+
+    @benchmark(f"get_table_result[{_rows} rows, trusted]")
+    def _lookup_trusted(context, _rows=_rows):
+        compiled = compile_table(context['tables'][_rows])
+        compiled.mark_trusted()
+        return lambda: get_table_result(compiled, _rows)
+
+
+for _rows in (10, 1000):
+    @benchmark(f"roll_on_table[{_rows} rows, 1000 draws]")
+    def _roll_on_table(context, _rows=_rows):
+        compiled = compile_table(context['tables'][_rows])
+        return lambda: roll_on_table(compiled, 1000, rng=context['rng'])
+
+    @benchmark(f"sample_table[{_rows} rows, 1000 draws]")
+    def _sample_table(context, _rows=_rows):
+        compiled = compile_table(context['tables'][_rows])
+        compiled.alias_table()
+        return lambda: sample_table(compiled, 1000, rng=context['rng'])
+
+
+for _sheets in (4, 20, 100):
+    @benchmark(f"check_workbook[{_sheets} sheets]")
+    def _check_workbook(context, _sheets=_sheets):
+        path = context['workbooks'][_sheets]
+        return lambda: check_workbook(path, ['POI Discoverability'])
+
+
+@benchmark("AdventureSite[registry]")
+def _adventure_site_registry(context):
+    registry = context['registry']
+    return lambda: AdventureSite('POI Discoverability', registry=registry,
+                                 rng=context['rng'])
+
+
+@benchmark("AdventureSite[DataFrame]")
+def _adventure_site_frame(context):
+    table = context['registry']['POI Discoverability']
+    return lambda: AdventureSite(table, rng=context['rng'])
+
+
+def make_context(directory):
+    """
+    Writes the synthetic workbooks and tables every benchmark draws on.
+    :param directory: str, a scratch directory
+    :return: dict
+    """
+    workbooks = {}
+    for sheets in (4, 20, 100):
+        path = os.path.join(directory, f"tables_{sheets}.xlsx")
+        write_synthetic_workbook(path, extra_sheets=sheets - 4)
+        workbooks[sheets] = path
+    return {
+        'rng': np.random.default_rng(0),
+        'tables': {rows: make_table(rows, seed=rows) for rows in (10, 100, 1000)},
+        'workbooks': workbooks,
+        'registry': TableRegistry(workbooks[4]),
+    }
+
+
+def time_call(func, repeat=5, min_time=0.2):
+    """
+    Returns the best time per call of func, in seconds. The number of calls
+    per run is grown until a run takes at least min_time, and the best of
+    repeat runs is kept.
+    :param func: callable
+    :param repeat: int, defaults to 5
+    :param min_time: float, defaults to 0.2
+    :return: float
+    """
+    timer = Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    best = min([elapsed] + timer.repeat(repeat=repeat - 1, number=number))
+    return best / number
+
+
+def run(pattern=None, repeat=5, min_time=0.2):
+    """
+    Runs every benchmark whose name contains pattern.
+    :param pattern: str, defaults to None, which runs them all
+    :param repeat: int, defaults to 5
+    :param min_time: float, defaults to 0.2
+    :return: dict, maps benchmark names to seconds per call
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        context = make_context(directory)
+        for name, setup in BENCHMARKS.items():
+            if pattern is not None and pattern not in name:
+                continue
+            results[name] = time_call(setup(context), repeat=repeat, min_time=min_time)
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    """
+    Returns the recorded baseline, or None if there is none.
+    :param path: str, defaults to BASELINE_PATH
+    :return: dict or NoneType, with 'machine' and 'results' keys
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """
+    Records results as the baseline, merged into any existing baseline so
+    running a subset with -k only replaces those entries.
+    :param results: dict, maps benchmark names to seconds per call
+    :param path: str, defaults to BASELINE_PATH
+    :return:
+    """
+    baseline = load_baseline(path) or {'results': {}}
+    baseline['machine'] = machine_info()
+    baseline['results'].update(results)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def machine_info():
+    """
+    Describes the machine the results came from. Baselines are only
+    comparable on the same machine and Python.
+    :return: dict
+    """
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    Compares results with the baseline.
+    :param results: dict, maps benchmark names to seconds per call
+    :param baseline: dict or NoneType, as returned by load_baseline()
+    :param threshold: float, defaults to THRESHOLD
+    :return: list of tuple, (name, seconds, ratio, flagged), where ratio is
+        seconds over the baseline, or None when there is no baseline entry
+    """
+    recorded = baseline['results'] if baseline else {}
+    rows = []
+    for name, seconds in results.items():
+        ratio = seconds / recorded[name] if name in recorded else None
+        rows.append((name, seconds, ratio, ratio is not None and ratio > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark dice, lookups, workbook checks, and POI construction.")
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks containing this")
+    parser.add_argument("--save", action="store_true", help="record results as baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run(args.pattern, repeat=args.repeat, min_time=args.min_time)
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline.get('machine') != machine_info():
+        print(f"warning: the baseline was recorded on {baseline.get('machine')}; "
+              f"comparisons may not be meaningful.")
+    rows = compare(results, baseline, args.threshold)
+    print(f"{'benchmark':<44}{'time/call':>12}{'vs baseline':>14}")
+    for name, seconds, ratio, flagged in rows:
+        change = "" if ratio is None else f"{ratio:.2f}x"
+        flag = "  SLOWER" if flagged else ""
+        print(f"{name:<44}{seconds * 1e6:>10.2f}us{change:>14}{flag}")
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"baseline saved to {args.baseline}")
+    return 1 if any(flagged for *_, flagged in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
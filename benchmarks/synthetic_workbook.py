@@ -0,0 +1,65 @@
+"""
+Writes synthetic tables.xlsx-style workbooks so the benchmarks do not depend
+on the real data files.
+"""
+import numpy as np
+import pandas as pd
+
+
+def make_table(rows, header=None, result_col='Result', seed=0):
+    """
+    Returns a valid roll table with the given number of rows. The header
+    defaults to 'd<rows * 2>', and every row covers two roll values.
+    :param rows: int
+    :param header: str, defaults to None
+    :param result_col: str, defaults to 'Result'
+    :param seed: int, defaults to 0
+    :return: pd.DataFrame
+    """
+    if header is None:
+        header = f"d{rows * 2}"
+    rng = np.random.default_rng(seed)
+    ranges = [f"{2 * i + 1}-{2 * i + 2}" for i in range(rows)]
+    results = [f"result {i} ({rng.integers(1000)})" for i in range(rows)]
+    return pd.DataFrame({header: ranges, result_col: results})
+
+
+def standard_tables():
+    """
+    Returns the four worksheets the POI classes use, filled with synthetic
+    rows.
+    :return: dict, maps worksheet names to DataFrames
+    """
+    return {
+        'POI Discoverability': pd.DataFrame({
+            '2d6': ['2-4', '5-9', '10-12'],
+            'Result': ['hidden', 'obscure', 'obvious']}),
+        'Divine POI': make_table(10, header='d20', seed=1),
+        'Current Divine Factions': pd.DataFrame({
+            'd8': ['1-2', '3-4', '5-6', '7-8'],
+            'Faction': ['Sun Order', 'Moon Cult', 'Tide Court', 'Ash Circle'],
+            'Alignment': ['LG', 'CE', 'N', 'LE'],
+            'Domain': ['Light', 'Trickery', None, 'Death']}),
+        'Divine Faction Action': pd.DataFrame({
+            'd6': ['1-3', '4-5', '6'],
+            'Result': ['use existing faction', 'make an off-shoot',
+                       'create new faction']}),
+    }
+
+
+def write_synthetic_workbook(path, extra_sheets=0, rows=50):
+    """
+    Writes the standard worksheets plus extra_sheets additional tables of
+    the given number of rows to path.
+    :param path: str, destination .xlsx path
+    :param extra_sheets: int, defaults to 0
+    :param rows: int, rows per extra table, defaults to 50
+    :return: list of str, the worksheet names written
+    """
+    tables = standard_tables()
+    for i in range(extra_sheets):
+        tables[f"Table {i:03d}"] = make_table(rows, seed=100 + i)
+    with pd.ExcelWriter(path) as writer:
+        for name, table in tables.items():
+            table.to_excel(writer, sheet_name=name, index=False)
+    return list(tables)
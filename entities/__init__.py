@@ -1,2 +1,36 @@
-from .dice import Dice, return_die_roll
-from .point_of_interest import AdventureSite
+# Dice is imported up front and does not need pandas. The POI classes and
+# the generators, which read workbooks, are imported the first time one of
+# their names is used (see __getattr__).
+_LAZY = {
+    'AdventureSite': 'point_of_interest',
+    'DivinePOI': 'point_of_interest',
+    'generate_adventure_sites': 'generation',
+    'generate_divine_pois': 'generation',
+    'iter_adventure_sites': 'generation',
+    'iter_divine_pois': 'generation',
+    'reroll': 'generation',
+    'generate_world': 'parallel_generation',
+    'GenerationService': 'generation_service',
+    'GenerationJob': 'generation_service',
+    'write_pois': 'export',
+    'read_pois': 'export',
+    'poi_from_record': 'export',
+    'TableGraph': 'table_chains',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f"{__name__}.{module_name}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+from .dice import Dice, DiceExpression, compile_dice_expression, return_die_roll
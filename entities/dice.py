@@ -1,4 +1,24 @@
-from random import randint
+import logging
+import numpy as np
+from functools import lru_cache
+from functions import get_rng, dice_pmf, table_result_probabilities, parse_dice_expression, \
+    expression_pmf
+from functions.dice_notation import PARSE_CACHE_SIZE
+from functions.profiling import instrumented
+from functions.tracing import trace, enable_tracing
+
+
+_log = logging.getLogger(__name__)
+
+# Dice.roll() packs as many of a roll's dice as fit below this bound into
+# one integer below dice_size ** dice, and reads the faces off its base
+# dice_size digits. The integer comes from one raw 64-bit draw of the
+# generator's bit generator, rejected and redrawn above the largest
+# multiple of the range so every face stays exactly uniform; that is
+# several times faster than Generator.integers() for a single value. Dice
+# with more faces than the bound are drawn with Generator.integers().
+_MAX_PACKED = 2 ** 62
+_RAW_RANGE = 2 ** 64
 
 
 class Dice:
@@ -10,7 +30,7 @@ class Dice:
 
     def __init__(self, dice_size: int, roll_type="normal",
                  dice_number=1, drop_number=0, highest=True,
-                 debug=False):
+                 debug=False, rng=None):
         """
         The values for dice_size and dice_number must be positive integers. Values
         for roll_type must be "normal", "advantage", or "disadvantage". drop_number
@@ -20,12 +40,18 @@ class Dice:
 
         The debug argument reduces the number of messages appearing in the program
         output from this Class.
+
+        rng selects the random stream. None uses the shared default generator,
+        looked up at every roll, so seed_default_rng() applies to Dice that
+        already exist; an int seed or a numpy Generator makes the rolls
+        reproducible.
         :param dice_size: int, greater than one
         :param roll_type: str, "normal", "advantage", or "disadvantage"
         :param dice_number: int, greater than zero
         :param drop_number: int, 0 or positive integer less dice_number
         :param highest: bool
-        ":param debug: bool, defaults to False
+        :param debug: bool, defaults to False
+        :param rng: None, int, or np.random.Generator, defaults to None
         """
 
         # Check the values of the parameters.
@@ -53,11 +79,36 @@ class Dice:
                              f"dice_number: {dice_number}.")
 
         self.dice_size = dice_size
-        self.roll_type = roll_type
+        self.roll_type = roll_type.lower()
         self.number_of_rolls = dice_number
         self.number_of_rolls_dropped = drop_number
         self.drop_lowest = highest
         self.debug = debug
+        self.rng = rng
+        # Faces drawn per roll: two per die with advantage or disadvantage.
+        self._faces = dice_number if self.roll_type == "normal" else 2 * dice_number
+        # A plain roll of one die is a single draw, which roll() makes itself.
+        self._single = self._faces == 1 and drop_number == 0
+        if dice_size > _MAX_PACKED:
+            self._per_draw = 0
+        else:
+            self._per_draw = 1
+            while dice_size ** (self._per_draw + 1) <= _MAX_PACKED:
+                self._per_draw += 1
+            self._packed = dice_size ** self._per_draw
+            self._raw_limit = _RAW_RANGE - _RAW_RANGE % self._packed
+
+    @property
+    def rng(self):
+        """
+        :return: np.random.Generator, the shared default generator if none was
+            supplied
+        """
+        return get_rng(self._rng)
+
+    @rng.setter
+    def rng(self, rng):
+        self._rng = None if rng is None else get_rng(rng)
 
     def __str__(self):
         output = f"dice_size: {self.dice_size}\n" \
@@ -72,87 +123,241 @@ class Dice:
                  f"highest={self.drop_lowest})"
         return output
 
-    def _roll_advantage(self):
-        roll1 = randint(1, self.dice_size)
-        roll2 = randint(1, self.dice_size)
-        if self.debug:
-            print(f"Dice.roll_advantage: roll1: {roll1}. roll2: {roll2}")
-        if roll1 >= roll2:
-            return roll1
-        else:
-            return roll2
-
-    def _roll_disadvantage(self):
-        roll1 = randint(1, self.dice_size)
-        roll2 = randint(1, self.dice_size)
-        if self.debug:
-            print(f"Dice.roll_disadvantage: roll1: {roll1}. roll2: {roll2}")
-        if roll1 <= roll2:
-            return roll1
-        else:
-            return roll2
-
-    def roll(self):
-        """This method implements the actual roll of the defined dice."""
-        rolls = []
-        if self.debug:
-            print(f"Dice.roll: rolls: {rolls}")
-        for n in range(self.number_of_rolls):
-            match self.roll_type:
-                case "normal":
-                    roll = randint(1, self.dice_size)
-                case "advantage":
-                    roll = self._roll_advantage()
-                case "disadvantage":
-                    roll = self._roll_disadvantage()
-
-            rolls.append(roll)
-
-        rolls.sort()
-        if self.debug:
-            print(f"Dice.roll: rolls: {rolls}")
+    def _draw(self, generator):
+        # Returns the faces of one roll as a list of int.
+        size = self.dice_size
+        if self._per_draw == 0:
+            return generator.integers(1, size + 1, self._faces).tolist()
+        bit_generator = generator.bit_generator
+        faces = []
+        remaining = self._faces
+        while remaining > 0:
+            raw = bit_generator.random_raw()
+            while raw >= self._raw_limit:
+                raw = bit_generator.random_raw()
+            packed = raw % self._packed
+            for _ in range(min(remaining, self._per_draw)):
+                packed, face = divmod(packed, size)
+                faces.append(face + 1)
+            remaining -= self._per_draw
+        return faces
+
+    @instrumented("Dice.roll")
+    def roll(self, rng=None):
+        """
+        This method implements the actual roll of the defined dice. All the
+        dice are drawn from the generator at once.
+        :param rng: None, int, or np.random.Generator, defaults to None, which
+            uses self.rng
+        :return: int
+        """
+        return self._roll(get_rng(self._rng if rng is None else rng))
+
+    def _roll(self, generator):
+        if self._single and self._per_draw:
+            bit_generator = generator.bit_generator
+            raw = bit_generator.random_raw()
+            while raw >= self._raw_limit:
+                raw = bit_generator.random_raw()
+            return raw % self.dice_size + 1
+        rolls = self._draw(generator)
+        count = self.number_of_rolls
+        match self.roll_type:
+            case "advantage":
+                trace(_log, "Dice.roll: pairs: %s", rolls, debug=self.debug)
+                rolls = [max(pair) for pair in zip(rolls[:count], rolls[count:])]
+            case "disadvantage":
+                trace(_log, "Dice.roll: pairs: %s", rolls, debug=self.debug)
+                rolls = [min(pair) for pair in zip(rolls[:count], rolls[count:])]
+        trace(_log, "Dice.roll: rolls: %s", rolls, debug=self.debug)
         if self.number_of_rolls_dropped > 0:
+            rolls.sort()
             if self.drop_lowest:
                 rolls_final = rolls[self.number_of_rolls_dropped:]
             else:
                 rolls_final = rolls[0: -self.number_of_rolls_dropped]
-            if self.debug:
-                print(f"Dice.roll: rolls_final: {rolls_final}")
+            trace(_log, "Dice.roll: rolls_final: %s", rolls_final, debug=self.debug)
             return sum(rolls_final)
         else:
             return sum(rolls)
 
+    @instrumented("Dice.roll_many")
+    def roll_many(self, n: int, rng=None):
+        """
+        This method rolls the defined dice n times in a single batch and
+        returns the totals as a NumPy array. It honors every mode that roll()
+        does: advantage, disadvantage, and dropping the highest or lowest
+        dice. All dice are drawn as one (n, dice_number) array, so there are
+        no per-die Python calls. rng, if given, is used instead of self.rng
+        for this call.
+        :param n: int, 0 or a positive integer
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :return: np.ndarray of int, shape (n,)
+        """
+        if not isinstance(n, (int, np.integer)) or isinstance(n, bool):
+            raise ValueError(f"Dice.roll_many: n must be a positive integer or 0. "
+                             f"The variable type provided is {type(n)}")
+        elif n < 0:
+            raise ValueError(f"Dice.roll_many: n must be a positive integer or 0. "
+                             f"Value provided is {n}.")
+
+        generator = self.rng if rng is None else get_rng(rng)
+        shape = (n, self.number_of_rolls)
+        match self.roll_type:
+            case "normal":
+                rolls = generator.integers(1, self.dice_size + 1, size=shape)
+            case "advantage":
+                pairs = generator.integers(1, self.dice_size + 1, size=(2,) + shape)
+                rolls = pairs.max(axis=0)
+            case "disadvantage":
+                pairs = generator.integers(1, self.dice_size + 1, size=(2,) + shape)
+                rolls = pairs.min(axis=0)
+        trace(_log, "Dice.roll_many: rolls: %s", rolls, debug=self.debug)
+
+        dropped = self.number_of_rolls_dropped
+        if dropped > 0:
+            kept = self.number_of_rolls - dropped
+            # np.partition only orders the array around one index, which is
+            # all that is needed to split the kept dice from the dropped ones.
+            if self.drop_lowest:
+                rolls = np.partition(rolls, dropped, axis=1)[:, dropped:]
+            else:
+                rolls = np.partition(rolls, kept, axis=1)[:, :kept]
+            trace(_log, "Dice.roll_many: rolls_final: %s", rolls, debug=self.debug)
+        return rolls.sum(axis=1)
+
+    def distribution(self):
+        """
+        Returns the exact distribution of the total this Dice rolls, computed
+        by dice_pmf() and memoized per configuration.
+        :return: dict, maps each possible total to its probability
+        """
+        min_total, probs = dice_pmf(self.dice_size, self.number_of_rolls, self.roll_type,
+                                    self.number_of_rolls_dropped, self.drop_lowest)
+        return {min_total + i: float(prob) for i, prob in enumerate(probs)}
+
+    def result_probabilities(self, table):
+        """
+        Returns the exact probability of each row of a table being rolled
+        with this Dice, instead of estimating it from repeated roll() calls.
+        :param table: pd.DataFrame or CompiledTable
+        :return: dict, maps each row's result to its probability. Results
+            shared by several rows are summed. Rolls that no row covers are
+            reported under None.
+        """
+        # Imported here so that rolling dice never needs pandas.
+        from functions.compiled_table import compile_table
+        lookup = compile_table(table)
+        row_probs, miss_prob = table_result_probabilities(
+            lookup, self.dice_size, self.number_of_rolls, self.roll_type,
+            self.number_of_rolls_dropped, self.drop_lowest)
+        output = {}
+        for result, prob in zip(lookup.results, row_probs):
+            output[result] = output.get(result, 0.0) + float(prob)
+        if miss_prob > 0:
+            output[None] = miss_prob
+        return output
+
 
 # Useful functions to help use Dice are below.
-def return_die_roll(s, debug=False):
+class DiceExpression:
     """
-    This function takes a string in format ndm or nDm where n and m are
-    integers. It will return the die roll called for.
+    This class is a compiled dice expression such as '2d6+3', '4d6kh3', or
+    '1d20adv'. It holds one Dice per dice term plus a constant, so rolling
+    it does no parsing. Build it with compile_dice_expression(), which
+    caches compiled expressions by their string. The Dice are built without
+    a generator, so a cached expression holds only the parsed terms and
+    every roll uses the rng passed to it, or the current default generator.
+    """
+    def __init__(self, expression: str):
+        """
+        :param expression: str, see parse_dice_expression() for the grammar
+        """
+        self.expression = expression
+        self.spec = parse_dice_expression(expression)
+        self.terms = [(term.sign, Dice(term.dice_size, roll_type=term.roll_type,
+                                       dice_number=term.dice_number,
+                                       drop_number=term.drop_number,
+                                       highest=term.highest))
+                      for term in self.spec.terms]
+        self.constant = self.spec.constant
+
+    def __str__(self):
+        return self.expression
+
+    def __repr__(self):
+        return f"DiceExpression({self.expression!r})"
+
+    @instrumented("DiceExpression.roll")
+    def roll(self, n=None, rng=None):
+        """
+        Rolls the expression. With n None, one total is returned as an int.
+        With n an integer, n totals are rolled in one batch and returned as
+        a NumPy array.
+        :param n: None or int, defaults to None
+        :param rng: None, int, or np.random.Generator, defaults to None,
+            which uses the shared default generator
+        :return: int or np.ndarray of int
+        """
+        generator = get_rng(rng)
+        if n is None:
+            total = self.constant
+            for sign, die in self.terms:
+                total += sign * die._roll(generator)
+            return total
+        totals = np.full(n, self.constant, dtype=np.int64)
+        for sign, die in self.terms:
+            totals += sign * die.roll_many(n, rng=generator)
+        return totals
+
+    def distribution(self):
+        """
+        Returns the exact distribution of the expression's total.
+        :return: dict, maps each possible total to its probability
+        """
+        min_total, probs = expression_pmf(self.expression)
+        return {min_total + i: float(prob) for i, prob in enumerate(probs)}
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def compile_dice_expression(expression: str):
+    """
+    Returns the DiceExpression for a string, compiling it only the first time
+    it is seen. The cache is a bounded LRU keyed by the string.
+    :param expression: str
+    :return: DiceExpression
+    """
+    return DiceExpression(expression)
+
+
+def return_die_roll(s, debug=False, rng=None):
+    """
+    This function takes a dice expression such as 'ndm', 'nDm', '2d6+3',
+    '4d6kh3', or '1d20adv' and returns the roll called for. The expression
+    is compiled once and cached, so rolling the same string repeatedly does
+    no parsing after the first call.
     The parameter, debug, controls the output of debug messages.
     :param s: str
     :param debug: bool, defaults to False
+    :param rng: None, int, or np.random.Generator, defaults to None
     :return: int
     """
-    s = s.lower()
-    l = s.split('d')
-    if debug:
-        print(f"return_die_roll: s: {s}. l: {l}.")
     try:
-        n = int(l[0])
-        m = int(l[1])
-        if debug:
-            print(f"return_die_roll: n: {n}. m: {m}.")
-    except ValueError:
-        error_msg = (f"Dice.return_die_roll: The string provided must be in the "
-                     f"format 'ndm' or 'nDm' where n and m are integers. The"
-                     f"string supplied is {s}.")
+        expression = compile_dice_expression(s)
+    except ValueError as e:
+        error_msg = (f"Dice.return_die_roll: The string provided must be a dice "
+                     f"expression such as 'ndm' or 'nDm' where n and m are "
+                     f"integers. The string supplied is {s}. {e}")
         raise ValueError(error_msg)
-
-    return Dice(m, dice_number=n, debug=debug).roll()
+    roll = expression.roll(rng=rng)
+    trace(_log, "return_die_roll: s: %s. expression: %r. roll: %s.", s, expression,
+          roll, debug=debug)
+    return roll
 
 
 if __name__ == "__main__":
     debug = True
+    enable_tracing()
     d6 = Dice(6, debug=debug)
     d8 = Dice(8, debug=debug)
     print(f"main: d6: {d6.roll()}.")
@@ -203,3 +408,11 @@ if __name__ == "__main__":
           f"{return_die_roll('2d6', debug)}")
     print(f"main: Testing return_die_roll(3d10): "
           f"{return_die_roll('3d10', debug)}")
+    print(f"main: Testing roll_many(5) on 4d6, drop lowest: "
+          f"{stat_roll_4d6_drop_lowest.roll_many(5)}")
+    print(f"main: Testing roll_many(5) on d20 with advantage: "
+          f"{save_with_advantage.roll_many(5)}")
+    print(f"main: Testing return_die_roll(4d6kh3): "
+          f"{return_die_roll('4d6kh3', debug)}")
+    print(f"main: Testing compile_dice_expression(2d6+3).roll(5): "
+          f"{compile_dice_expression('2d6+3').roll(5)}")
@@ -0,0 +1,232 @@
+from entities.point_of_interest import PointOfInterest, AdventureSite, DivinePOI
+from functions.tracing import trace
+from itertools import islice
+import csv
+import json
+import logging
+import os
+
+
+_log = logging.getLogger(__name__)
+
+# Every POI type that can be written and read back, by the name stored in a
+# record's 'poi_type'.
+POI_TYPES = {cls.__name__: cls for cls in (AdventureSite, DivinePOI)}
+
+# Records written and read per chunk. Only one chunk is held in memory at a
+# time, however many POIs are exported.
+CHUNK_SIZE = 10_000
+
+FORMATS = {'.jsonl': 'jsonl', '.csv': 'csv', '.parquet': 'parquet'}
+
+
+def record_columns():
+    """
+    Returns the columns of a POI record, in order, covering every type in
+    POI_TYPES: 'poi_type', the result fields, the '<field>_table' names, and
+    'seed'. CSV and Parquet files use these columns, with blank cells for
+    the fields a type does not have.
+    :return: list of str
+    """
+    results = []
+    tables = []
+    for cls in POI_TYPES.values():
+        results.extend(f for f in cls.RESULT_FIELDS if f not in results)
+        tables.extend(f"{f}_table" for f in cls.TABLE_FIELDS if f"{f}_table" not in tables)
+    return ['poi_type'] + results + tables + ['seed']
+
+
+def export_format(path, fmt=None):
+    """
+    Returns the export format, 'jsonl', 'csv', or 'parquet', from fmt or, if
+    fmt is None, from the extension of path.
+    :param path: str
+    :param fmt: str, defaults to None
+    :return: str
+    """
+    if fmt is None:
+        fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in FORMATS.values():
+        raise ValueError(f"export_format: The format of {path} could not be "
+                         f"determined. Use a .jsonl, .csv, or .parquet file, or "
+                         f"pass fmt as one of {list(FORMATS.values())}.")
+    return fmt
+
+
+def to_record(poi, seed=None):
+    """
+    Returns poi as a record. A POI is converted with its to_record() method;
+    a mapping is taken as a record already, with seed filled in if it has
+    none. The seed is stored as an int, so numpy integers, such as the
+    seeds of a generated DataFrame, can be written as JSON.
+    :param poi: PointOfInterest or mapping
+    :param seed: int or numpy integer, defaults to None
+    :return: dict
+    """
+    if isinstance(poi, PointOfInterest):
+        return poi.to_record(seed=seed)
+    record = dict(poi)
+    if record.get('seed') is None:
+        record['seed'] = seed
+    if record['seed'] is not None:
+        record['seed'] = int(record['seed'])
+    return record
+
+
+def write_pois(pois, path, fmt=None, seed=None, chunk_size=CHUNK_SIZE, debug=False):
+    """
+    Streams POIs to a JSON Lines, CSV, or Parquet file. pois may be any
+    iterable, including a generator such as iter_divine_pois(); it is
+    consumed chunk_size records at a time, and each chunk is written before
+    the next is built, so memory stays flat however many POIs are written.
+    Each row is the POI's to_record(): its results, the names of the tables
+    they were rolled on, and seed. Read the file back with read_pois().
+    Parquet needs the optional pyarrow package.
+    :param pois: iterable of PointOfInterest or of record dicts
+    :param path: str, the output file
+    :param fmt: str, 'jsonl', 'csv', or 'parquet', defaults to None, which
+        uses the extension of path
+    :param seed: int, the seed the POIs were generated from, defaults to None
+    :param chunk_size: int, defaults to CHUNK_SIZE
+    :param debug: bool, defaults to False
+    :return: int, the number of POIs written
+    """
+    fmt = export_format(path, fmt)
+    if chunk_size < 1:
+        raise ValueError(f"write_pois: chunk_size must be a positive integer. "
+                         f"Value provided is {chunk_size}.")
+    records = (to_record(poi, seed=seed) for poi in pois)
+    chunks = iter(lambda: list(islice(records, chunk_size)), [])
+    match fmt:
+        case 'jsonl':
+            count = _write_jsonl(chunks, path)
+        case 'csv':
+            count = _write_csv(chunks, path)
+        case 'parquet':
+            count = _write_parquet(chunks, path)
+    trace(_log, "write_pois: path: %s, format: %s, count: %s.", path, fmt, count,
+          debug=debug)
+    return count
+
+
+def _write_jsonl(chunks, path):
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            f.write("\n".join(json.dumps(record) for record in chunk))
+            f.write("\n")
+            count += len(chunk)
+    return count
+
+
+def _write_csv(chunks, path):
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=record_columns(), extrasaction='ignore')
+        writer.writeheader()
+        for chunk in chunks:
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+
+def _write_parquet(chunks, path):
+    pa, pq = _import_pyarrow()
+    columns = record_columns()
+    schema = pa.schema([(c, pa.int64() if c == 'seed' else pa.string()) for c in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            data = {c: [_parquet_value(r.get(c), c) for r in chunk] for c in columns}
+            writer.write_table(pa.table(data, schema=schema))
+            count += len(chunk)
+    return count
+
+
+def _parquet_value(value, column):
+    if value is None or column == 'seed':
+        return value
+    return str(value)
+
+
+def _import_pyarrow():
+    # pyarrow is only needed for Parquet, so it is imported on first use.
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("export: Parquet files need the pyarrow package. Install "
+                          "it, or write JSON Lines or CSV instead.") from None
+    return pa, pq
+
+
+def iter_records(path, fmt=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields the records of a file written by write_pois(), one at a time,
+    reading it chunk by chunk. Blank CSV cells come back as None and seeds
+    as int, so the records match what was written.
+    :param path: str
+    :param fmt: str, defaults to None, which uses the extension of path
+    :param chunk_size: int, defaults to CHUNK_SIZE
+    :return: generator of dict
+    """
+    fmt = export_format(path, fmt)
+    match fmt:
+        case 'jsonl':
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        case 'csv':
+            with open(path, encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    record = {k: (v if v != '' else None) for k, v in row.items()}
+                    if record.get('seed') is not None:
+                        record['seed'] = int(record['seed'])
+                    yield record
+        case 'parquet':
+            pa, pq = _import_pyarrow()
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+                yield from batch.to_pylist()
+
+
+def poi_from_record(record, registry, rng=None, debug=False):
+    """
+    Rebuilds a POI from a record written by write_pois() or made by
+    PointOfInterest.to_record(). The results are restored as they were, no
+    dice are rolled, and the tables are looked up by name in registry, so
+    the POI can be rerolled.
+    :param record: mapping
+    :param registry: TableRegistry, loaded from the workbook the POI was
+        generated from
+    :param rng: None, int, or np.random.Generator, defaults to None
+    :param debug: bool, defaults to False
+    :return: PointOfInterest
+    """
+    try:
+        cls = POI_TYPES[record['poi_type']]
+    except KeyError:
+        raise ValueError(f"poi_from_record: Unknown POI type "
+                         f"{record.get('poi_type')!r}. Known types are "
+                         f"{list(POI_TYPES)}.") from None
+    tables = [record.get(f"{field}_table") for field in cls.TABLE_FIELDS]
+    if None in tables:
+        raise ValueError(f"poi_from_record: The record does not name every table "
+                         f"of a {cls.__name__}, so it cannot be rebuilt: {record}.")
+    return cls.from_record(record, *tables, debug=debug, rng=rng, registry=registry)
+
+
+def read_pois(path, registry, fmt=None, rng=None, chunk_size=CHUNK_SIZE, debug=False):
+    """
+    Yields the POIs stored in a file written by write_pois(), rebuilding
+    each with poi_from_record(). The file is read chunk by chunk.
+    :param path: str
+    :param registry: TableRegistry
+    :param fmt: str, defaults to None, which uses the extension of path
+    :param rng: None, int, or np.random.Generator, defaults to None
+    :param chunk_size: int, defaults to CHUNK_SIZE
+    :param debug: bool, defaults to False
+    :return: generator of PointOfInterest
+    """
+    for record in iter_records(path, fmt=fmt, chunk_size=chunk_size):
+        yield poi_from_record(record, registry, rng=rng, debug=debug)
@@ -0,0 +1,288 @@
+from entities.dice import compile_dice_expression
+from entities.point_of_interest import AdventureSite, DivinePOI, SharedRng
+from functions import get_rng, resolve_table, stored_table
+from functions.profiling import instrumented, table_name_of
+from functions.tracing import trace
+import logging
+import numpy as np
+import pandas as pd
+
+
+_log = logging.getLogger(__name__)
+
+# Default worksheet names in tables.xlsx.
+DISCOVERABILITY_TABLE = "POI Discoverability"
+DIVINE_POI_TABLE = "Divine POI"
+DIVINE_FACTIONS_TABLE = "Current Divine Factions"
+DIVINE_FACTIONS_ACTION_TABLE = "Divine Faction Action"
+
+# iter_adventure_sites() and iter_divine_pois() read their frame this many
+# rows at a time.
+ITER_CHUNK = 1024
+
+
+def table_dice(lookup):
+    """
+    Returns the compiled dice expression in a table's roll column header,
+    e.g. '2d6', 'd20', or '4d6kh3'.
+    :param lookup: CompiledTable
+    :return: DiceExpression
+    """
+    return compile_dice_expression(lookup.roll_col_name.lower())
+
+
+@instrumented("roll_on_table", table_of=table_name_of)
+def roll_on_table(lookup, n, rng=None, debug=False):
+    """
+    Rolls a compiled table n times in one batch and resolves every roll
+    column-wise.
+    :param lookup: CompiledTable
+    :param n: int
+    :param rng: None, int, or np.random.Generator, defaults to None
+    :param debug: bool, defaults to False
+    :return: tuple of np.ndarray, (rolls, results)
+    """
+    rolls = table_dice(lookup).roll(n, rng=rng)
+    results = lookup.lookup_many(rolls)
+    missed = np.flatnonzero(pd.isna(results))
+    if len(missed) > 0:
+        raise ValueError(f"roll_on_table: Table format was invalid. No result could "
+                         f"be determined from {lookup} for rolls "
+                         f"{sorted(set(rolls[missed].tolist()))}.")
+    trace(lookup.log, "roll_on_table: n: %s, rolls: %s, results: %s.", n, rolls,
+          results, debug=debug)
+    return rolls, results
+
+
+@instrumented("sample_table", table_of=table_name_of)
+def sample_table(lookup, n, rng=None, debug=False):
+    """
+    Draws n results from a compiled table without rolling its dice. The
+    results have the same distribution as roll_on_table() gives, but each
+    one costs a single uniform draw through the table's alias table (see
+    CompiledTable.sample()), however many dice the header rolls.
+    :param lookup: CompiledTable
+    :param n: int
+    :param rng: None, int, or np.random.Generator, defaults to None
+    :param debug: bool, defaults to False
+    :return: np.ndarray of object
+    """
+    results = lookup.sample(n, rng=rng)
+    trace(lookup.log, "sample_table: n: %s, results: %s.", n, results, debug=debug)
+    return results
+
+
+def reroll(pois, fields=None, rng=None, debug=False):
+    """
+    Rerolls only the named attributes of many POIs in one vectorized pass,
+    leaving their other attributes untouched. The POIs are grouped by field
+    and table, so each table's dice header is compiled once and all of its
+    rolls are drawn and resolved in one batch per group, however many POIs
+    share it. Nothing is changed unless every group resolves. The rolls come
+    from rng rather than from each POI's own rng; use
+    PointOfInterest.reroll() to reroll a single POI on its own stream.
+    :param pois: iterable of PointOfInterest
+    :param fields: str or list of str, defaults to None, which rerolls every
+        field in each POI's TABLE_FIELDS
+    :param rng: None, int, or np.random.Generator, defaults to None
+    :param debug: bool, defaults to False
+    :return:
+    """
+    rng = get_rng(rng)
+    groups = {}
+    for poi in pois:
+        for field in poi.table_fields(fields):
+            table_id = getattr(poi, poi.TABLE_FIELDS[field])
+            groups.setdefault((field, table_id), []).append(poi)
+
+    updates = []
+    for (field, table_id), members in groups.items():
+        rolls, results = roll_on_table(stored_table(table_id), len(members), rng=rng,
+                                       debug=debug)
+        updates.append((field, members, results.tolist()))
+    for field, members, results in updates:
+        for poi, result in zip(members, results):
+            setattr(poi, field, result)
+    trace(_log, "reroll: fields: %s, groups: %s.", fields,
+          [(field, table_id, len(members)) for (field, table_id), members in groups.items()],
+          debug=debug)
+
+
+def generate_adventure_sites(n, tables=None, rng=None,
+                             discoverability_table=DISCOVERABILITY_TABLE,
+                             next_action='create workup', record_rolls=True,
+                             debug=False):
+    """
+    Generates n adventure sites at once and returns them as a DataFrame with
+    one row per site and the columns discoverability_roll, discoverability,
+    and next_action. All dice are rolled in one batch and the table is
+    resolved column-wise. With record_rolls False no dice are rolled: the
+    results are drawn straight from the table's distribution (see
+    sample_table()) and the discoverability_roll column is left out. Use iter_adventure_sites() or
+    AdventureSite.from_record() to turn rows into AdventureSite objects when
+    they are needed.
+    :param n: int, number of sites
+    :param tables: TableRegistry, required when tables are given by name
+    :param rng: None, int, or np.random.Generator, defaults to None
+    :param discoverability_table: str, pd.DataFrame, or CompiledTable,
+        defaults to 'POI Discoverability'
+    :param next_action: str, defaults to 'create workup'
+    :param record_rolls: bool, defaults to True
+    :param debug: bool, defaults to False
+    :return: pd.DataFrame
+    """
+    rng = get_rng(rng)
+    lookup = resolve_table(discoverability_table, tables, debug=debug)
+    columns = {}
+    if record_rolls:
+        columns['discoverability_roll'], columns['discoverability'] = \
+            roll_on_table(lookup, n, rng=rng, debug=debug)
+    else:
+        columns['discoverability'] = sample_table(lookup, n, rng=rng, debug=debug)
+    columns['next_action'] = np.full(n, next_action, dtype=object)
+    frame = pd.DataFrame(columns)
+    trace(_log, "generate_adventure_sites: n: %s, frame: %s.", n, frame, debug=debug)
+    return frame
+
+
+def generate_divine_pois(n, tables=None, rng=None,
+                         discoverability_table=DISCOVERABILITY_TABLE,
+                         divine_poi_table=DIVINE_POI_TABLE,
+                         divine_factions_table=DIVINE_FACTIONS_TABLE,
+                         divine_factions_action_table=DIVINE_FACTIONS_ACTION_TABLE,
+                         record_rolls=True, debug=False):
+    """
+    Generates n divine POIs at once and returns them as a DataFrame with one
+    row per POI. For each of discoverability, location_type, faction, and
+    next_action there is a result column and a '<name>_roll' column holding
+    the roll behind it. Each table is rolled in one batch and resolved
+    column-wise. With record_rolls False no dice are rolled: each result is
+    drawn straight from its table's distribution (see sample_table()) and
+    the '<name>_roll' columns are left out. Use iter_divine_pois() or DivinePOI.from_record() to turn
+    rows into DivinePOI objects when they are needed.
+    :param n: int, number of POIs
+    :param tables: TableRegistry, required when tables are given by name
+    :param rng: None, int, or np.random.Generator, defaults to None
+    :param discoverability_table: str, pd.DataFrame, or CompiledTable
+    :param divine_poi_table: str, pd.DataFrame, or CompiledTable
+    :param divine_factions_table: str, pd.DataFrame, or CompiledTable
+    :param divine_factions_action_table: str, pd.DataFrame, or CompiledTable
+    :param record_rolls: bool, defaults to True
+    :param debug: bool, defaults to False
+    :return: pd.DataFrame
+    """
+    rng = get_rng(rng)
+    lookups = {
+        'discoverability': resolve_table(discoverability_table, tables, debug=debug),
+        'location_type': resolve_table(divine_poi_table, tables, debug=debug),
+        'faction': resolve_table(divine_factions_table, tables,
+                                 result_col_header='Faction', append_columns=True,
+                                 debug=debug),
+        'next_action': resolve_table(divine_factions_action_table, tables, debug=debug),
+    }
+    columns = {}
+    for field, lookup in lookups.items():
+        if record_rolls:
+            columns[f"{field}_roll"], columns[field] = roll_on_table(lookup, n, rng=rng,
+                                                                     debug=debug)
+        else:
+            columns[field] = sample_table(lookup, n, rng=rng, debug=debug)
+    frame = pd.DataFrame(columns)
+    trace(_log, "generate_divine_pois: n: %s, frame: %s.", n, frame, debug=debug)
+    return frame
+
+
+# The keyword arguments through which each generator takes its tables, with
+# the default table and the resolve_table() options it is looked up with.
+GENERATOR_TABLES = {
+    generate_adventure_sites: {
+        'discoverability_table': (DISCOVERABILITY_TABLE, {}),
+    },
+    generate_divine_pois: {
+        'discoverability_table': (DISCOVERABILITY_TABLE, {}),
+        'divine_poi_table': (DIVINE_POI_TABLE, {}),
+        'divine_factions_table': (DIVINE_FACTIONS_TABLE,
+                                  {'result_col_header': 'Faction', 'append_columns': True}),
+        'divine_factions_action_table': (DIVINE_FACTIONS_ACTION_TABLE, {}),
+    },
+}
+
+
+def resolve_generator_tables(generator, tables=None, debug=False):
+    """
+    Resolves every table generator uses, once, so repeated calls can be
+    given the CompiledTables instead of looking them up each time:
+        lookups = resolve_generator_tables(generate_divine_pois, registry)
+        frame = generate_divine_pois(1000, rng=rng, **lookups)
+    :param generator: generate_adventure_sites or generate_divine_pois
+    :param tables: TableRegistry, required when tables are given by name
+    :param debug: bool, defaults to False
+    :return: dict, maps the generator's table arguments to CompiledTables
+    """
+    return {argument: resolve_table(table, tables, debug=debug, **options)
+            for argument, (table, options) in GENERATOR_TABLES[generator].items()}
+
+
+def _iter_records(frame):
+    # Yields a record for each row of frame, read ITER_CHUNK rows at a time.
+    columns = list(frame.columns)
+    for start in range(0, len(frame), ITER_CHUNK):
+        chunk = frame.iloc[start:start + ITER_CHUNK]
+        for row in chunk.itertuples(index=False, name=None):
+            yield dict(zip(columns, row))
+
+
+def iter_adventure_sites(frame, tables=None, rng=None,
+                         discoverability_table=DISCOVERABILITY_TABLE, debug=False):
+    """
+    Yields an AdventureSite for each row of a generate_adventure_sites()
+    DataFrame. Objects are only built as they are requested, and the frame
+    is read ITER_CHUNK rows at a time. All of them share one compiled table
+    and rng, as a SharedRng; a site spawns its own generator from it only if
+    it is rerolled.
+    :param frame: pd.DataFrame
+    :param tables: TableRegistry, required when tables are given by name
+    :param rng: None, int, or np.random.Generator, defaults to None
+    :param discoverability_table: str, pd.DataFrame, or CompiledTable
+    :param debug: bool, defaults to False
+    :return: generator of AdventureSite
+    """
+    lookup = resolve_table(discoverability_table, tables, debug=debug)
+    shared = SharedRng(rng)
+    for record in _iter_records(frame):
+        yield AdventureSite.from_record(record, lookup, debug=debug, rng=shared)
+
+
+def iter_divine_pois(frame, tables=None, rng=None,
+                     discoverability_table=DISCOVERABILITY_TABLE,
+                     divine_poi_table=DIVINE_POI_TABLE,
+                     divine_factions_table=DIVINE_FACTIONS_TABLE,
+                     divine_factions_action_table=DIVINE_FACTIONS_ACTION_TABLE,
+                     debug=False):
+    """
+    Yields a DivinePOI for each row of a generate_divine_pois() DataFrame.
+    Objects are only built as they are requested, and the frame is read
+    ITER_CHUNK rows at a time. All of them share the same compiled tables
+    and rng, as a SharedRng; a POI spawns its own generator from it only if
+    it is rerolled.
+    :param frame: pd.DataFrame
+    :param tables: TableRegistry, required when tables are given by name
+    :param rng: None, int, or np.random.Generator, defaults to None
+    :param discoverability_table: str, pd.DataFrame, or CompiledTable
+    :param divine_poi_table: str, pd.DataFrame, or CompiledTable
+    :param divine_factions_table: str, pd.DataFrame, or CompiledTable
+    :param divine_factions_action_table: str, pd.DataFrame, or CompiledTable
+    :param debug: bool, defaults to False
+    :return: generator of DivinePOI
+    """
+    discoverability = resolve_table(discoverability_table, tables, debug=debug)
+    divine_poi = resolve_table(divine_poi_table, tables, debug=debug)
+    divine_factions = resolve_table(divine_factions_table, tables,
+                                    result_col_header='Faction', append_columns=True,
+                                    debug=debug)
+    divine_factions_action = resolve_table(divine_factions_action_table, tables,
+                                           debug=debug)
+    shared = SharedRng(rng)
+    for record in _iter_records(frame):
+        yield DivinePOI.from_record(record, discoverability, divine_poi, divine_factions,
+                                    divine_factions_action, debug=debug, rng=shared)
@@ -0,0 +1,307 @@
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from entities.generation import resolve_generator_tables
+from entities.parallel_generation import POI_GENERATORS
+from functions import TableRegistry, WorkbookWatcher, get_rng
+from functions.tracing import trace
+import logging
+import threading
+import pandas as pd
+
+
+_log = logging.getLogger(__name__)
+
+# The first chunk of a job is small, so the first POIs reach the caller
+# within milliseconds; the rest come in chunks of CHUNK_SIZE.
+FIRST_CHUNK = 256
+CHUNK_SIZE = 10_000
+
+
+def chunk_sizes(n, first_chunk=FIRST_CHUNK, chunk_size=CHUNK_SIZE):
+    """
+    Returns the sizes of the chunks a job of n POIs is generated in.
+    :param n: int
+    :param first_chunk: int, defaults to FIRST_CHUNK
+    :param chunk_size: int, defaults to CHUNK_SIZE
+    :return: list of int
+    """
+    if first_chunk < 1 or chunk_size < 1:
+        raise ValueError(f"chunk_sizes: first_chunk and chunk_size must be positive "
+                         f"integers. Values provided are {first_chunk} and "
+                         f"{chunk_size}.")
+    sizes = [min(n, first_chunk)] if n > 0 else []
+    remaining = n - sum(sizes)
+    sizes.extend([chunk_size] * (remaining // chunk_size))
+    if remaining % chunk_size:
+        sizes.append(remaining % chunk_size)
+    return sizes
+
+
+class GenerationJob:
+    """
+    This class is one request to a GenerationService: n POIs of one type,
+    generated chunk by chunk on a worker thread. After each chunk, on_chunk
+    is called with the chunk's DataFrame (indexed by the POIs' positions in
+    the job) and on_progress with (done, total). When the job ends, because
+    it finished or was cancelled, on_done is called with the job; if
+    generation raised, on_error is called with the exception instead. The
+    callbacks run on the worker thread.
+
+    The job's tables are looked up in the registry once, when it starts,
+    and every chunk uses those CompiledTables, so a reload of the registry
+    while the job runs does not change the tables under it.
+
+    cancel() stops the job before its next chunk. The chunks, and so the
+    POIs, depend only on the seed, n, and the chunk sizes, never on timing.
+    """
+    def __init__(self, poi_type, n, registry, seed=None, first_chunk=FIRST_CHUNK,
+                 chunk_size=CHUNK_SIZE, record_rolls=True, keep_results=True,
+                 on_chunk=None, on_progress=None, on_done=None, on_error=None,
+                 debug=False):
+        """
+        :param poi_type: str, a POI type name in POI_GENERATORS
+        :param n: int, number of POIs
+        :param registry: TableRegistry
+        :param seed: None, int, or np.random.Generator, defaults to None
+        :param first_chunk: int, defaults to FIRST_CHUNK
+        :param chunk_size: int, defaults to CHUNK_SIZE
+        :param record_rolls: bool, defaults to True
+        :param keep_results: bool, keep the chunks for result(), defaults
+            to True
+        :param on_chunk: callable, defaults to None
+        :param on_progress: callable, defaults to None
+        :param on_done: callable, defaults to None
+        :param on_error: callable, defaults to None
+        :param debug: bool, defaults to False
+        """
+        if poi_type not in POI_GENERATORS:
+            raise ValueError(f"GenerationJob: Unknown POI type '{poi_type}'. Known "
+                             f"types are {list(POI_GENERATORS)}.")
+        self.poi_type = poi_type
+        self.n = n
+        self.registry = registry
+        self.seed = seed
+        self.sizes = chunk_sizes(n, first_chunk, chunk_size)
+        self.record_rolls = record_rolls
+        self.keep_results = keep_results
+        self.on_chunk = on_chunk
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.debug = debug
+        self.produced = 0
+        self.error = None
+        self._chunks = []
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return (f"GenerationJob({self.poi_type!r}, n={self.n}, produced={self.produced}, "
+                f"cancelled={self.cancelled}, done={self.done()})")
+
+    @property
+    def progress(self):
+        """
+        :return: tuple, (done, total)
+        """
+        return self.produced, self.n
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """
+        Asks the job to stop before its next chunk. Chunks already delivered
+        are kept.
+        :return:
+        """
+        self._cancel.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the job ends.
+        :param timeout: float, seconds, defaults to None
+        :return: bool, True if the job ended
+        """
+        return self._done.wait(timeout)
+
+    def result(self, timeout=None):
+        """
+        Waits for the job and returns every POI it generated as one
+        DataFrame.
+        :param timeout: float, seconds, defaults to None
+        :return: pd.DataFrame
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"GenerationJob: {self} did not finish within "
+                               f"{timeout} s.")
+        if self.error is not None:
+            raise self.error
+        if self.cancelled:
+            raise CancelledError(f"GenerationJob: {self} was cancelled.")
+        if not self.keep_results:
+            raise ValueError(f"GenerationJob: {self} was run with keep_results=False.")
+        generator = POI_GENERATORS[self.poi_type]
+        if not self._chunks:
+            return generator(0, self.registry, record_rolls=self.record_rolls)
+        return pd.concat(self._chunks)
+
+    def run(self):
+        """
+        Generates the job's chunks in the calling thread. GenerationService
+        calls it on a worker thread.
+        :return:
+        """
+        generator = POI_GENERATORS[self.poi_type]
+        try:
+            rng = get_rng(self.seed)
+            lookups = resolve_generator_tables(generator, self.registry, debug=self.debug)
+            for size in self.sizes:
+                if self._cancel.is_set():
+                    break
+                frame = generator(size, rng=rng, record_rolls=self.record_rolls,
+                                  **lookups)
+                frame.index += self.produced
+                self.produced += size
+                if self.keep_results:
+                    self._chunks.append(frame)
+                if self.on_chunk is not None:
+                    self.on_chunk(frame)
+                if self.on_progress is not None:
+                    self.on_progress(self.produced, self.n)
+        except Exception as e:
+            self.error = e
+            _log.exception("GenerationJob.run: %s failed.", self)
+            self._done.set()
+            if self.on_error is not None:
+                self.on_error(e)
+            return
+        trace(_log, "GenerationJob.run: %s.", self, debug=self.debug)
+        self._done.set()
+        if self.on_done is not None:
+            self.on_done(self)
+
+
+class GenerationService:
+    """
+    This class generates POIs in the background for interactive front ends.
+    It loads the workbook once and keeps its TableRegistry warm for every
+    request, so a job starts without parsing anything, and its first chunk
+    (FIRST_CHUNK POIs) arrives within a few milliseconds however large the
+    job is. Jobs run on a thread pool, max_workers at a time, and stream
+    their POIs back chunk by chunk (see GenerationJob).
+
+    With watch=True the workbook is watched and reloaded when it is saved
+    (see WorkbookWatcher); jobs already running keep the tables they
+    started with.
+
+    GUIs built on PySide6 should use QtGenerationService from
+    entities.qt_generation, which runs the same jobs on a QThreadPool and
+    delivers them through Qt signals.
+        with GenerationService('tables.xlsx') as service:
+            job = service.submit('divine_poi', 100_000, seed=1, on_chunk=show)
+            ...
+            job.cancel()
+    """
+    def __init__(self, workbook, max_workers=1, use_cache=True, watch=False,
+                 first_chunk=FIRST_CHUNK, chunk_size=CHUNK_SIZE, debug=False):
+        """
+        :param workbook: filepath to the Excel workbook
+        :param max_workers: int, jobs run at once, defaults to 1
+        :param use_cache: bool, defaults to True
+        :param watch: bool, defaults to False
+        :param first_chunk: int, defaults to FIRST_CHUNK
+        :param chunk_size: int, defaults to CHUNK_SIZE
+        :param debug: bool, defaults to False
+        """
+        self.registry = TableRegistry(workbook, use_cache=use_cache, debug=debug)
+        self.max_workers = max_workers
+        self.first_chunk = first_chunk
+        self.chunk_size = chunk_size
+        self.debug = debug
+        self.watcher = None
+        if watch:
+            self.watcher = WorkbookWatcher(self.registry, debug=debug)
+            self.watcher.start()
+        self._jobs = []
+        self._executor = None
+
+    def __repr__(self):
+        return f"GenerationService({self.registry.input_fp!r}, jobs={len(self.jobs)})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        return False
+
+    @property
+    def jobs(self):
+        """
+        The jobs that have not ended.
+        :return: list of GenerationJob
+        """
+        return [job for job in self._jobs if not job.done()]
+
+    def submit(self, poi_type, n, seed=None, on_chunk=None, on_progress=None,
+               on_done=None, on_error=None, record_rolls=True, keep_results=True):
+        """
+        Queues a job of n POIs of poi_type and returns at once.
+        :param poi_type: str, a POI type name in POI_GENERATORS
+        :param n: int
+        :param seed: None, int, or np.random.Generator, defaults to None
+        :param on_chunk: callable, called with each chunk's DataFrame,
+            defaults to None
+        :param on_progress: callable, called with (done, total), defaults to
+            None
+        :param on_done: callable, called with the job, defaults to None
+        :param on_error: callable, called with the exception, defaults to
+            None
+        :param record_rolls: bool, defaults to True
+        :param keep_results: bool, defaults to True
+        :return: GenerationJob
+        """
+        job = GenerationJob(poi_type, n, self.registry, seed=seed,
+                            first_chunk=self.first_chunk, chunk_size=self.chunk_size,
+                            record_rolls=record_rolls, keep_results=keep_results,
+                            on_chunk=on_chunk, on_progress=on_progress, on_done=on_done,
+                            on_error=on_error, debug=self.debug)
+        self._jobs = self.jobs + [job]
+        self._start(job)
+        trace(_log, "GenerationService.submit: %s.", job, debug=self.debug)
+        return job
+
+    def _start(self, job):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="GenerationService")
+        self._executor.submit(job.run)
+
+    def cancel_all(self):
+        """
+        Cancels every job that has not ended.
+        :return:
+        """
+        for job in self.jobs:
+            job.cancel()
+
+    def shutdown(self, cancel=True):
+        """
+        Stops the service: cancels the running jobs unless cancel is False,
+        waits for them to end, and stops the watcher.
+        :param cancel: bool, defaults to True
+        :return:
+        """
+        if cancel:
+            self.cancel_all()
+        for job in self._jobs:
+            job.wait()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.watcher is not None:
+            self.watcher.stop()
@@ -0,0 +1,150 @@
+from concurrent.futures import ProcessPoolExecutor
+from entities.generation import generate_adventure_sites, generate_divine_pois
+from functions import SharedTables, TableRegistry, warm_cache
+from functions.tracing import trace
+import logging
+import numpy as np
+import pandas as pd
+
+
+_log = logging.getLogger(__name__)
+
+# Each POI type maps to its bulk generator. The position of a type in this
+# dict is part of its random stream, so new types must be added at the end.
+POI_GENERATORS = {
+    'adventure_site': generate_adventure_sites,
+    'divine_poi': generate_divine_pois,
+}
+
+# Number of POIs per task. The shards, and the random stream of each shard,
+# depend only on the request and this size, never on the number of workers,
+# which is what makes the output identical for any worker count.
+SHARD_SIZE = 10_000
+
+# Loaded once per worker process by _init_worker().
+_worker_registry = None
+
+
+def plan_shards(requests, seed, shard_size=SHARD_SIZE):
+    """
+    Splits a generation request into shards. Each shard gets its own
+    np.random.SeedSequence, derived from seed, the POI type, and the shard's
+    position, so every shard draws from an independent, reproducible stream.
+    :param requests: dict, maps POI type names in POI_GENERATORS to counts
+    :param seed: int
+    :param shard_size: int, defaults to SHARD_SIZE
+    :return: list of tuple, (poi_type, shard_index, size, seed_sequence)
+    """
+    if shard_size < 1:
+        raise ValueError(f"plan_shards: shard_size must be a positive integer. "
+                         f"Value provided is {shard_size}.")
+    type_numbers = {poi_type: number for number, poi_type in enumerate(POI_GENERATORS)}
+    shards = []
+    for poi_type, count in requests.items():
+        if poi_type not in type_numbers:
+            raise ValueError(f"plan_shards: Unknown POI type '{poi_type}'. Known "
+                             f"types are {list(POI_GENERATORS)}.")
+        if count < 0:
+            raise ValueError(f"plan_shards: The count for {poi_type} must be a "
+                             f"positive integer or 0. Value provided is {count}.")
+        sizes = [shard_size] * (count // shard_size)
+        if count % shard_size or count == 0:
+            # A request for none still gets one empty shard, so the output
+            # has the type's columns.
+            sizes.append(count % shard_size)
+        type_seed = np.random.SeedSequence(seed, spawn_key=(type_numbers[poi_type],))
+        for shard_index, (size, shard_seed) in enumerate(zip(sizes,
+                                                             type_seed.spawn(len(sizes)))):
+            shards.append((poi_type, shard_index, size, shard_seed))
+    return shards
+
+
+def _init_worker(workbook, use_cache):
+    # Runs once in each worker process, so the workbook is loaded once per
+    # process rather than once per task.
+    global _worker_registry
+    _worker_registry = TableRegistry(workbook, use_cache=use_cache)
+
+
+def _attach_worker(handle):
+    # Runs once in each worker process instead of _init_worker() when the
+    # tables are shared, so nothing is parsed or unpickled.
+    global _worker_registry
+    _worker_registry = SharedTables.attach(handle)
+
+
+def _generate_shard(poi_type, size, shard_seed, record_rolls=True):
+    rng = np.random.default_rng(shard_seed)
+    return POI_GENERATORS[poi_type](size, _worker_registry, rng=rng,
+                                    record_rolls=record_rolls)
+
+
+def generate_world(requests, workbook, seed, workers=None, shard_size=SHARD_SIZE,
+                   use_cache=True, record_rolls=True, share_tables=False, debug=False):
+    """
+    Generates a mix of POI types across a pool of worker processes. The
+    request is cut into shards (see plan_shards()), each worker loads the
+    workbook once, and the shards are merged back in shard order. The same
+    seed gives identical output for any number of workers.
+
+    With workers=1 the shards run in this process. With use_cache=True the
+    workbook cache is warmed before the pool starts, so workers load the
+    compiled tables from the cache instead of parsing the workbook. With
+    record_rolls False results are sampled without rolling and the frames
+    have no '_roll' columns (see generate_divine_pois()).
+
+    With share_tables=True the workbook is loaded once, in this process, and
+    its compiled tables are published in shared memory (see SharedTables).
+    Workers attach to them instead of loading the workbook or its cache, so
+    memory and startup no longer grow with the number of workers.
+    :param requests: dict, maps POI type names in POI_GENERATORS to counts,
+        e.g. {'adventure_site': 50000, 'divine_poi': 20000}
+    :param workbook: filepath to the Excel workbook
+    :param seed: int
+    :param workers: int, defaults to None, which uses os.cpu_count()
+    :param shard_size: int, defaults to SHARD_SIZE
+    :param use_cache: bool, defaults to True
+    :param record_rolls: bool, defaults to True
+    :param share_tables: bool, defaults to False
+    :param debug: bool, defaults to False
+    :return: dict, maps each requested POI type to a pd.DataFrame
+    """
+    shards = plan_shards(requests, seed, shard_size=shard_size)
+    trace(_log, "generate_world: requests: %s, shards: %s, workers: %s.", requests,
+          len(shards), workers, debug=debug)
+    if use_cache and not share_tables:
+        warm_cache(workbook)
+
+    if workers == 1:
+        _init_worker(workbook, use_cache)
+        frames = [_generate_shard(poi_type, size, shard_seed, record_rolls)
+                  for poi_type, shard_index, size, shard_seed in shards]
+    else:
+        shared = None
+        if share_tables:
+            shared = SharedTables.publish(TableRegistry(workbook, use_cache=use_cache),
+                                          debug=debug)
+            initializer, initargs = _attach_worker, (shared.handle,)
+        else:
+            initializer, initargs = _init_worker, (workbook, use_cache)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                                     initargs=initargs) as pool:
+                # map() returns results in submission order, whichever worker
+                # finishes first.
+                frames = list(pool.map(_generate_shard,
+                                       [shard[0] for shard in shards],
+                                       [shard[2] for shard in shards],
+                                       [shard[3] for shard in shards],
+                                       [record_rolls] * len(shards)))
+        finally:
+            if shared is not None:
+                shared.close()
+
+    world = {}
+    for poi_type in requests:
+        parts = [frame for shard, frame in zip(shards, frames) if shard[0] == poi_type]
+        world[poi_type] = pd.concat(parts, ignore_index=True)
+    trace(_log, "generate_world: done. sizes: %s.",
+          {k: len(v) for k, v in world.items()}, debug=debug)
+    return world
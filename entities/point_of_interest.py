@@ -1,8 +1,34 @@
 from abc import ABC, abstractmethod
-from entities import Dice, return_die_roll
-from functions import return_range, get_table_result, get_dice_info, get_multicolumn_table_result
+from entities import compile_dice_expression
+from functions import get_table_result, get_multicolumn_table_result, get_rng, resolve_table, \
+    register_table, spawn_rngs, stored_table
+from functions.profiling import instrumented
+from functions.tracing import trace, enable_tracing
+import logging
 import pandas as pd
-import numpy as np
+
+
+_log = logging.getLogger(__name__)
+
+
+class SharedRng:
+    """
+    A generator shared by many POIs, such as those yielded by
+    iter_divine_pois(). Passed as a POI's rng, it costs the POI one pointer
+    instead of its own generator state; the POI spawns its own child
+    generator from it the first time it rerolls. None stands for the shared
+    default generator, looked up at each use.
+    """
+    __slots__ = ('rng',)
+
+    def __init__(self, rng=None):
+        """
+        :param rng: None, int, or np.random.Generator, defaults to None
+        """
+        self.rng = None if rng is None else get_rng(rng)
+
+    def __repr__(self):
+        return f"SharedRng({self.rng!r})"
 
 
 class PointOfInterest(ABC):
@@ -28,42 +54,97 @@ class PointOfInterest(ABC):
             and N is an integer, and Column 2: a string
         6) The first entry in Column 1 should be 1 and the m in the last
             row must equal N in the Column Header.
+    Criteria 4) and 6), along with row order and overlaps, are checked by
+    validate_table() when check_workbook() or a TableRegistry loads the
+    workbook.
+
+    POIs are compact records: they use __slots__ and hold their results
+    plus a small integer ID for each table, discoverability_table_id here,
+    that points into the process-wide table store (functions.table_store).
+    The tables themselves are shared, and rerolls reach them through the
+    store. discoverability_lookup and discoverability_table are read-only
+    properties that do the same.
     """
-    def __init__(self, discoverability_table:pd.DataFrame, debug=False):
+    __slots__ = ('discoverability', 'discoverability_table_id', '_rng', 'debug')
+
+    # Maps each attribute rolled on a table to the slot holding that table's
+    # ID. These are the fields reroll() accepts.
+    TABLE_FIELDS = {'discoverability': 'discoverability_table_id'}
+    # The attributes written out by to_record(), in order.
+    RESULT_FIELDS = ('discoverability',)
+
+    @instrumented("PointOfInterest.__init__")
+    def __init__(self, discoverability_table:pd.DataFrame, debug=False, rng=None, registry=None):
         """
         This abstract method generates the attribute discoverability
         using the method defined b
-        :param discoverability_table:pd.DataFrame
+        rng is the random stream used for every roll this POI makes,
+        including later rerolls. None uses the shared default generator,
+        looked up at every roll as Dice does, so seed_default_rng() applies
+        to POIs that already exist. The table is compiled once here and the
+        compiled form is reused by redo_discoverability(). A CompiledTable
+        may be passed instead of a DataFrame to share one across POIs, or a
+        worksheet name together with the TableRegistry that loaded it.
+        :param discoverability_table:pd.DataFrame, CompiledTable, or str
         :param debug: bool, defaults to False
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :param registry: TableRegistry, defaults to None
         """
-        if debug:
-            print(f"PointOfInterest.__init__: discoverability_table| "
-                  f"{discoverability_table}, debug: {debug}.")
-        self.discoverability_table = discoverability_table
-        cols = list(self.discoverability_table.columns)
-        if debug:
-            print(f"PointOfInterest.__init__: table: {self.discoverability_table}")
-            print(f"PointOfInterest.__init__: cols: {cols}.")
-        die_info = cols[0].lower()
-        if debug:
-            print(f"PointOfInterest.__init__: die_info: {die_info}.")
-        die_no, die_size = get_dice_info(die_info, debug=debug)
-        die = Dice(dice_size=die_size, dice_number=die_no)
-        roll = die.roll()
-        result = get_table_result(self.discoverability_table, roll)
+        trace(_log, "PointOfInterest.__init__: discoverability_table| %s, debug: %s.",
+              discoverability_table, debug, debug=debug)
+        lookup = resolve_table(discoverability_table, registry, debug=debug)
+        self.discoverability_table_id = register_table(lookup, debug=debug)
+        self.rng = rng
+        trace(_log, "PointOfInterest.__init__: table: %s", lookup, debug=debug)
+        die_info = lookup.roll_col_name.lower()
+        trace(_log, "PointOfInterest.__init__: die_info: %s.", die_info, debug=debug)
+        die = compile_dice_expression(die_info)
+        roll = die.roll(rng=self.rng)
+        result = get_table_result(lookup, roll)
         if result is None:
             error_msg = (f"Table format was invalid. No result could be "
                          f"determined")
-            print(f"PointOfInterest.__init__: {error_msg}")
             raise ValueError(error_msg)
         else:
             self.discoverability = result
-        if debug:
-            print(f"PointOfInterest.__init__: die_size: {die_size}. "
-                  f"die: {die}, roll: {roll}, result{result}.")
+        trace(_log, "PointOfInterest.__init__: die: %r, roll: %s, result: %s.", die,
+              roll, result, debug=debug)
 
         self.debug = debug
-        
+
+    @property
+    def rng(self):
+        """
+        :return: np.random.Generator, the shared default generator if none was
+            supplied
+        """
+        if isinstance(self._rng, SharedRng):
+            return get_rng(self._rng.rng)
+        return get_rng(self._rng)
+
+    @rng.setter
+    def rng(self, rng):
+        if rng is None or isinstance(rng, SharedRng):
+            self._rng = rng
+        else:
+            self._rng = get_rng(rng)
+
+    @property
+    def discoverability_lookup(self):
+        """
+        The compiled discoverability table, from the table store.
+        :return: CompiledTable
+        """
+        return stored_table(self.discoverability_table_id)
+
+    @property
+    def discoverability_table(self):
+        """
+        The discoverability table as a DataFrame, from the table store.
+        :return: pd.DataFrame
+        """
+        return self.discoverability_lookup.table
+
     @abstractmethod
     def __str__(self):
         """
@@ -80,33 +161,86 @@ class PointOfInterest(ABC):
         """
         pass
 
-    def redo_discoverability(self):
+    @classmethod
+    def table_fields(cls, fields=None):
+        """
+        Returns the list of fields to reroll, checking each against
+        TABLE_FIELDS.
+        :param fields: str or list of str, defaults to None, which means
+            every field in TABLE_FIELDS
+        :return: list of str
+        """
+        if fields is None:
+            return list(cls.TABLE_FIELDS)
+        if isinstance(fields, str):
+            fields = [fields]
+        unknown = [field for field in fields if field not in cls.TABLE_FIELDS]
+        if unknown:
+            raise ValueError(f"{cls.__name__}.reroll: Unknown field(s) {unknown}. "
+                             f"The fields that can be rerolled are "
+                             f"{list(cls.TABLE_FIELDS)}.")
+        return list(fields)
+
+    def reroll(self, fields=None):
         """
-        This method uses the attribute self.discoverability_table to rerun
-        the assignment of self.discoverability. All changes are internal.
+        This method rerolls only the named attributes, each on its own table
+        from the table store, using self.rng. All other attributes are left
+        untouched. All changes are internal. A POI whose rng is a SharedRng
+        first spawns its own generator from it. To reroll the same fields
+        across many POIs at once, use entities.reroll(pois, fields).
+        :param fields: str or list of str, names from TABLE_FIELDS, defaults
+            to None, which rerolls all of them
         :return:
         """
-        cols = self.discoverability_table.columns
-        if self.debug:
-            print(f"PointOfInterest.redo_discoverability: cols: {cols}.")
-        die_info = cols[0].lower()
-        if self.debug:
-            print(f"PointOfInterest.redo_discoverability: die_info: {die_info}.")
-        die_no, die_size = get_dice_info(die_info, debug=debug)
-        die = Dice(dice_size=die_size, dice_number=die_no)
-        roll = die.roll()
-        result = get_table_result(self.discoverability_table, roll)
-        if self.debug:
-            print(f"PointOfInterest.redo_discoverability: die_size: "
-                  f"{die_size}. die: {die}, roll: {roll}, result{result}.")
-        if result is None:
-            error_msg = (f"Table format was invalid. No result could be "
-                         f"determined")
-            print(f"PointOfInterest.redo_discoverability: {error_msg}")
-            raise ValueError(error_msg)
-        else:
-            self.discoverability = result
+        if isinstance(self._rng, SharedRng):
+            self._rng = spawn_rngs(self.rng, 1)[0]
+        for field in self.table_fields(fields):
+            lookup = stored_table(getattr(self, self.TABLE_FIELDS[field]))
+            die = compile_dice_expression(lookup.roll_col_name.lower())
+            roll = die.roll(rng=self.rng)
+            if lookup.extra_col_names:
+                result = get_multicolumn_table_result(lookup, roll, debug=self.debug)
+            else:
+                result = get_table_result(lookup, roll, debug=self.debug)
+            trace(_log, "PointOfInterest.reroll: field: %s, die: %r, roll: %s, "
+                  "result: %s.", field, die, roll, result, debug=self.debug)
+            if result is None:
+                raise ValueError(f"{type(self).__name__}.reroll: Table format was "
+                                 f"invalid. No result could be determined from "
+                                 f"{lookup} for roll {roll}.")
+            setattr(self, field, result)
 
+    def to_record(self, seed=None):
+        """
+        Returns the POI as a flat dict of plain values, for export (see
+        entities.export). It holds 'poi_type', the class name; every field
+        in RESULT_FIELDS; '<field>_table', the name of the worksheet each
+        field in TABLE_FIELDS was rolled on; and 'seed'. No table contents
+        are included, and the table names replace the table IDs, which are
+        only valid within this process. The record can be turned back into
+        a POI with entities.export.poi_from_record() and a TableRegistry of
+        the same workbook.
+        :param seed: int or numpy integer, the seed the POI was generated
+            from, stored as an int, defaults to None
+        :return: dict
+        """
+        record = {'poi_type': type(self).__name__}
+        for field in self.RESULT_FIELDS:
+            record[field] = getattr(self, field)
+        for field, id_slot in self.TABLE_FIELDS.items():
+            record[f"{field}_table"] = stored_table(getattr(self, id_slot)).name
+        record['seed'] = None if seed is None else int(seed)
+        return record
+
+    def redo_discoverability(self):
+        """
+        This method uses the compiled discoverability table, looked up in the
+        table store through self.discoverability_table_id, to rerun the
+        assignment of self.discoverability. All changes are internal. It is
+        the same as reroll(['discoverability']).
+        :return:
+        """
+        self.reroll(['discoverability'])
 
 
 class AdventureSite(PointOfInterest):
@@ -114,32 +248,62 @@ class AdventureSite(PointOfInterest):
     This subclass of PointOfInterest generates the simplest type of POI:
     an adventure site.
     """
-    def __init__(self, discoverability_table: pd.DataFrame, next_action='create workup', debug=False):
+    __slots__ = ('next_action',)
+
+    RESULT_FIELDS = ('discoverability', 'next_action')
+
+    @instrumented("AdventureSite.__init__")
+    def __init__(self, discoverability_table: pd.DataFrame, next_action='create workup', debug=False,
+                 rng=None, registry=None):
         """
-        __init__() requires only discoverability_table.
-        :param discoverability_table: pd.DataFrame
+        __init__() requires only discoverability_table. It may be a worksheet
+        name if registry is supplied.
+        :param discoverability_table: pd.DataFrame, CompiledTable, or str
         :param next_action: str, defaults to 'create workup'
         :param debug: bool, defaults to False
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :param registry: TableRegistry, defaults to None
         """
-        if debug:
-            print(f"AdventureSite: discoverability: {discoverability_table}. "
-                  f"debug: {debug}")
-        super().__init__(discoverability_table, debug=debug)
+        trace(_log, "AdventureSite: discoverability: %s. debug: %s",
+              discoverability_table, debug, debug=debug)
+        super().__init__(discoverability_table, debug=debug, rng=rng, registry=registry)
         self.next_action = next_action
         
     def __str__(self):
         output = f"discoverability: {self.discoverability}\n" \
                  f"next_action: {self.next_action}\n" \
-                 f"discoverability_table: {self.discoverability_table}"
+                 f"discoverability_table: {self.discoverability_lookup!r}"
         return output
     
     def __repr__(self):
-        output = (f"AdventureSite(pd.DataFrame(dict(d2= ['1-2'], "
-                  f"results=[\'{self.discoverability}\']), index=None), "
+        output = (f"AdventureSite(discoverability=\'{self.discoverability}\', "
                   f"next_action=\'{self.next_action}\', "
                   f"debug={self.debug})")
         return output
 
+    @classmethod
+    def from_record(cls, record, discoverability_table, debug=False, rng=None, registry=None):
+        """
+        Builds an AdventureSite from results that were already rolled, such
+        as a row of the DataFrame returned by generate_adventure_sites(). No
+        dice are rolled. The table is kept so the site can be rerolled later.
+        :param record: mapping or pd.Series with 'discoverability' and
+            'next_action'
+        :param discoverability_table: pd.DataFrame, CompiledTable, or str
+        :param debug: bool, defaults to False
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :param registry: TableRegistry, defaults to None
+        :return: AdventureSite
+        """
+        site = cls.__new__(cls)
+        site.discoverability_table_id = register_table(
+            resolve_table(discoverability_table, registry, debug=debug), debug=debug)
+        site.rng = rng
+        site.discoverability = record['discoverability']
+        site.next_action = record['next_action']
+        site.debug = debug
+        return site
+
 
 class DivinePOI(PointOfInterest):
     """
@@ -154,10 +318,14 @@ class DivinePOI(PointOfInterest):
         next_action: str
         location_type: str
         faction: str
-        divine_poi_table: pd.DataFrame
-        divine_factions_table: pd.DataFrame
-        divine_factions_action_table: pd.DataFrame
-    The tables are stored in case the GM or user needs to reroll the results.
+        divine_poi_table_id: int
+        divine_factions_table_id: int
+        divine_factions_action_table_id: int
+    The table IDs point into the process-wide table store, so the tables can
+    be reached in case the GM or user needs to reroll the results. The
+    tables are also available as the read-only properties divine_poi_table,
+    divine_factions_table, and divine_factions_action_table (DataFrames) and
+    the matching *_lookup properties (CompiledTables).
 
     The format of Divine POI and Divine Faction Action tables are the same as
     the format for POI Discoverability for PointOFInterest parent class. The
@@ -168,84 +336,179 @@ class DivinePOI(PointOfInterest):
     faction result for more complete information. All result columns must be
     strings.
     """
+    __slots__ = ('location_type', 'faction', 'next_action', 'divine_poi_table_id',
+                 'divine_factions_table_id', 'divine_factions_action_table_id')
+
+    TABLE_FIELDS = {
+        **PointOfInterest.TABLE_FIELDS,
+        'location_type': 'divine_poi_table_id',
+        'faction': 'divine_factions_table_id',
+        'next_action': 'divine_factions_action_table_id',
+    }
+    RESULT_FIELDS = ('discoverability', 'location_type', 'faction', 'next_action')
+
+    @instrumented("DivinePOI.__init__")
     def __init__(self,
                  discoverability_table: pd.DataFrame,
                  divine_poi_table: pd.DataFrame,
                  divine_factions_table: pd.DataFrame,
                  divine_factions_action_table: pd.DataFrame,
-                 debug=False):
+                 debug=False, rng=None, registry=None):
         """
         This method requires 4 pd.Dataframes to generate its attributes:
-        next_action, location_type, and faction. These tables are stored
-        as attributes to allow a redo of any attribute. debug controls
-        the behavior of output messages.
-        :param discoverability_table: pd.Dataframe
-        :param divine_poi_table: pd.Dataframe
-        :param divine_factions_table: pd.Dataframe
-        :param divine_factions_action_table: pd.Dataframe
+        next_action, location_type, and faction. These tables are kept in
+        the table store to allow a redo of any attribute. debug controls
+        the behavior of output messages. Any table may be given as a
+        worksheet name if registry is supplied.
+        :param discoverability_table: pd.Dataframe, CompiledTable, or str
+        :param divine_poi_table: pd.Dataframe, CompiledTable, or str
+        :param divine_factions_table: pd.Dataframe, CompiledTable, or str
+        :param divine_factions_action_table: pd.Dataframe, CompiledTable, or str
         :param debug: bool
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :param registry: TableRegistry, defaults to None
         """
-        super.__init__(discoverability_table, debug=debug)
-        self.divine_poi_table = divine_poi_table
-        self.divine_factions_table = divine_factions_table
-        self.divine_factions_action_table = divine_factions_action_table
-        if self.debug:
-            print(f"DivinePOI:__init__: diving_poi_table: {self.divine_poi_table}")
-            print(f"DivinePOI:__init__: divine_factions_table: {self.divine_factions_table}")
-            print(f"DivinePOI:__init__: divine_factions_action_table: "
-                  f"{self.divine_factions_action_table}")
+        super().__init__(discoverability_table, debug=debug, rng=rng, registry=registry)
+        divine_poi_lookup = resolve_table(divine_poi_table, registry, debug=debug)
+        # The factions table may carry up to two extra columns, which are
+        # appended to the faction.
+        divine_factions_lookup = resolve_table(divine_factions_table, registry,
+                                               result_col_header='Faction',
+                                               append_columns=True, debug=debug)
+        divine_factions_action_lookup = resolve_table(divine_factions_action_table,
+                                                      registry, debug=debug)
+        self.divine_poi_table_id = register_table(divine_poi_lookup, debug=debug)
+        self.divine_factions_table_id = register_table(divine_factions_lookup, debug=debug)
+        self.divine_factions_action_table_id = register_table(divine_factions_action_lookup,
+                                                              debug=debug)
+        trace(_log, "DivinePOI:__init__: diving_poi_table: %s", divine_poi_lookup.table,
+              debug=self.debug)
+        trace(_log, "DivinePOI:__init__: divine_factions_table: %s",
+              divine_factions_lookup.table, debug=self.debug)
+        trace(_log, "DivinePOI:__init__: divine_factions_action_table: %s",
+              divine_factions_action_lookup.table, debug=self.debug)
         results = []
-        for table in [self.divine_poi_table, self.divine_factions_table,
-                      self.divine_factions_action_table]:
-            if self.debug:
-                print(f"DivinePOI.__init__: Collecting results, starting with table, {table}.")
-            cols = table.columns
-            die_info = cols[0].lower()
-            if self.debug:
-                print(f"DivinePOI.__init__: die_info: {die_info}.")
-            die_no, die_size = get_dice_info(die_info, debug=self.debug)
-            die = Dice(dice_size=die_size, dice_number=die_no)
-            roll = die.roll()
-            if len(cols) > 2:
-                result = get_multicolumn_table_result(table)
+        for lookup in [divine_poi_lookup, divine_factions_lookup,
+                       divine_factions_action_lookup]:
+            trace(_log, "DivinePOI.__init__: Collecting results, starting with table, "
+                  "%s.", lookup, debug=self.debug)
+            die_info = lookup.roll_col_name.lower()
+            trace(_log, "DivinePOI.__init__: die_info: %s.", die_info, debug=self.debug)
+            die = compile_dice_expression(die_info)
+            roll = die.roll(rng=self.rng)
+            if lookup.extra_col_names:
+                result = get_multicolumn_table_result(lookup, roll, debug=self.debug)
             else:
-                result = get_table_result(table, cols[2], debug=debug)
-            if self.debug:
-                print(f"DivinePOI.__init__: result: {result}.")
+                result = get_table_result(lookup, roll, debug=self.debug)
+            if result is None:
+                raise ValueError(f"DivinePOI: Table format was invalid. No result could "
+                                 f"be determined from {lookup} for roll {roll}.")
+            trace(_log, "DivinePOI.__init__: result: %s.", result, debug=self.debug)
             results.append(result)
-            if self.debug:
-                print(f"DivinePOI.__init__: results: {results}")
+            trace(_log, "DivinePOI.__init__: results: %s", results, debug=self.debug)
         # Now, results[0] is the result from divine POI table, results[1]
         # is the result from divine factions table, and results[2] is the
         # result from the divine factions action table.
         self.location_type = results[0]
         self.faction = results[1]
         self.next_action = results[2]
-        if self.debug:
-            print(f"DivinePOI.__init__: location: {self.location_type}. "
-                  f"faction: {self.faction}. next_acton: {self.next_action}")
-            print(f"DivinePOI.__init__: init completed.")
+        trace(_log, "DivinePOI.__init__: location: %s. faction: %s. next_acton: %s",
+              self.location_type, self.faction, self.next_action,
+              debug=self.debug)
+        trace(_log, "DivinePOI.__init__: init completed.", debug=self.debug)
+
+    @property
+    def divine_poi_lookup(self):
+        return stored_table(self.divine_poi_table_id)
+
+    @property
+    def divine_factions_lookup(self):
+        return stored_table(self.divine_factions_table_id)
+
+    @property
+    def divine_factions_action_lookup(self):
+        return stored_table(self.divine_factions_action_table_id)
+
+    @property
+    def divine_poi_table(self):
+        return self.divine_poi_lookup.table
+
+    @property
+    def divine_factions_table(self):
+        return self.divine_factions_lookup.table
+
+    @property
+    def divine_factions_action_table(self):
+        return self.divine_factions_action_lookup.table
 
     def __str__(self):
         output = f"discoverability: {self.discoverability}\n" \
-                 f"discoverability_table: {self.discoverability_table}\n" \
+                 f"discoverability_table: {self.discoverability_lookup!r}\n" \
                  f"location_type: {self.location_type}\n" \
-                 f"divine_poi_table : {self.divine_poi_table}\n" \
+                 f"divine_poi_table : {self.divine_poi_lookup!r}\n" \
                  f"faction: {self.faction}\n" \
-                 f"divine_factions_table: {self.divine_factions_table}\n" \
+                 f"divine_factions_table: {self.divine_factions_lookup!r}\n" \
                  f"next_action: {self.next_action}\n" \
                  f"divine_factions_action_table: " \
-                 f"{self.divine_factions_action_table}"
+                 f"{self.divine_factions_action_lookup!r}"
+        return output
+
+    @classmethod
+    def from_record(cls, record, discoverability_table, divine_poi_table,
+                    divine_factions_table, divine_factions_action_table,
+                    debug=False, rng=None, registry=None):
+        """
+        Builds a DivinePOI from results that were already rolled, such as a
+        row of the DataFrame returned by generate_divine_pois(). No dice are
+        rolled. The tables are kept so the POI can be rerolled later.
+        :param record: mapping or pd.Series with 'discoverability',
+            'location_type', 'faction', and 'next_action'
+        :param discoverability_table: pd.Dataframe, CompiledTable, or str
+        :param divine_poi_table: pd.Dataframe, CompiledTable, or str
+        :param divine_factions_table: pd.Dataframe, CompiledTable, or str
+        :param divine_factions_action_table: pd.Dataframe, CompiledTable, or str
+        :param debug: bool, defaults to False
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :param registry: TableRegistry, defaults to None
+        :return: DivinePOI
+        """
+        poi = cls.__new__(cls)
+        poi.discoverability_table_id = register_table(
+            resolve_table(discoverability_table, registry, debug=debug), debug=debug)
+        poi.divine_poi_table_id = register_table(
+            resolve_table(divine_poi_table, registry, debug=debug), debug=debug)
+        poi.divine_factions_table_id = register_table(
+            resolve_table(divine_factions_table, registry, result_col_header='Faction',
+                          append_columns=True, debug=debug), debug=debug)
+        poi.divine_factions_action_table_id = register_table(
+            resolve_table(divine_factions_action_table, registry, debug=debug), debug=debug)
+        poi.rng = rng
+        poi.discoverability = record['discoverability']
+        poi.location_type = record['location_type']
+        poi.faction = record['faction']
+        poi.next_action = record['next_action']
+        poi.debug = debug
+        return poi
+
+    def __repr__(self):
+        output = (f"DivinePOI(discoverability=\'{self.discoverability}\', "
+                  f"location_type=\'{self.location_type}\', "
+                  f"faction=\'{self.faction}\', "
+                  f"next_action=\'{self.next_action}\', "
+                  f"debug={self.debug})")
         return output
 
 if __name__ == "__main__":
+    from functions import TableRegistry
     print(f"main: Beginning testing")
     debug = True
+    enable_tracing()
     ws_name = "POI Discoverability"
     fp = "../data_orig/tables.xlsx"
-    discoverability_table = pd.read_excel(fp, sheet_name=ws_name, index_col=None, na_values=True)
-    adv01 = AdventureSite(discoverability_table, debug=debug)
-    adv02 = AdventureSite(discoverability_table, next_action="testing", debug=debug)
+    registry = TableRegistry(fp, [ws_name], debug=debug)
+    print(f"main: registry report: {registry.report}")
+    adv01 = AdventureSite(ws_name, debug=debug, registry=registry)
+    adv02 = AdventureSite(ws_name, next_action="testing", debug=debug, registry=registry)
     print(f"main: Printing tests:")
     print(f"main: adv01: {adv01}")
     print(f"main: adv02: {adv02}")
@@ -259,3 +522,8 @@ if __name__ == "__main__":
     print(f"main: adv02: {adv02}")
     print(f"main: adv01: {repr(adv01)}")
     print(f"main: adv02: {repr(adv02)}")
+    print(f"main: Testing DivinePOI.")
+    divine01 = DivinePOI(ws_name, "Divine POI", "Current Divine Factions",
+                         "Divine Faction Action", debug=debug, registry=registry)
+    print(f"main: divine01: {divine01}")
+    print(f"main: divine01: {repr(divine01)}")
@@ -0,0 +1,88 @@
+from entities.generation_service import GenerationService
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+
+class JobSignals(QObject):
+    """
+    The signals of one QtGenerationService job. They are emitted from the
+    pool's thread and, connected to slots of GUI objects, delivered in the
+    GUI thread:
+        chunk(pd.DataFrame): a chunk of POIs
+        progress(int, int): POIs done, POIs requested
+        finished(GenerationJob): the job ended, finished or cancelled
+        failed(Exception): generation raised
+    job is the GenerationJob, for cancel() and progress.
+    """
+    chunk = Signal(object)
+    progress = Signal(int, int)
+    finished = Signal(object)
+    failed = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.job = None
+
+
+class _JobRunnable(QRunnable):
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def run(self):
+        self.job.run()
+
+
+class QtGenerationService(GenerationService):
+    """
+    GenerationService for PySide6 front ends. Jobs run on a QThreadPool,
+    the application's global pool by default, and report through Qt
+    signals instead of callbacks. The slots given to submit() are connected
+    before the job starts, so none of its chunks are missed:
+        signals = service.submit('divine_poi', 100_000, seed=1,
+                                 on_chunk=model.append_frame,
+                                 on_progress=progress_bar.update)
+        cancel_button.clicked.connect(signals.job.cancel)
+    """
+    def __init__(self, workbook, pool=None, **kwargs):
+        """
+        :param workbook: filepath to the Excel workbook
+        :param pool: QThreadPool, defaults to None, which uses
+            QThreadPool.globalInstance()
+        :param kwargs: as for GenerationService
+        """
+        super().__init__(workbook, **kwargs)
+        self.pool = pool if pool is not None else QThreadPool.globalInstance()
+
+    def submit(self, poi_type, n, seed=None, on_chunk=None, on_progress=None,
+               on_done=None, on_error=None, record_rolls=True, keep_results=False):
+        """
+        Queues a job of n POIs of poi_type and returns its signals at once.
+        Each on_* slot is connected to the matching signal. The chunks are
+        not kept by default, since the GUI receives them.
+        :param poi_type: str, a POI type name in POI_GENERATORS
+        :param n: int
+        :param seed: None, int, or np.random.Generator, defaults to None
+        :param on_chunk: slot for JobSignals.chunk, defaults to None
+        :param on_progress: slot for JobSignals.progress, defaults to None
+        :param on_done: slot for JobSignals.finished, defaults to None
+        :param on_error: slot for JobSignals.failed, defaults to None
+        :param record_rolls: bool, defaults to True
+        :param keep_results: bool, defaults to False
+        :return: JobSignals
+        """
+        signals = JobSignals()
+        for signal, slot in ((signals.chunk, on_chunk), (signals.progress, on_progress),
+                             (signals.finished, on_done), (signals.failed, on_error)):
+            if slot is not None:
+                signal.connect(slot)
+        signals.job = super().submit(poi_type, n, seed=seed,
+                                     on_chunk=signals.chunk.emit,
+                                     on_progress=signals.progress.emit,
+                                     on_done=signals.finished.emit,
+                                     on_error=signals.failed.emit,
+                                     record_rolls=record_rolls,
+                                     keep_results=keep_results)
+        return signals
+
+    def _start(self, job):
+        self.pool.start(_JobRunnable(job))
@@ -0,0 +1,257 @@
+from collections import namedtuple
+from entities.dice import compile_dice_expression
+from functions import get_rng
+from functions.tracing import trace
+import logging
+import re
+import numpy as np
+import pandas as pd
+
+
+_log = logging.getLogger(__name__)
+
+# A link from a result cell to another worksheet. expression is the dice
+# expression to roll on it, or None to use the worksheet's own header.
+Reference = namedtuple("Reference", "sheet expression")
+
+# Longest chain of links followed before resolution gives up.
+MAX_DEPTH = 16
+
+
+class TableGraph:
+    """
+    This class resolves chained tables: result cells that send the reader
+    on to another worksheet. A cell links to a worksheet in either of two
+    ways, anywhere in its text:
+        1) [[Sheet Name]] rolls the worksheet's own header dice on it.
+        2) 'roll 2d6 on Sheet Name' (or 'roll on Sheet Name') rolls the
+            given dice expression on it. The worksheet name must match one
+            in the registry, ignoring case.
+    Each link is replaced by the result rolled on the linked worksheet, and
+    links in that result are followed in turn. A cell with several links
+    rolls each of them.
+
+    Resolution is done in batches, level by level. All the rolls waiting on
+    the same worksheet and dice are drawn and looked up in one array
+    operation, whatever the number of POIs, and the finished strings are
+    assembled level by level on the way back. No POI is resolved by a
+    recursive call of its own.
+
+    Each worksheet is compiled and has its links parsed once per graph, and
+    the compiled tables come from the registry, so every POI shares them.
+    Worksheets that link to each other in a cycle are refused, and chains
+    longer than max_depth raise a ValueError.
+    """
+    def __init__(self, registry, max_depth=MAX_DEPTH, debug=False):
+        """
+        :param registry: TableRegistry
+        :param max_depth: int, defaults to MAX_DEPTH
+        :param debug: bool, defaults to False
+        """
+        self.registry = registry
+        self.max_depth = max_depth
+        self.debug = debug
+        self._names = {name.lower(): name for name in registry}
+        link = r"\[\[\s*(?P<link>[^\]]+?)\s*\]\]"
+        if self._names:
+            # Longer names first, so 'Divine POI Extras' is not read as
+            # 'Divine POI' followed by text.
+            names = sorted(self._names, key=len, reverse=True)
+            sheets = "|".join(re.escape(name) for name in names)
+            link += rf"|\broll\s+(?:(?P<expr>\S+)\s+)?on\s+(?P<sheet>{sheets})\b"
+        self._pattern = re.compile(link, re.IGNORECASE)
+        self._nodes = {}
+        self._acyclic = set()
+
+    def __repr__(self):
+        return f"TableGraph({self.registry!r}, max_depth={self.max_depth})"
+
+    def parse_cell(self, text):
+        """
+        Splits a result cell around its links.
+        :param text: str
+        :return: tuple, (pieces, references) where pieces is the list of
+            literal text around the links, one longer than references, or
+            None if the cell has no links
+        """
+        if not isinstance(text, str):
+            return None
+        pieces = []
+        references = []
+        pos = 0
+        for match in self._pattern.finditer(text):
+            if match.group('link') is not None:
+                sheet, expression = match.group('link'), None
+            else:
+                sheet, expression = match.group('sheet'), match.group('expr')
+            try:
+                sheet = self._names[sheet.lower()]
+            except KeyError:
+                raise ValueError(f"TableGraph: The cell '{text}' links to '{sheet}', "
+                                 f"which is not a worksheet in "
+                                 f"{self.registry.input_fp}.") from None
+            pieces.append(text[pos:match.start()])
+            references.append(Reference(sheet, expression))
+            pos = match.end()
+        if not references:
+            return None
+        pieces.append(text[pos:])
+        return pieces, references
+
+    def node(self, name):
+        """
+        Returns the compiled worksheet and the parsed links of its rows. The
+        result column is 'Results'. A worksheet without one, such as
+        'Current Divine Factions', uses its second column with the others
+        appended.
+        :param name: str
+        :return: tuple, (compiled, links) where links maps row positions
+            to the (pieces, references) of their cells
+        """
+        node = self._nodes.get(name)
+        if node is None:
+            cols = list(self.registry.table(name).columns)
+            if len(cols) > 2 and 'Results' not in cols:
+                compiled = self.registry.compiled(name, result_col_header=cols[1],
+                                                  append_columns=True)
+            else:
+                compiled = self.registry.compiled(name)
+            links = {}
+            for row, result in enumerate(compiled.results):
+                parsed = self.parse_cell(result)
+                if parsed is not None:
+                    links[row] = parsed
+            node = (compiled, links)
+            self._nodes[name] = node
+            trace(_log, "TableGraph.node: %s: links: %s.", name, links, debug=self.debug)
+        return node
+
+    def check_cycles(self, name):
+        """
+        Raises a ValueError if the worksheet can link back to itself through
+        any chain of links.
+        :param name: str
+        :return:
+        """
+        if name in self._acyclic:
+            return
+        # Depth-first search over the worksheets, keeping the current path
+        # to report the cycle.
+        path = []
+        on_path = set()
+
+        def visit(sheet):
+            if sheet in self._acyclic:
+                return
+            if sheet in on_path:
+                cycle = path[path.index(sheet):] + [sheet]
+                raise ValueError(f"TableGraph: The worksheets link to each other in a "
+                                 f"cycle: {' -> '.join(cycle)}.")
+            path.append(sheet)
+            on_path.add(sheet)
+            compiled, links = self.node(sheet)
+            for pieces, references in links.values():
+                for reference in references:
+                    visit(reference.sheet)
+            path.pop()
+            on_path.discard(sheet)
+            self._acyclic.add(sheet)
+
+        visit(name)
+
+    def resolve(self, name, n, rng=None, expression=None):
+        """
+        Rolls n times on the named worksheet and follows every link in the
+        results.
+        :param name: str
+        :param n: int
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :param expression: str, the dice to roll, defaults to None, which
+            uses the worksheet's header
+        :return: np.ndarray of object, the n finished results
+        """
+        self.check_cycles(name)
+        texts = np.empty(n, dtype=object)
+        jobs = {Reference(name, expression): [np.arange(n)]}
+        return self._run(jobs, [], texts, get_rng(rng))[:n].copy()
+
+    def expand(self, values, rng=None):
+        """
+        Follows the links in values, such as a result column returned by
+        generate_divine_pois(), and returns the finished strings. Values
+        without links are returned unchanged.
+        :param values: array-like of str
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :return: np.ndarray of object
+        """
+        texts = np.empty(len(values), dtype=object)
+        texts[:] = list(values)
+        codes, uniques = pd.factorize(texts)
+        jobs = {}
+        composites = []
+        size = len(texts)
+        for code, value in enumerate(uniques):
+            parsed = self.parse_cell(value)
+            if parsed is None:
+                continue
+            for reference in parsed[1]:
+                self.check_cycles(reference.sheet)
+            parents = np.flatnonzero(codes == code)
+            size = self._link(parents, parsed, size, jobs, composites)
+        texts = np.concatenate([texts, np.empty(size - len(texts), dtype=object)])
+        return self._run(jobs, composites, texts, get_rng(rng))[:len(values)].copy()
+
+    @staticmethod
+    def _link(parents, parsed, size, jobs, composites):
+        # Gives each link of each parent slot a new child slot, queues the
+        # children on the linked worksheet, and records how to assemble the
+        # parents once the children are done.
+        pieces, references = parsed
+        children = []
+        for reference in references:
+            ids = np.arange(size, size + len(parents))
+            size += len(parents)
+            jobs.setdefault(reference, []).append(ids)
+            children.append(ids)
+        composites.append((parents, pieces, children))
+        return size
+
+    def _run(self, jobs, composites, texts, rng):
+        depth = 0
+        size = len(texts)
+        while jobs:
+            if depth >= self.max_depth:
+                raise ValueError(f"TableGraph: The chain of links is longer than "
+                                 f"max_depth ({self.max_depth}). Still pending: "
+                                 f"{sorted({ref.sheet for ref in jobs})}.")
+            next_jobs = {}
+            for reference, parts in jobs.items():
+                slots = np.concatenate(parts)
+                compiled, links = self.node(reference.sheet)
+                expression = reference.expression or compiled.roll_col_name
+                rolls = compile_dice_expression(expression.lower()).roll(len(slots), rng=rng)
+                rows = compiled.row_indices(rolls)
+                if (rows < 0).any():
+                    raise ValueError(f"TableGraph: No result could be determined from "
+                                     f"{compiled} for rolls "
+                                     f"{sorted(set(rolls[rows < 0].tolist()))} of "
+                                     f"{expression}.")
+                texts[slots] = compiled.results[rows]
+                for row in np.unique(rows).tolist():
+                    if row in links:
+                        size = self._link(slots[rows == row], links[row], size,
+                                          next_jobs, composites)
+                trace(_log, "TableGraph._run: depth: %s, %s: %s rolls.", depth,
+                      reference, len(slots), debug=self.debug)
+            texts = np.concatenate([texts, np.empty(size - len(texts), dtype=object)])
+            jobs = next_jobs
+            depth += 1
+
+        # Children always come after their parents in composites, so going
+        # backwards finishes every child before it is used.
+        for parents, pieces, children in reversed(composites):
+            assembled = np.full(len(parents), pieces[0], dtype=object)
+            for ids, piece in zip(children, pieces[1:]):
+                assembled = assembled + texts[ids] + piece
+            texts[parents] = assembled
+        return texts
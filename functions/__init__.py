@@ -1,3 +1,47 @@
-from .text_manipulation import return_range
-from .data_checks import check_workbook
-from .data_functions import get_table_result, get_dice_info, get_multicolumn_table_result
+# Only the modules that need neither pandas nor a workbook are imported up
+# front, so 'from functions import get_dice_info' stays light. The rest are
+# imported the first time one of their names is used (see __getattr__).
+_LAZY = {
+    'CompiledTable': 'compiled_table',
+    'compile_table': 'compiled_table',
+    'check_workbook': 'data_checks',
+    'read_workbook': 'data_checks',
+    'cache_path': 'table_cache',
+    'invalidate_cache': 'table_cache',
+    'warm_cache': 'table_cache',
+    'TableRegistry': 'table_registry',
+    'resolve_table': 'table_registry',
+    'SharedTable': 'shared_tables',
+    'WorkbookWatcher': 'workbook_watch',
+    'sheet_digests': 'workbook_watch',
+    'SharedTables': 'shared_tables',
+    'get_table_result': 'data_functions',
+    'get_multicolumn_table_result': 'data_functions',
+    'get_multicolumn_table_results': 'data_functions',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(f"{__name__}.{module_name}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+from .tracing import enable_tracing, disable_tracing
+from .profiling import profiled, stage_timer, instrumented, enable_profiling, disable_profiling, \
+    reset_profile, profile_stats, profile_report
+from .text_manipulation import return_range, parse_range_column
+from .random_streams import get_rng, seed_default_rng, spawn_rngs
+from .dice_notation import get_dice_info, parse_dice_expression, expression_bounds
+from .probability import dice_pmf, expression_pmf, table_result_probabilities
+from .alias_sampling import AliasTable
+from .table_validation import validate_table
+from .table_store import TableStore, table_store, register_table, stored_table
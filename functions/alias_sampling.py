@@ -0,0 +1,71 @@
+from functions.random_streams import get_rng
+import numpy as np
+
+
+class AliasTable:
+    """
+    This class draws indices from a fixed discrete distribution in O(1) per
+    draw, using Walker's alias method as built by Vose. Each of the k
+    indices gets a column holding its own share and, when that share is
+    under 1/k, the index of an alias that fills the rest. A draw picks a
+    column uniformly and keeps it or takes its alias with one comparison, so
+    the cost does not depend on the number of indices or on how the
+    probabilities were derived. Array draws are a single vectorized
+    operation.
+    """
+    def __init__(self, probs):
+        """
+        :param probs: array-like of float, non-negative, summing to 1
+        """
+        probs = np.asarray(probs, dtype=np.float64)
+        if probs.ndim != 1 or len(probs) == 0:
+            raise ValueError(f"AliasTable: probs must be a non-empty 1-D array. "
+                             f"Shape provided is {probs.shape}.")
+        if (probs < 0).any() or not np.isclose(probs.sum(), 1.0):
+            raise ValueError(f"AliasTable: probs must be non-negative and sum to 1. "
+                             f"Sum provided is {probs.sum()}.")
+        size = len(probs)
+        scaled = probs * (size / probs.sum())
+        self.prob = np.ones(size)
+        self.alias = np.arange(size)
+        small = [i for i in range(size) if scaled[i] < 1.0]
+        large = [i for i in range(size) if scaled[i] >= 1.0]
+        while small and large:
+            low = small.pop()
+            high = large.pop()
+            self.prob[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] = scaled[high] + scaled[low] - 1.0
+            if scaled[high] < 1.0:
+                small.append(high)
+            else:
+                large.append(high)
+        # Whatever is left is 1 up to rounding error, and keeps its own
+        # column.
+        self._prob_list = self.prob.tolist()
+        self._alias_list = self.alias.tolist()
+
+    def __len__(self):
+        return len(self.prob)
+
+    def __repr__(self):
+        return f"AliasTable(size={len(self)})"
+
+    def sample(self, n=None, rng=None):
+        """
+        Draws indices from the distribution. With n None one index is
+        returned as an int; with n an integer, an array of n indices.
+        :param n: None or int, defaults to None
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :return: int or np.ndarray of int
+        """
+        rng = get_rng(rng)
+        size = len(self.prob)
+        if n is None:
+            column = int(rng.integers(size))
+            if rng.random() < self._prob_list[column]:
+                return column
+            return self._alias_list[column]
+        columns = rng.integers(size, size=n)
+        keep = rng.random(n) < self.prob[columns]
+        return np.where(keep, columns, self.alias[columns])
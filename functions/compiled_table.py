@@ -0,0 +1,342 @@
+from bisect import bisect_right
+import hashlib
+from functions import parse_range_column, table_result_probabilities
+from functions.alias_sampling import AliasTable
+from functions.shared_tables import SharedTable
+from functions.tracing import trace, table_logger_name
+import logging
+import numpy as np
+import pandas as pd
+
+
+class CompiledTable:
+    """
+    This class holds a roll table in a form that can be looked up without
+    scanning or re-parsing it. It is built once per DataFrame. The range
+    strings in the roll column are parsed into sorted integer arrays of
+    lower and upper bounds, and lookups use bisection on those bounds. When
+    the span of rolls is small enough, a dense roll -> row array is built as
+    well so a lookup is a single index operation.
+
+    The DataFrame must have the format described in get_table_result(). Rows
+    whose roll cell is '-' are ignored, and a '-' result is reported as
+    'nothing'. The compiled table does not follow later in-place edits of
+    the DataFrame; compile it again after changing the table.
+
+    With append_columns=True, every column after the roll column other than
+    the result column is appended to the result, as the 'Current Divine
+    Factions' table needs: 'Sun Order (Alignment: LG, Domain: Light)'. The
+    combined strings are built once here, so lookups cost the same as for a
+    two column table.
+
+    Tracing goes to the logger 'functions.tables.<name>', so one table can be
+    traced with enable_tracing(tables=[name]) without slowing the others.
+
+    A table that passed validate_table() when its workbook was loaded is
+    marked trusted (see mark_trusted()). Every roll of its header's dice is
+    then known to hit exactly one row, and lookup_trusted() answers it with
+    no range or miss checks.
+
+    sample() draws results straight from the distribution the header's dice
+    induce over the rows, through an alias table, without rolling. Use
+    lookup() or lookup_many() on rolled dice when the roll itself must be
+    recorded.
+    """
+    # Largest roll span that gets a dense roll -> row array (d1000 and below).
+    DENSE_LIMIT = 1024
+
+    def __init__(self, table: pd.DataFrame, result_col_header='Results', name=None,
+                 append_columns=False, debug=False):
+        """
+        :param table: pd.DataFrame
+        :param result_col_header: str, defaults to 'Results'. Only used when
+            the table has more than two columns.
+        :param name: str, the table (worksheet) name, defaults to None
+        :param append_columns: bool, defaults to False
+        :param debug: bool, defaults to False
+        """
+        col_names = list(table.columns)
+        if len(col_names) < 2:
+            raise ValueError(f"CompiledTable: table has incorrect format. It must "
+                             f"have at least 2 columns. Columns found: {col_names}.")
+        elif len(col_names) == 2:
+            result_col_name = col_names[1]
+        elif result_col_header in col_names:
+            result_col_name = result_col_header
+        else:
+            raise ValueError(f"CompiledTable: table has incorrect format. There is "
+                             f"no '{result_col_header}' column. Columns found: "
+                             f"{col_names}.")
+        self.table = table
+        self.name = name
+        self.log = logging.getLogger(table_logger_name(name))
+        self.roll_col_name = col_names[0]
+        self.result_col_name = result_col_name
+        self.column_count = len(col_names)
+        self.extra_col_names = []
+        result_values = table[result_col_name]
+        if append_columns:
+            self.extra_col_names = [c for c in col_names[1:] if c != result_col_name]
+            result_values = append_result_columns(table, result_col_name,
+                                                  self.extra_col_names)
+
+        # The whole roll column is parsed in one pass. A blank first cell is
+        # read as 1, since Excel sometimes loses a '1' at the top of the table.
+        lows, highs, ignored = parse_range_column(table[self.roll_col_name])
+        keep = ~ignored
+        if not keep.any():
+            raise ValueError(f"CompiledTable: table has no usable rows in column "
+                             f"{self.roll_col_name}.")
+        results = np.empty(len(result_values), dtype=object)
+        results[:] = list(result_values)
+        results = results[keep]
+        results[results == "-"] = "nothing"
+
+        order = np.argsort(lows[keep], kind="stable")
+        self.lows = lows[keep][order]
+        self.highs = highs[keep][order]
+        self.results = results[order]
+        self.min_roll = int(self.lows[0])
+        self.max_roll = int(self.highs.max())
+        self._lows_list = self.lows.tolist()
+        self._highs_list = self.highs.tolist()
+
+        # Rows are written in reverse so that, where ranges overlap, the row
+        # listed first wins, as it did with the original row scan.
+        span = self.max_roll - self.min_roll + 1
+        if span <= self.DENSE_LIMIT:
+            dense = np.full(span, -1, dtype=np.int64)
+            for idx in range(len(self.lows) - 1, -1, -1):
+                dense[self.lows[idx] - self.min_roll:self.highs[idx] - self.min_roll + 1] = idx
+            self._dense = dense
+        else:
+            self._dense = None
+        self.trusted = False
+        self._by_roll = None
+        self._alias = None
+        self._content_key = None
+        trace(self.log, "CompiledTable.__init__: lows: %s, highs: %s, results: %s, "
+              "dense: %s.", self.lows, self.highs, self.results,
+              self._dense is not None, debug=debug)
+
+    def __len__(self):
+        return len(self.lows)
+
+    def __repr__(self):
+        return (f"CompiledTable({self.name or self.roll_col_name!r}, rows={len(self)}, "
+                f"rolls={self.min_roll}-{self.max_roll})")
+
+    def reads_result_column(self, result_col_header):
+        """
+        Returns whether lookups on this table answer for result_col_header:
+        the table was compiled from that column, or it has only one result
+        column, which is used whatever the header.
+        :param result_col_header: str
+        :return: bool
+        """
+        return self.column_count == 2 or self.result_col_name == result_col_header
+
+    def content_key(self):
+        """
+        Returns a key that identifies the table by what a lookup can return:
+        its name, columns, trust, and a digest of its bounds and results. It
+        is computed the first time it is needed and kept.
+        :return: tuple
+        """
+        if self._content_key is None:
+            digest = hashlib.sha256()
+            digest.update(self.lows.tobytes())
+            digest.update(self.highs.tobytes())
+            digest.update("\x1e".join(map(str, self.results)).encode())
+            self._content_key = (self.name, self.roll_col_name, self.result_col_name,
+                                 tuple(self.extra_col_names), self.trusted,
+                                 digest.hexdigest())
+        return self._content_key
+
+    def row_index(self, roll):
+        """
+        Returns the position of the row containing roll, or -1 if no row
+        covers it.
+        :param roll: int
+        :return: int
+        """
+        if self._dense is not None:
+            if self.min_roll <= roll <= self.max_roll:
+                return int(self._dense[roll - self.min_roll])
+            return -1
+        idx = bisect_right(self._lows_list, roll) - 1
+        if idx >= 0 and roll <= self._highs_list[idx]:
+            return idx
+        return -1
+
+    def row_indices(self, rolls):
+        """
+        Vectorized form of row_index(). Rolls not covered by any row map to -1.
+        :param rolls: array-like of int
+        :return: np.ndarray of int
+        """
+        rolls = np.asarray(rolls, dtype=np.int64)
+        if self._dense is not None:
+            offsets = rolls - self.min_roll
+            in_range = (offsets >= 0) & (offsets < len(self._dense))
+            idx = np.full(rolls.shape, -1, dtype=np.int64)
+            idx[in_range] = self._dense[offsets[in_range]]
+            return idx
+        idx = np.searchsorted(self.lows, rolls, side="right") - 1
+        hit = idx >= 0
+        hit[hit] = rolls[hit] <= self.highs[idx[hit]]
+        return np.where(hit, idx, -1)
+
+    def lookup(self, roll):
+        """
+        Returns the result for roll, or None if no row covers it.
+        :param roll: int
+        :return: str or NoneType
+        """
+        idx = self.row_index(roll)
+        if idx < 0:
+            return None
+        return self.results[idx]
+
+    def mark_trusted(self):
+        """
+        Marks the table as validated, so lookups can skip their checks. Only
+        call this for a table that passed validate_table(). Tables small
+        enough for the dense array also get a roll -> result dict, making a
+        trusted lookup a single dict access.
+        """
+        self.trusted = True
+        self._content_key = None
+        if self._dense is not None:
+            rolls = range(self.min_roll, self.max_roll + 1)
+            self._by_roll = dict(zip(rolls, self.results[self._dense].tolist()))
+
+    def lookup_trusted(self, roll):
+        """
+        Returns the result for roll on a trusted table, or None if roll is
+        outside the table's range. The rows are not checked: a validated table
+        has no gaps between its lowest and highest roll.
+        :param roll: int
+        :return: str or NoneType
+        """
+        if self._by_roll is not None:
+            return self._by_roll.get(roll)
+        if not self.min_roll <= roll <= self.max_roll:
+            return None
+        return self.results[bisect_right(self._lows_list, roll) - 1]
+
+    def alias_table(self):
+        """
+        Returns the alias table over the rows, built the first time it is
+        needed. Each row's probability is computed exactly from the header's
+        dice (see table_result_probabilities()) and its range.
+        :return: AliasTable
+        """
+        if self._alias is None:
+            row_probs, miss_prob = table_result_probabilities(self)
+            if miss_prob > 0:
+                raise ValueError(f"CompiledTable: {self} does not cover every roll of "
+                                 f"{self.roll_col_name}; {miss_prob:.4f} of rolls give "
+                                 f"no result, so it cannot be sampled.")
+            self._alias = AliasTable(row_probs)
+        return self._alias
+
+    def sample(self, n=None, rng=None):
+        """
+        Draws results with the same distribution as rolling the header's
+        dice and looking the rolls up, in O(1) per draw whatever the dice or
+        the number of rows. No rolls are produced. With n None one result is
+        returned; with n an integer, an array of n results.
+        :param n: None or int, defaults to None
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :return: str or np.ndarray of object
+        """
+        rows = self.alias_table().sample(n, rng=rng)
+        return self.results[rows]
+
+    def lookup_many(self, rolls):
+        """
+        Returns the results for a whole array of rolls in one call. Rolls not
+        covered by any row give None.
+        :param rolls: array-like of int
+        :return: np.ndarray of object
+        """
+        if self.trusted and self._dense is not None:
+            rolls = np.asarray(rolls, dtype=np.int64)
+            offsets = rolls - self.min_roll
+            if offsets.size == 0 or (offsets.min() >= 0 and offsets.max() < len(self._dense)):
+                return self.results[self._dense[offsets]]
+        idx = self.row_indices(rolls)
+        output = self.results[np.maximum(idx, 0)]
+        output[idx < 0] = None
+        return output
+
+
+def append_result_columns(table, result_col_name, extra_col_names):
+    """
+    Returns one string per row of table: the result column followed by the
+    extra columns in parentheses, as 'header: value' pairs. Blank cells in the
+    extra columns are left out, and a '-' result is kept as is.
+    :param table: pd.DataFrame
+    :param result_col_name: str
+    :param extra_col_names: list of str
+    :return: list of str
+    """
+    combined = []
+    extra_cols = [table[c] for c in extra_col_names]
+    for idx, result in enumerate(table[result_col_name]):
+        extras = []
+        for header, col in zip(extra_col_names, extra_cols):
+            value = col.iloc[idx]
+            if pd.isna(value) or str(value).strip() == "":
+                continue
+            extras.append(f"{header}: {value}")
+        if result == "-" or len(extras) == 0:
+            combined.append(result)
+        else:
+            combined.append(f"{result} ({', '.join(extras)})")
+    return combined
+
+
+def compile_table(table, result_col_header='Results', name=None, append_columns=False,
+                  debug=False):
+    """
+    Returns table as a CompiledTable. A table that is already compiled, or a
+    SharedTable, is returned unchanged if it reads result_col_header (see
+    CompiledTable.reads_result_column()). Otherwise it is compiled again from
+    its DataFrame; a SharedTable has none, so that raises a ValueError.
+    A DataFrame is compiled once for each set of arguments: the compiled
+    table is kept on the DataFrame and returned again for the same
+    DataFrame, for as long as it lives. Like the compiled table itself, it
+    does not follow in-place edits; construct a CompiledTable directly after
+    changing the DataFrame.
+    :param table: pd.DataFrame, CompiledTable, or SharedTable
+    :param result_col_header: str, defaults to 'Results'
+    :param name: str, the table (worksheet) name, defaults to None
+    :param append_columns: bool, defaults to False
+    :param debug: bool, defaults to False
+    :return: CompiledTable
+    """
+    if isinstance(table, (CompiledTable, SharedTable)):
+        if table.reads_result_column(result_col_header):
+            return table
+        if table.table is None:
+            raise ValueError(f"compile_table: {table} was compiled for result column "
+                             f"'{table.result_col_name}', not '{result_col_header}', "
+                             f"and holds no DataFrame to compile it again from.")
+        name = table.name if name is None else name
+        table = table.table
+    # Kept in the DataFrame's __dict__ rather than in a module-level dict, so
+    # the cache, which refers back to the DataFrame, goes with it. Pandas
+    # does not copy or pickle it.
+    cache = table.__dict__.get('_compiled_tables')
+    if cache is None:
+        cache = {}
+        object.__setattr__(table, '_compiled_tables', cache)
+    key = (result_col_header, name, append_columns)
+    compiled = cache.get(key)
+    if compiled is None:
+        compiled = CompiledTable(table, result_col_header=result_col_header, name=name,
+                                 append_columns=append_columns, debug=debug)
+        cache[key] = compiled
+    return compiled
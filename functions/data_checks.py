@@ -1,49 +1,58 @@
+from functions.profiling import instrumented
+from functions.table_validation import validate_tables
 import os.path
 import pandas as pd
 import numpy as np
 
-def check_workbook(input_fp, ws_list):
+
+@instrumented("parse_workbook")
+def parse_workbook(input_fp, sheets=None):
     """
-    Pulls all worksheets in the input_fp and compares the names with the
-    ws_list to see if any are missing or misnamed.
+    Opens the Excel workbook at input_fp once and parses every worksheet in
+    it exactly once. With sheets, only the named worksheets are parsed.
     :param input_fp: filepath to an Excel workbook
-    :param ws_list: list of str, names of worksheets to look for
-    :return: dict: maps missing_names (list) to 'missing' key, unused worksheets
-        found in sheet_names to 'extras', and bad worksheets to 'corrupt'.
+    :param sheets: list of str, defaults to None, which parses them all
+    :return: tuple, (tables, sheet_names, corrupt_worksheets) where tables
+        maps each worksheet that parsed to its DataFrame, sheet_names lists
+        every worksheet in workbook order, and corrupt_worksheets lists the
+        worksheets that could not be parsed
     """
-    f = pd.ExcelFile(input_fp)
-    actual_worksheets = f.sheet_names
-    missing_names = []
-    data = {}
+    tables = {}
     corrupt_worksheets = []
-    for name in ws_list:
-        try:
-            idx = actual_worksheets.index(name)
-        except ValueError:
-            missing_names.append(name)
-        else:
-            actual_worksheets.pop(idx)
+    with pd.ExcelFile(input_fp) as f:
+        sheet_names = list(f.sheet_names)
+        for name in sheet_names:
+            if sheets is not None and name not in sheets:
+                continue
             try:
-                df = pd.read_excel(input_fp, sheet_name=name,
-                                   index_col=None, na_values=False)
+                tables[name] = f.parse(name, index_col=None, na_values=False)
             except ValueError:
                 corrupt_worksheets.append(name)
-            else:
-                # This was simply a test. We can get rid of the DataFrame.
-                df = None
+    return tables, sheet_names, corrupt_worksheets
 
-    if len(actual_worksheets) == 0:
+
+def build_report(sheet_names, corrupt_worksheets, ws_list=None, invalid=None):
+    """
+    Builds the check_workbook() report from the worksheets found in a
+    workbook, the ones that could not be parsed, and the ones that failed
+    validation.
+    :param sheet_names: list of str, every worksheet in the workbook
+    :param corrupt_worksheets: list of str, worksheets that failed to parse
+    :param ws_list: list of str, names of worksheets to look for, defaults to
+        None, which expects no particular worksheets
+    :param invalid: dict, maps worksheet names to their validate_table()
+        problems, defaults to None
+    :return: dict, with 'missing', 'extras', 'corrupt', and 'invalid' keys
+    """
+    if ws_list is None:
+        ws_list = []
+    data = {}
+    missing_names = [name for name in ws_list if name not in sheet_names]
+    extras = [name for name in sheet_names if name not in ws_list]
+    if len(extras) == 0:
         data['extras'] = None
     else:
-        data['extras'] = actual_worksheets
-        for name in actual_worksheets:
-            try:
-                df = pd.read_excel(input_fp, sheet_name=name,
-                                   index_col=None, na_values=False)
-            except ValueError:
-                corrupt_worksheets.append(name)
-            else:
-                df = None
+        data['extras'] = extras
 
     if len(missing_names) == 0:
         data['missing'] = None
@@ -53,7 +62,47 @@ def check_workbook(input_fp, ws_list):
     if len(corrupt_worksheets) == 0:
         data['corrupt'] = None
     else:
-        data['corrupt'] = corrupt_worksheets
+        data['corrupt'] = list(corrupt_worksheets)
+
+    if not invalid:
+        data['invalid'] = None
+    else:
+        data['invalid'] = dict(invalid)
 
-    f.close()
+    return data
+
+
+def read_workbook(input_fp, ws_list=None):
+    """
+    Opens the Excel workbook at input_fp once and parses every worksheet in
+    it exactly once. The worksheet names are compared with ws_list and every
+    table is validated in the same way as check_workbook().
+    :param input_fp: filepath to an Excel workbook
+    :param ws_list: list of str, names of worksheets to look for, defaults to
+        None, which expects no particular worksheets
+    :return: tuple, (tables, data) where tables maps each worksheet that
+        parsed to its DataFrame and data is the check_workbook() report
+    """
+    tables, sheet_names, corrupt_worksheets = parse_workbook(input_fp)
+    invalid = validate_tables(tables)
+    return tables, build_report(sheet_names, corrupt_worksheets, ws_list, invalid)
+
+
+@instrumented("check_workbook")
+def check_workbook(input_fp, ws_list):
+    """
+    Pulls all worksheets in the input_fp and compares the names with the
+    ws_list to see if any are missing or misnamed. Every table is also
+    checked with validate_table(): its rolls must cover the full range of the
+    dice in its header, in ascending order, with no gaps or overlaps.
+    :param input_fp: filepath to an Excel workbook
+    :param ws_list: list of str, names of worksheets to look for
+    :return: dict: maps missing_names (list) to 'missing' key, unused worksheets
+        found in sheet_names to 'extras', bad worksheets to 'corrupt', and
+        a dict of tables that failed validation, with their problems, to
+        'invalid'.
+    """
+    # The workbook is opened once and each worksheet is parsed once. This
+    # was simply a test, so the DataFrames are discarded.
+    tables, data = read_workbook(input_fp, ws_list)
     return data
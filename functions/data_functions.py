@@ -1,8 +1,15 @@
-from functions import return_range
-import pandas as pd
+from functions import CompiledTable, SharedTable, compile_table
+from functions.dice_notation import get_dice_info
+from functions.profiling import instrumented, table_name_of
+from functions.tracing import trace
+import logging
 
 
-def get_table_result(table: pd.DataFrame, roll: int, result_col_header='Results',
+_log = logging.getLogger(__name__)
+
+
+@instrumented("get_table_result", table_of=table_name_of)
+def get_table_result(table, roll: int, result_col_header='Results',
                      debug=False):
     """
     This function takes the roll integer, finds the value in the dXX columns
@@ -22,109 +29,109 @@ def get_table_result(table: pd.DataFrame, roll: int, result_col_header='Results'
         3) One of the remaining columns must be named 'Results' or its header
             specified as a argument.
         4) All other columns will be ignored.
-    :param table: pandas Dataframe
+    table may also be a CompiledTable. A DataFrame is compiled the first time
+    it is looked up and the compiled table reused after (see
+    compile_table()), so it must not be edited in place between lookups. A
+    table from a TableRegistry that passed validation is trusted, and is
+    looked up with no format or miss checks, as long as it reads
+    result_col_header; a compiled table with a different result column is
+    compiled again from its DataFrame.
+    :param table: pandas Dataframe or CompiledTable
     :param roll: int
     :param result_col_header: str, defaults to 'Results'
     :return: str, if successful, or NoneType if not
     """
-    if debug:
-        print(f"get_table_result: result_col_header; {result_col_header}, "
-              f"roll: {roll}.")
-        print(f"get_table_result: table: {table}.")
-    col_names = list(table.columns)
-    roll_col_name = col_names[0]
-    roll_col = table[roll_col_name]
-    if len(col_names) == 2:
-        result_col_name = col_names[1]
-        result_col = table[result_col_name]
-    elif len(col_names) < 2:
-        print(f"get_table_result: table has incorrect format. Retuning None.")
+    if (isinstance(table, (CompiledTable, SharedTable)) and table.trusted
+            and table.reads_result_column(result_col_header)):
+        result = table.lookup_trusted(roll)
+        trace(table.log, "get_table_result: roll: %s, result: %s.", roll, result,
+              debug=debug)
+        return result
+    trace(_log, "get_table_result: result_col_header; %s, roll: %s.",
+          result_col_header, roll, debug=debug)
+    trace(_log, "get_table_result: table: %s.", table, debug=debug)
+    try:
+        compiled = compile_table(table, result_col_header=result_col_header,
+                                 debug=debug)
+    except ValueError as e:
+        _log.warning("get_table_result: table has incorrect format. Returning "
+                     "None. %s", e)
         return None
-    else:
-        try:
-            result_col = table[result_col_header]
-        except KeyError:
-            print(f"get_table_result: table has incorrect format. Retuning None.")
-            return None
-    if debug:
-        print(f"get_table_result: roll_col_name: {roll_col_name}, "
-              f"roll_col: {roll_col}.")
-        print(f"get_table_result: result_col_name: {result_col}, "
-              f"result_col: {result_col}")
-    roll_idx = None
-
-    # Sometimes, there is a error converting a '1' string at the top of the table.
-    # Instead of a '1' or 1, it becomes NoneType or NaN. This has to handled here.
-    ctr = 0
-    for idx, item in roll_col.items():
-        print(f"get_table_result: item: {item}, idx: {idx}.")
-        if ctr == 0 and item is None:
-            m, n = (1, 1)
-        else:
-            m, n = return_range(item)
-        print(f"get_table_result: m: {m}, n: {n}.")
-        if m <= roll <= n:
-            roll_idx = idx
-            break
 
-    if roll_idx is None:
-        print(f"get_table_result: The table provided in invalid. No result "
-              f"could be returned.")
-        result = None
-    else:
-        result = result_col.loc[roll_idx]
-
-    if result == "-":
-        result = "nothing"
-    print(f"get_table_result: result: {result}.")
+    result = compiled.lookup(roll)
+    if result is None:
+        _log.warning("get_table_result: The table provided in invalid. No result "
+                     "could be returned for roll %s.", roll)
+    trace(compiled.log, "get_table_result: roll: %s, result: %s.", roll, result,
+          debug=debug)
     return result
 
 
-def get_multicolumn_table_result(table: pd.DataFrame):
-    pass
-
-
-def get_dice_info(s, debug=False):
+@instrumented("get_multicolumn_table_result", table_of=table_name_of)
+def get_multicolumn_table_result(table, roll: int, result_col_header='Faction',
+                                 debug=False):
     """
-    This function requires a string in the following format:
-        1) ndm or nDm, where n and m are integers and d/D are those characters
-        2) dm or Dm, where m is an integer and d/D are those characters
-    For case 1), it will return (n, m). For case 2), it will return (1, m).
-    Otherwise, it will raise a ValueError.
-    :param s: str
-    :param debug: bool, controls print output of debug messages
-    :return: tuple of int, (n, m)  or (1, m)
+    This function is get_table_result() for tables with more than one result
+    column, such as 'Current Divine Factions'. The table has the same first
+    column as the other tables, then up to three result columns. The result
+    column is headed result_col_header ('Faction' by default) and any other
+    columns are appended to its value:
+        'Sun Order (Alignment: LG, Domain: Light)'
+    Blank extra cells are left out. The lookup goes through the table's
+    range index; compile the table once with
+    compile_table(table, result_col_header, append_columns=True), or get it
+    from TableRegistry.compiled(), and pass that in when looking up the same
+    table repeatedly. As with get_table_result(), a trusted table that reads
+    result_col_header is looked up with no checks.
+    :param table: pandas Dataframe or CompiledTable
+    :param roll: int
+    :param result_col_header: str, defaults to 'Faction'
+    :param debug: bool, defaults to False
+    :return: str, if successful, or NoneType if not
     """
-    error_msg = (f"Format of the string, {s}, is invalid.\n"
-                 f"Correct format is 'ndm' or 'dm, where n and m are integers "
-                 f"and d is case-insensitive character d.")
-    die_info = s.lower()
-    if debug:
-        print(f"get_dice_info: die_info: {die_info}.")
-    if 'd' not in die_info:
-        raise ValueError(error_msg)
-
-    l = die_info.split('d')
-    if debug:
-        print(f"get_dice_info: l {l}.")
-    if l[0] == "":
-        # There is no first integer.
-        n = 1
-    else:
-        try:
-            n = int(l[0])
-        except ValueError:
-            raise ValueError(error_msg)
-    if debug:
-        print(f"get_dice_info: n {n}.")
+    if (isinstance(table, (CompiledTable, SharedTable)) and table.trusted
+            and table.reads_result_column(result_col_header)):
+        result = table.lookup_trusted(roll)
+        trace(table.log, "get_multicolumn_table_result: roll: %s, result: %s.", roll,
+              result, debug=debug)
+        return result
+    trace(_log, "get_multicolumn_table_result: result_col_header; %s, roll: %s.",
+          result_col_header, roll, debug=debug)
     try:
-        m = int(l[1])
-    except ValueError:
-        raise ValueError(error_msg)
-    if debug:
-        print(f"get_dice_info: m {m}.")
+        compiled = compile_table(table, result_col_header=result_col_header,
+                                 append_columns=True, debug=debug)
+    except ValueError as e:
+        _log.warning("get_multicolumn_table_result: table has incorrect format. "
+                     "Returning None. %s", e)
+        return None
+
+    result = compiled.lookup(roll)
+    if result is None:
+        _log.warning("get_multicolumn_table_result: The table provided in invalid. "
+                     "No result could be returned for roll %s.", roll)
+    trace(compiled.log, "get_multicolumn_table_result: roll: %s, result: %s.", roll,
+          result, debug=debug)
+    return result
+
 
-    return (n, m)
+@instrumented("get_multicolumn_table_results", table_of=table_name_of)
+def get_multicolumn_table_results(table, rolls, result_col_header='Faction',
+                                  debug=False):
+    """
+    Batch form of get_multicolumn_table_result(). All rolls are resolved to
+    rows in one vectorized call. Rolls that no row covers give None.
+    :param table: pandas Dataframe or CompiledTable
+    :param rolls: array-like of int
+    :param result_col_header: str, defaults to 'Faction'
+    :param debug: bool, defaults to False
+    :return: np.ndarray of object
+    """
+    compiled = compile_table(table, result_col_header=result_col_header,
+                             append_columns=True, debug=debug)
+    results = compiled.lookup_many(rolls)
+    trace(compiled.log, "get_multicolumn_table_results: rolls: %s, results: %s.",
+          rolls, results, debug=debug)
+    return results
 
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+from functools import lru_cache
+from collections import namedtuple
+from functions.tracing import trace
+import logging
+import re
+
+
+_log = logging.getLogger(__name__)
+
+
+# One dice term of an expression. The fields mean the same as the Dice
+# arguments; sign is 1 or -1.
+DiceTerm = namedtuple("DiceTerm", "sign dice_size dice_number roll_type drop_number highest")
+
+# A parsed expression: a tuple of DiceTerm and an integer constant.
+DiceSpec = namedtuple("DiceSpec", "terms constant")
+
+_TERM = re.compile(r"([+-])(?:(\d*)d(\d+|%)((?:(?:kh|kl|dh|dl|k|adv|dis)\d*)*)|(\d+))")
+_MODIFIER = re.compile(r"(kh|kl|dh|dl|k|adv|dis)(\d*)")
+
+# Size of the parse cache shared by every caller.
+PARSE_CACHE_SIZE = 1024
+
+
+def get_dice_info(s, debug=False):
+    """
+    This function requires a string in the following format:
+        1) ndm or nDm, where n and m are integers and d/D are those characters
+        2) dm or Dm, where m is an integer and d/D are those characters
+    For case 1), it will return (n, m). For case 2), it will return (1, m).
+    Otherwise, it will raise a ValueError. Parsed strings are cached, so
+    repeated calls with the same header do no parsing. For richer notation,
+    such as '2d6+3' or '4d6kh3', use parse_dice_expression().
+    :param s: str
+    :param debug: bool, controls output of debug messages
+    :return: tuple of int, (n, m)  or (1, m)
+    """
+    die_info = s.lower()
+    trace(_log, "get_dice_info: die_info: %s.", die_info, debug=debug)
+    n, m = _parse_dice_info(die_info)
+    trace(_log, "get_dice_info: n %s. m %s.", n, m, debug=debug)
+    return (n, m)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_dice_info(die_info):
+    error_msg = (f"Format of the string, {die_info}, is invalid.\n"
+                 f"Correct format is 'ndm' or 'dm, where n and m are integers "
+                 f"and d is case-insensitive character d.")
+    if 'd' not in die_info:
+        raise ValueError(error_msg)
+
+    l = die_info.split('d')
+    if l[0] == "":
+        # There is no first integer.
+        n = 1
+    else:
+        try:
+            n = int(l[0])
+        except ValueError:
+            raise ValueError(error_msg)
+    try:
+        m = int(l[1])
+    except ValueError:
+        raise ValueError(error_msg)
+
+    return (n, m)
+
+
+def parse_dice_expression(s):
+    """
+    Parses a dice expression and returns its DiceSpec. Results are cached in
+    a bounded LRU cache keyed by the string, so each distinct expression is
+    parsed once. The grammar is:
+        expression: term, then any number of '+ term' or '- term'
+        term: an integer, or [n]dm followed by optional modifiers, where m is
+            an integer or '%' (100)
+        modifiers: khK or kK keeps the K highest dice, klK keeps the K
+            lowest, dhK drops the K highest, dlK drops the K lowest, adv
+            rolls every die with advantage and dis with disadvantage
+    Case and spaces are ignored. Examples: 'd100', '2d6+3', '4d6kh3',
+    '1d20adv', '3d8dl1-2'.
+    :param s: str
+    :return: DiceSpec
+    """
+    if not isinstance(s, str):
+        raise ValueError(f"parse_dice_expression: The expression must be a string. "
+                         f"The variable type provided is {type(s)}.")
+    return _parse(s.replace(" ", "").lower())
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(s):
+    error_msg = (f"parse_dice_expression: The expression, {s}, is invalid. "
+                 f"Terms must be integers or 'ndm' with optional kh/kl/dh/dl/adv/dis "
+                 f"modifiers, joined by '+' or '-'.")
+    if s == "":
+        raise ValueError(error_msg)
+    text = s if s[0] in "+-" else "+" + s
+    terms = []
+    constant = 0
+    pos = 0
+    while pos < len(text):
+        match = _TERM.match(text, pos)
+        if match is None:
+            raise ValueError(error_msg)
+        pos = match.end()
+        sign = -1 if match.group(1) == "-" else 1
+        if match.group(5) is not None:
+            constant += sign * int(match.group(5))
+            continue
+        dice_number = int(match.group(2)) if match.group(2) else 1
+        dice_size = 100 if match.group(3) == "%" else int(match.group(3))
+        roll_type = "normal"
+        drop_number = 0
+        highest = True
+        keep_seen = False
+        for mod, count in _MODIFIER.findall(match.group(4)):
+            if mod in ("adv", "dis"):
+                if count or roll_type != "normal":
+                    raise ValueError(error_msg)
+                roll_type = "advantage" if mod == "adv" else "disadvantage"
+                continue
+            if not count or keep_seen:
+                raise ValueError(error_msg)
+            keep_seen = True
+            count = int(count)
+            match mod:
+                case "kh" | "k":
+                    drop_number, highest = dice_number - count, True
+                case "kl":
+                    drop_number, highest = dice_number - count, False
+                case "dh":
+                    drop_number, highest = count, False
+                case "dl":
+                    drop_number, highest = count, True
+        if dice_size <= 1 or dice_number < 1 or not 0 <= drop_number < dice_number:
+            raise ValueError(f"{error_msg} Dice must have more than one side, and "
+                             f"at least one die must be kept.")
+        terms.append(DiceTerm(sign, dice_size, dice_number, roll_type, drop_number,
+                              highest))
+    return DiceSpec(tuple(terms), constant)
+
+
+def expression_bounds(s):
+    """
+    Returns the smallest and largest totals a dice expression can roll, such
+    as (2, 12) for '2d6' or (3, 18) for '4d6kh3'. For a plain 'ndm' header
+    these are n and n * m, as get_dice_info() would give them.
+    :param s: str
+    :return: tuple of int, (min_total, max_total)
+    """
+    spec = parse_dice_expression(s)
+    low = high = spec.constant
+    for term in spec.terms:
+        kept = term.dice_number - term.drop_number
+        if term.sign > 0:
+            low += kept
+            high += kept * term.dice_size
+        else:
+            low -= kept * term.dice_size
+            high -= kept
+    return low, high
@@ -0,0 +1,135 @@
+from functools import lru_cache
+from math import comb
+from functions.dice_notation import parse_dice_expression
+import numpy as np
+
+
+def die_pmf(dice_size, roll_type="normal"):
+    """
+    Returns the probability of each face of a single die, indexed from face 1.
+    Advantage keeps the higher of two rolls, so face k comes up with
+    probability (2k - 1) / m^2; disadvantage keeps the lower, (2(m - k) + 1) / m^2.
+    :param dice_size: int
+    :param roll_type: str, "normal", "advantage", or "disadvantage"
+    :return: np.ndarray of float, shape (dice_size,)
+    """
+    faces = np.arange(1, dice_size + 1, dtype=np.float64)
+    match roll_type.lower():
+        case "normal":
+            return np.full(dice_size, 1.0 / dice_size)
+        case "advantage":
+            return (2 * faces - 1) / dice_size ** 2
+        case "disadvantage":
+            return (2 * (dice_size - faces) + 1) / dice_size ** 2
+    raise ValueError(f"die_pmf: roll_type must equal 'normal', 'advantage', or "
+                     f"'disadvantage'. Value provided is {roll_type}")
+
+
+@lru_cache(maxsize=256)
+def dice_pmf(dice_size, dice_number=1, roll_type="normal", drop_number=0, highest=True):
+    """
+    Returns the exact distribution of the total of a Dice configuration. The
+    arguments mean the same as they do for Dice. Results are memoized per
+    configuration.
+
+    Without drops the per-die distribution is convolved dice_number times.
+    With drops, the faces are walked from the end that is kept (highest
+    first when the lowest dice are dropped) while tracking how many dice have
+    been placed and the sum of the kept ones; a face shown by j of the
+    remaining dice contributes C(remaining, j) * p(face)^j. This enumerates
+    the order statistics without listing every roll.
+    :param dice_size: int
+    :param dice_number: int, defaults to 1
+    :param roll_type: str, defaults to "normal"
+    :param drop_number: int, defaults to 0
+    :param highest: bool, True drops the lowest dice, defaults to True
+    :return: tuple, (min_total, probs) where probs is a read-only
+        np.ndarray and probs[i] is the probability of a total of min_total + i
+    """
+    p = die_pmf(dice_size, roll_type)
+    kept = dice_number - drop_number
+    if drop_number == 0:
+        probs = np.ones(1)
+        for _ in range(dice_number):
+            probs = np.convolve(probs, p)
+        min_total = dice_number
+    else:
+        # state[c, s]: probability mass with c dice placed and kept sum s.
+        max_sum = kept * dice_size
+        state = np.zeros((dice_number + 1, max_sum + 1))
+        state[0, 0] = 1.0
+        faces = range(dice_size, 0, -1) if highest else range(1, dice_size + 1)
+        for face in faces:
+            new_state = np.zeros_like(state)
+            power = 1.0
+            for j in range(dice_number + 1):
+                if j > 0:
+                    power *= p[face - 1]
+                for c in range(dice_number - j + 1):
+                    weight = comb(dice_number - c, j) * power
+                    if weight == 0.0:
+                        continue
+                    # Only the dice that still fit in the kept group count.
+                    added = face * max(0, min(j, kept - c))
+                    new_state[c + j, added:] += weight * state[c, :max_sum + 1 - added]
+            state = new_state
+        probs = state[dice_number]
+        nonzero = np.flatnonzero(probs)
+        min_total = int(nonzero[0])
+        probs = probs[min_total:nonzero[-1] + 1]
+    probs = probs / probs.sum()
+    probs.setflags(write=False)
+    return min_total, probs
+
+
+@lru_cache(maxsize=256)
+def expression_pmf(expression):
+    """
+    Returns the exact distribution of a dice expression's total, such as
+    '2d6+3' or '4d6kh3' (see parse_dice_expression()). The distributions of
+    the dice terms are convolved and shifted by the constant.
+    :param expression: str
+    :return: tuple, (min_total, probs) as returned by dice_pmf()
+    """
+    spec = parse_dice_expression(expression)
+    min_total = spec.constant
+    probs = np.ones(1)
+    for term in spec.terms:
+        term_min, term_probs = dice_pmf(term.dice_size, term.dice_number, term.roll_type,
+                                        term.drop_number, term.highest)
+        if term.sign < 0:
+            term_min = -(term_min + len(term_probs) - 1)
+            term_probs = term_probs[::-1]
+        min_total += term_min
+        probs = np.convolve(probs, term_probs)
+    probs.setflags(write=False)
+    return min_total, probs
+
+
+def table_result_probabilities(lookup, dice_size=None, dice_number=1, roll_type="normal",
+                               drop_number=0, highest=True):
+    """
+    Returns the exact probability that each row of a compiled table is rolled
+    with the given Dice configuration. Without dice_size, the dice come from
+    the table's roll column header, e.g. '2d6' or '4d6kh3', as the POI
+    classes roll them. The probabilities of rolls that no row covers are returned
+    separately.
+    :param lookup: CompiledTable
+    :param dice_size: int, defaults to None
+    :param dice_number: int, defaults to 1
+    :param roll_type: str, defaults to "normal"
+    :param drop_number: int, defaults to 0
+    :param highest: bool, defaults to True
+    :return: tuple, (row_probs, miss_prob) where row_probs is an np.ndarray
+        aligned with lookup.results
+    """
+    if dice_size is None:
+        min_total, probs = expression_pmf(lookup.roll_col_name)
+    else:
+        min_total, probs = dice_pmf(dice_size, dice_number, roll_type.lower(),
+                                    drop_number, highest)
+    totals = np.arange(min_total, min_total + len(probs))
+    rows = lookup.row_indices(totals)
+    covered = rows >= 0
+    row_probs = np.bincount(rows[covered], weights=probs[covered], minlength=len(lookup))
+    return row_probs, float(probs[~covered].sum())
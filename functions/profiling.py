@@ -0,0 +1,221 @@
+from contextlib import ContextDecorator
+from functools import wraps
+from time import perf_counter
+import json
+import threading
+
+
+# Opt-in instrumentation. While it is off, every hook costs one flag check.
+# While it is on, each hooked call adds one to a counter and its duration to
+# a cumulative timer, keyed by stage (e.g. 'Dice.roll') and table name.
+# Times are inclusive: a stage that calls another hooked stage, as
+# DivinePOI.__init__ calls get_table_result, includes that stage's time.
+# The counters are updated under a lock, so calls from several threads are
+# all counted.
+
+
+class _State:
+    __slots__ = ('enabled', 'depth', 'stats', 'lock')
+
+    def __init__(self):
+        self.enabled = False
+        self.depth = 0
+        # Maps (stage, table) to [calls, seconds].
+        self.stats = {}
+        # Held while the counters or depth are read or changed.
+        self.lock = threading.Lock()
+
+
+_state = _State()
+
+
+def record(stage, seconds, table=None):
+    """
+    Adds one call of seconds to the stage's counters. Does nothing while
+    instrumentation is off.
+    :param stage: str
+    :param seconds: float
+    :param table: str, defaults to None
+    :return:
+    """
+    if not _state.enabled:
+        return
+    with _state.lock:
+        entry = _state.stats.get((stage, table))
+        if entry is None:
+            _state.stats[(stage, table)] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+
+class stage_timer:
+    """
+    Context manager that times the enclosed block as one call of stage, for
+    code that is not a single function:
+        with stage_timer('load tables'):
+            ...
+    """
+    __slots__ = ('stage', 'table', 'start')
+
+    def __init__(self, stage, table=None):
+        self.stage = stage
+        self.table = table
+        self.start = None
+
+    def __enter__(self):
+        if _state.enabled:
+            self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            record(self.stage, perf_counter() - self.start, self.table)
+            self.start = None
+        return False
+
+
+def instrumented(stage, table_of=None):
+    """
+    Decorator that hooks a function into the instrumentation as stage.
+    table_of, if given, is called with the function's arguments and returns
+    the table name to count the call under.
+    :param stage: str
+    :param table_of: callable, defaults to None
+    :return: decorator
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                table = table_of(*args, **kwargs) if table_of is not None else None
+                record(stage, perf_counter() - start, table)
+        return wrapper
+    return decorate
+
+
+def table_name_of(table, *args, **kwargs):
+    """
+    Returns the name of a CompiledTable, or None for a DataFrame; for use as
+    instrumented(table_of=...) on functions that take the table first.
+    """
+    return getattr(table, 'name', None)
+
+
+class profiled(ContextDecorator):
+    """
+    Turns instrumentation on for the enclosed block or decorated function:
+        with profiled() as profile:
+            generate_world(...)
+        print(profile.report())
+    Counters are cleared on entry unless reset is False. Nested uses share
+    the counters, and instrumentation stays on until the outermost one
+    exits. On exit, profile.stats holds a copy of the counters.
+    """
+    def __init__(self, reset=True):
+        """
+        :param reset: bool, defaults to True
+        """
+        self.reset = reset
+        self.stats = {}
+
+    def __enter__(self):
+        with _state.lock:
+            if self.reset and _state.depth == 0:
+                _state.stats.clear()
+            _state.depth += 1
+            _state.enabled = True
+        return self
+
+    def __exit__(self, *exc_info):
+        with _state.lock:
+            _state.depth -= 1
+            if _state.depth == 0:
+                _state.enabled = False
+        self.stats = profile_stats()
+        return False
+
+    def report(self, fmt='text'):
+        """
+        Returns the counters collected in the block, formatted as
+        profile_report() does.
+        :param fmt: str, 'text' or 'json', defaults to 'text'
+        :return: str
+        """
+        return format_report(self.stats, fmt)
+
+
+def enable_profiling(reset=False):
+    """
+    Turns instrumentation on until disable_profiling() is called.
+    :param reset: bool, clears the counters first, defaults to False
+    :return:
+    """
+    if reset:
+        reset_profile()
+    _state.enabled = True
+
+
+def disable_profiling():
+    """Turns instrumentation off. The counters are kept."""
+    with _state.lock:
+        _state.enabled = False
+        _state.depth = 0
+
+
+def reset_profile():
+    """Clears every counter."""
+    with _state.lock:
+        _state.stats.clear()
+
+
+def profile_stats():
+    """
+    Returns a copy of the counters.
+    :return: dict, maps (stage, table) to (calls, seconds)
+    """
+    with _state.lock:
+        return {key: tuple(value) for key, value in _state.stats.items()}
+
+
+def profile_report(fmt='text'):
+    """
+    Returns the current counters as a report.
+    :param fmt: str, 'text' or 'json', defaults to 'text'
+    :return: str
+    """
+    return format_report(profile_stats(), fmt)
+
+
+def format_report(stats, fmt='text'):
+    """
+    Formats counters as a text table, slowest stage first, or as a JSON list
+    of {'stage', 'table', 'calls', 'seconds', 'per_call_us'} objects.
+    :param stats: dict, as returned by profile_stats()
+    :param fmt: str, 'text' or 'json', defaults to 'text'
+    :return: str
+    """
+    rows = sorted(((stage, table, calls, seconds)
+                   for (stage, table), (calls, seconds) in stats.items()),
+                  key=lambda row: row[3], reverse=True)
+    match fmt:
+        case 'json':
+            return json.dumps([{'stage': stage, 'table': table, 'calls': calls,
+                                'seconds': seconds,
+                                'per_call_us': seconds / calls * 1e6}
+                               for stage, table, calls, seconds in rows], indent=2)
+        case 'text':
+            lines = [f"{'stage':<34}{'table':<26}{'calls':>10}{'total s':>11}"
+                     f"{'per call':>12}"]
+            for stage, table, calls, seconds in rows:
+                lines.append(f"{stage:<34}{table or '-':<26}{calls:>10}{seconds:>11.4f}"
+                             f"{seconds / calls * 1e6:>10.2f}us")
+            return "\n".join(lines)
+        case _:
+            raise ValueError(f"format_report: fmt must be 'text' or 'json'. Value "
+                             f"provided is {fmt!r}.")
@@ -0,0 +1,59 @@
+import numpy as np
+
+
+# Shared generator used whenever a caller does not supply its own. Seeding it
+# through seed_default_rng() makes a whole run reproducible.
+_default_rng = np.random.default_rng()
+
+
+def get_rng(seed=None):
+    """
+    Returns a numpy.random.Generator for the value supplied:
+        1) None returns the shared default generator.
+        2) A Generator is returned unchanged, so a caller's stream can be
+            threaded through Dice and the POI classes.
+        3) An int or np.random.SeedSequence creates a new, deterministic
+            generator.
+    :param seed: None, int, np.random.SeedSequence, or np.random.Generator
+    :return: np.random.Generator
+    """
+    if seed is None:
+        return _default_rng
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if isinstance(seed, bool) or not isinstance(seed, (int, np.integer,
+                                                       np.random.SeedSequence)):
+        raise TypeError(f"get_rng: seed must be None, an int, a SeedSequence, "
+                        f"or a numpy Generator. The variable type provided is "
+                        f"{type(seed)}.")
+    return np.random.default_rng(seed)
+
+
+def seed_default_rng(seed):
+    """
+    Reseeds the shared default generator used by Dice and the POI classes
+    when no generator is supplied.
+    :param seed: int or np.random.SeedSequence
+    :return: None
+    """
+    global _default_rng
+    _default_rng = np.random.default_rng(seed)
+
+
+def spawn_rngs(seed, n):
+    """
+    Creates n statistically independent generators from one seed. The
+    children are deterministic for a given seed, so parallel workers can each
+    take one stream and still reproduce the same output on every run.
+    :param seed: int, np.random.SeedSequence, or np.random.Generator
+    :param n: int, number of streams to create
+    :return: list of np.random.Generator
+    """
+    if n < 0:
+        raise ValueError(f"spawn_rngs: n must be a positive integer or 0. Value "
+                         f"provided is {n}.")
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(n)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [np.random.default_rng(child) for child in seed.spawn(n)]
@@ -0,0 +1,467 @@
+from bisect import bisect_right
+from multiprocessing import shared_memory
+from functions.tracing import trace, table_logger_name
+import json
+import logging
+import numpy as np
+
+
+_log = logging.getLogger(__name__)
+
+# Bump this whenever the layout of a segment changes.
+SEGMENT_VERSION = 2
+
+# Every array in a segment starts on a multiple of this many bytes.
+_ALIGN = 8
+
+
+class _Segment(shared_memory.SharedMemory):
+    # SharedMemory closes its mapping when it is collected, which fails
+    # while a SharedTable still holds a view of it. The mapping is then left
+    # to be released with the last view instead.
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:
+            pass
+
+
+class SharedTable:
+    """
+    This class is one compiled table whose arrays live in a shared memory
+    segment published by SharedTables. It answers the same lookups as
+    CompiledTable and can be passed anywhere a CompiledTable is expected,
+    but it holds no DataFrame (table is None) and no copy of the table's
+    data: the bounds, the roll -> row array, and the result string IDs are
+    read-only views of the segment, and result strings are decoded from the
+    segment's string blob when they are first looked up.
+    """
+    def __init__(self, store, meta):
+        """
+        :param store: SharedTables, the segment the table lives in
+        :param meta: dict, the table's entry in the segment header
+        """
+        self.store = store
+        self.table = None
+        self.name = meta['name']
+        self.log = logging.getLogger(table_logger_name(self.name))
+        self.roll_col_name = meta['roll_col_name']
+        self.result_col_name = meta['result_col_name']
+        self.column_count = meta['column_count']
+        self.extra_col_names = meta['extra_col_names']
+        self.trusted = meta['trusted']
+        self.min_roll = meta['min_roll']
+        self.max_roll = meta['max_roll']
+        start, stop = meta['rows']
+        self.lows = store.array('lows')[start:stop]
+        self.highs = store.array('highs')[start:stop]
+        self.result_ids = store.array('result_ids')[start:stop]
+        if meta['dense'] is not None:
+            start, stop = meta['dense']
+            self._dense = store.array('dense')[start:stop]
+        else:
+            self._dense = None
+        self._results = None
+        self._alias = None
+
+    def __len__(self):
+        return len(self.lows)
+
+    def __repr__(self):
+        return (f"SharedTable({self.name or self.roll_col_name!r}, rows={len(self)}, "
+                f"rolls={self.min_roll}-{self.max_roll})")
+
+    @property
+    def results(self):
+        """
+        Every row's result, decoded from the segment the first time it is
+        needed. Lookups do not need it.
+        :return: np.ndarray of object
+        """
+        if self._results is None:
+            self._results = self.store.strings(self.result_ids)
+        return self._results
+
+    def reads_result_column(self, result_col_header):
+        """
+        Returns whether lookups on this table answer for result_col_header,
+        as CompiledTable.reads_result_column() does.
+        :param result_col_header: str
+        :return: bool
+        """
+        return self.column_count == 2 or self.result_col_name == result_col_header
+
+    def row_index(self, roll):
+        """
+        Returns the position of the row containing roll, or -1 if no row
+        covers it.
+        :param roll: int
+        :return: int
+        """
+        if self._dense is not None:
+            if self.min_roll <= roll <= self.max_roll:
+                return int(self._dense[roll - self.min_roll])
+            return -1
+        idx = bisect_right(self.lows, roll) - 1
+        if idx >= 0 and roll <= self.highs[idx]:
+            return idx
+        return -1
+
+    def row_indices(self, rolls):
+        """
+        Vectorized form of row_index(). Rolls not covered by any row map to -1.
+        :param rolls: array-like of int
+        :return: np.ndarray of int
+        """
+        rolls = np.asarray(rolls, dtype=np.int64)
+        if self._dense is not None:
+            offsets = rolls - self.min_roll
+            in_range = (offsets >= 0) & (offsets < len(self._dense))
+            idx = np.full(rolls.shape, -1, dtype=np.int64)
+            idx[in_range] = self._dense[offsets[in_range]]
+            return idx
+        idx = np.searchsorted(self.lows, rolls, side="right") - 1
+        hit = idx >= 0
+        hit[hit] = rolls[hit] <= self.highs[idx[hit]]
+        return np.where(hit, idx, -1)
+
+    def lookup(self, roll):
+        """
+        Returns the result for roll, or None if no row covers it.
+        :param roll: int
+        :return: str or NoneType
+        """
+        idx = self.row_index(roll)
+        if idx < 0:
+            return None
+        return self.store.string(int(self.result_ids[idx]))
+
+    def lookup_trusted(self, roll):
+        """
+        Returns the result for roll on a trusted table, or None if roll is
+        outside the table's range, as CompiledTable.lookup_trusted() does.
+        :param roll: int
+        :return: str or NoneType
+        """
+        if not self.min_roll <= roll <= self.max_roll:
+            return None
+        if self._dense is not None:
+            return self.store.string(int(self.result_ids[self._dense[roll - self.min_roll]]))
+        return self.store.string(int(self.result_ids[bisect_right(self.lows, roll) - 1]))
+
+    def lookup_many(self, rolls):
+        """
+        Returns the results for a whole array of rolls in one call. Rolls not
+        covered by any row give None.
+        :param rolls: array-like of int
+        :return: np.ndarray of object
+        """
+        idx = self.row_indices(rolls)
+        output = self.store.strings(self.result_ids[np.maximum(idx, 0)])
+        output[idx < 0] = None
+        return output
+
+    def alias_table(self):
+        """
+        Returns the alias table over the rows, as CompiledTable.alias_table()
+        does.
+        :return: AliasTable
+        """
+        if self._alias is None:
+            from functions.probability import table_result_probabilities
+            from functions.alias_sampling import AliasTable
+            row_probs, miss_prob = table_result_probabilities(self)
+            if miss_prob > 0:
+                raise ValueError(f"SharedTable: {self} does not cover every roll of "
+                                 f"{self.roll_col_name}; {miss_prob:.4f} of rolls give "
+                                 f"no result, so it cannot be sampled.")
+            self._alias = AliasTable(row_probs)
+        return self._alias
+
+    def sample(self, n=None, rng=None):
+        """
+        Draws results without rolling, as CompiledTable.sample() does.
+        :param n: None or int, defaults to None
+        :param rng: None, int, or np.random.Generator, defaults to None
+        :return: str or np.ndarray of object
+        """
+        rows = self.alias_table().sample(n, rng=rng)
+        if n is None:
+            return self.store.string(int(self.result_ids[rows]))
+        return self.store.strings(self.result_ids[rows])
+
+
+class SharedTables:
+    """
+    This class publishes the compiled tables of a TableRegistry in one
+    shared memory segment, so worker processes can use them without parsing
+    the workbook, reading the cache, or unpickling any DataFrame. The parent
+    calls publish() once; each worker calls attach() with the segment's
+    handle and gets read-only views of the same memory, with no copy.
+
+    Every table is flattened into arrays shared by all the tables: the
+    lower and upper bounds of its rows, the dense roll -> row array of small
+    tables, and, per row, the ID of its result string. Result strings are
+    interned across the workbook, so a string used by several rows or tables
+    is stored once, and kept as UTF-8 in a single blob with an offsets
+    array. A JSON header at the start of the segment describes the tables
+    and where each array is.
+
+    A SharedTables object can be passed as the registry anywhere a
+    TableRegistry is used to look tables up by name: compiled() returns the
+    published SharedTable. The variants published are every table as
+    TableRegistry.compiled(name) gives it, or, for a table with no 'Results'
+    column, compiled on its second column with the others appended, as the
+    'Current Divine Factions' table is used. Pass variants to publish others.
+
+    The publisher owns the segment: close() in the parent also unlinks it,
+    so it must only be called once the workers are done. Workers only close
+    their own mapping. A mapping that is still in use, e.g. by a SharedTable
+    held in the table store, stays mapped until it is released.
+    """
+    def __init__(self, segment, owner, debug=False):
+        """
+        Use publish() or attach() rather than calling this directly.
+        :param segment: shared_memory.SharedMemory
+        :param owner: bool, True in the process that created the segment
+        :param debug: bool, defaults to False
+        """
+        self.segment = segment
+        self.owner = owner
+        self.debug = debug
+        header_size = int(np.frombuffer(segment.buf, dtype=np.uint64, count=1)[0])
+        self.header = json.loads(bytes(segment.buf[_ALIGN:_ALIGN + header_size]))
+        if self.header.get('version') != SEGMENT_VERSION:
+            raise ValueError(f"SharedTables: The segment {segment.name} has layout "
+                             f"version {self.header.get('version')}. This code reads "
+                             f"version {SEGMENT_VERSION}.")
+        self.input_fp = self.header['input_fp']
+        self._arrays = {}
+        for key, (offset, dtype, length) in self.header['arrays'].items():
+            array = np.frombuffer(segment.buf, dtype=dtype, count=length, offset=offset)
+            array.flags.writeable = False
+            self._arrays[key] = array
+        self._decoded = {}
+        self._tables = {}
+        for meta in self.header['tables']:
+            key = (meta['name'], meta['result_col_header'], meta['append_columns'])
+            self._tables[key] = SharedTable(self, meta)
+        self._names = list(dict.fromkeys(meta['name'] for meta in self.header['tables']))
+
+    @classmethod
+    def publish(cls, registry, variants=None, debug=False):
+        """
+        Flattens the registry's tables into a new shared memory segment.
+        :param registry: TableRegistry
+        :param variants: list of tuple, (name, result_col_header,
+            append_columns) for each table to publish, defaults to None,
+            which publishes one variant per worksheet as described above
+        :param debug: bool, defaults to False
+        :return: SharedTables, owning the segment
+        """
+        if variants is None:
+            variants = []
+            for name in registry:
+                cols = list(registry.table(name).columns)
+                if len(cols) > 2 and 'Results' not in cols:
+                    variants.append((name, cols[1], True))
+                else:
+                    variants.append((name, 'Results', False))
+
+        interned = {}
+        lows, highs, result_ids, dense = [], [], [], []
+        rows_size = dense_size = 0
+        tables = []
+        for name, result_col_header, append_columns in variants:
+            compiled = registry.compiled(name, result_col_header=result_col_header,
+                                         append_columns=append_columns)
+            ids = [interned.setdefault(result, len(interned))
+                   for result in compiled.results.tolist()]
+            meta = {
+                'name': name,
+                'result_col_header': result_col_header,
+                'append_columns': append_columns,
+                'roll_col_name': compiled.roll_col_name,
+                'result_col_name': compiled.result_col_name,
+                'column_count': compiled.column_count,
+                'extra_col_names': list(compiled.extra_col_names),
+                'trusted': compiled.trusted,
+                'min_roll': compiled.min_roll,
+                'max_roll': compiled.max_roll,
+                'rows': [rows_size, rows_size + len(compiled)],
+                'dense': None,
+            }
+            rows_size += len(compiled)
+            lows.append(compiled.lows)
+            highs.append(compiled.highs)
+            result_ids.append(np.asarray(ids, dtype=np.int32))
+            if compiled._dense is not None:
+                meta['dense'] = [dense_size, dense_size + len(compiled._dense)]
+                dense_size += len(compiled._dense)
+                dense.append(compiled._dense.astype(np.int32))
+            tables.append(meta)
+
+        encoded = [str(string).encode() for string in interned]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(string) for string in encoded])
+        arrays = {
+            'lows': np.concatenate(lows).astype(np.int64) if lows else np.empty(0, np.int64),
+            'highs': np.concatenate(highs).astype(np.int64) if highs else np.empty(0, np.int64),
+            'result_ids': (np.concatenate(result_ids) if result_ids
+                           else np.empty(0, np.int32)),
+            'dense': np.concatenate(dense) if dense else np.empty(0, np.int32),
+            'string_offsets': offsets,
+            'string_blob': np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        }
+
+        # The header's size depends on the offsets it records, so the arrays
+        # are placed after a first encoding and the header is padded to the
+        # size reserved for it.
+        header = {'version': SEGMENT_VERSION, 'input_fp': registry.input_fp,
+                  'tables': tables, 'arrays': {}}
+        reserved = _aligned(len(json.dumps(header)) + 64 * len(arrays) + 64)
+        position = _ALIGN + reserved
+        for key, array in arrays.items():
+            header['arrays'][key] = [position, array.dtype.str, len(array)]
+            position = _aligned(position + array.nbytes)
+        header_bytes = json.dumps(header).encode()
+        if len(header_bytes) > reserved:
+            raise ValueError(f"SharedTables: The header needs {len(header_bytes)} bytes "
+                             f"but only {reserved} were reserved.")
+
+        segment = _Segment(create=True, size=max(position, _ALIGN))
+        try:
+            np.frombuffer(segment.buf, dtype=np.uint64, count=1)[:] = len(header_bytes)
+            segment.buf[_ALIGN:_ALIGN + len(header_bytes)] = header_bytes
+            for key, array in arrays.items():
+                offset = header['arrays'][key][0]
+                segment.buf[offset:offset + array.nbytes] = array.tobytes()
+            store = cls(segment, owner=True, debug=debug)
+        except BaseException:
+            segment.close()
+            segment.unlink()
+            raise
+        trace(_log, "SharedTables.publish: %s: %s tables, %s strings, %s bytes in %s.",
+              registry.input_fp, len(tables), len(encoded), segment.size, segment.name,
+              debug=debug)
+        return store
+
+    @classmethod
+    def attach(cls, handle, debug=False):
+        """
+        Maps a segment published by another process, normally the parent
+        of this one. Nothing is copied.
+        :param handle: str, the publisher's handle
+        :param debug: bool, defaults to False
+        :return: SharedTables
+        """
+        try:
+            segment = _Segment(name=handle, track=False)
+        except TypeError:
+            # Before Python 3.13 every attach is tracked. Worker processes
+            # share their parent's resource tracker, which already tracks
+            # the segment, so this adds nothing and the publisher's unlink
+            # still releases it.
+            segment = _Segment(name=handle)
+        store = cls(segment, owner=False, debug=debug)
+        trace(_log, "SharedTables.attach: %s: %s tables.", handle, len(store._tables),
+              debug=debug)
+        return store
+
+    @property
+    def handle(self):
+        """
+        The name workers pass to attach().
+        :return: str
+        """
+        return self.segment.name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f"SharedTables({self.input_fp!r}, tables={len(self._names)}, " \
+               f"handle={self.handle!r})"
+
+    def array(self, key):
+        """
+        Returns one of the segment's flat arrays as a read-only view.
+        :param key: str
+        :return: np.ndarray
+        """
+        return self._arrays[key]
+
+    def string(self, string_id):
+        """
+        Returns an interned result string, decoding it from the blob the
+        first time it is asked for.
+        :param string_id: int
+        :return: str
+        """
+        string = self._decoded.get(string_id)
+        if string is None:
+            offsets = self._arrays['string_offsets']
+            start, stop = int(offsets[string_id]), int(offsets[string_id + 1])
+            string = self._arrays['string_blob'][start:stop].tobytes().decode()
+            self._decoded[string_id] = string
+        return string
+
+    def strings(self, string_ids):
+        """
+        Returns the interned result strings for an array of IDs. Each
+        distinct ID is decoded once.
+        :param string_ids: array-like of int
+        :return: np.ndarray of object
+        """
+        unique, inverse = np.unique(np.asarray(string_ids), return_inverse=True)
+        decoded = np.empty(len(unique), dtype=object)
+        decoded[:] = [self.string(string_id) for string_id in unique.tolist()]
+        return decoded[inverse.reshape(-1)]
+
+    def compiled(self, name, result_col_header='Results', append_columns=False):
+        """
+        Returns the published table, as TableRegistry.compiled() does.
+        :param name: str
+        :param result_col_header: str, defaults to 'Results'
+        :param append_columns: bool, defaults to False
+        :return: SharedTable
+        """
+        try:
+            return self._tables[(name, result_col_header, append_columns)]
+        except KeyError:
+            raise KeyError(f"SharedTables: '{name}' was not published with "
+                           f"result_col_header='{result_col_header}', append_columns="
+                           f"{append_columns}. Published: {list(self._tables)}.") from None
+
+    def close(self):
+        """
+        Unmaps the segment, and unlinks it in the publishing process.
+        :return:
+        """
+        self._tables.clear()
+        self._arrays.clear()
+        try:
+            self.segment.close()
+        except BufferError:
+            _log.warning("SharedTables.close: %s is still in use and stays mapped "
+                         "until it is released.", self.segment.name)
+        if self.owner:
+            self.segment.unlink()
+        trace(_log, "SharedTables.close: %s.", self.segment.name, debug=self.debug)
+
+
+def _aligned(size):
+    return -(-size // _ALIGN) * _ALIGN
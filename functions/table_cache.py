@@ -0,0 +1,176 @@
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+from functions.tracing import trace
+
+
+_log = logging.getLogger(__name__)
+
+# Bump this whenever the layout of a cache entry or of CompiledTable changes,
+# so caches written by older code are rebuilt instead of loaded.
+CACHE_VERSION = 7
+
+
+def cache_path(input_fp):
+    """
+    Returns the path of the cache file kept next to the workbook. For
+    tables.xlsx it is .tables.xlsx.cache in the same directory.
+    :param input_fp: filepath to an Excel workbook
+    :return: str
+    """
+    directory, base = os.path.split(os.path.abspath(input_fp))
+    return os.path.join(directory, f".{base}.cache")
+
+
+def file_digest(input_fp):
+    """
+    Returns the SHA-256 hex digest of the file's contents.
+    :param input_fp: filepath
+    :return: str
+    """
+    digest = hashlib.sha256()
+    with open(input_fp, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_cache(input_fp, debug=False):
+    """
+    Returns the cache entry for the workbook, or None if there is no cache or
+    the workbook has changed since it was written. A cache is current when
+    the workbook's size and modification time match the entry. If only the
+    modification time differs, the contents are hashed, and a matching hash
+    still counts as current.
+
+    The cache is a pickle, so it must only ever be written by this module.
+    :param input_fp: filepath to an Excel workbook
+    :param debug: bool, defaults to False
+    :return: dict or NoneType, with keys 'sheet_names', 'corrupt', 'invalid',
+        'tables', 'compiled', and 'digests'
+    """
+    path = cache_path(input_fp)
+    try:
+        with open(path, 'rb') as f:
+            entry = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        trace(_log, "load_cache: no usable cache at %s.", path, debug=debug)
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != CACHE_VERSION:
+        trace(_log, "load_cache: cache at %s has an old format.", path, debug=debug)
+        return None
+
+    stat = os.stat(input_fp)
+    if stat.st_size != entry['size']:
+        trace(_log, "load_cache: %s changed size.", input_fp, debug=debug)
+        return None
+    if stat.st_mtime_ns != entry['mtime_ns']:
+        if file_digest(input_fp) != entry['sha256']:
+            trace(_log, "load_cache: %s changed contents.", input_fp, debug=debug)
+            return None
+        # Same contents with a new timestamp, e.g. a copy or a save without
+        # edits. Record the new timestamp so the next start skips the hash.
+        entry['mtime_ns'] = stat.st_mtime_ns
+        _write_entry(path, entry)
+    trace(_log, "load_cache: loaded %s.", path, debug=debug)
+    return entry
+
+
+def write_cache(input_fp, tables, sheet_names, corrupt_worksheets, compiled=None,
+                invalid=None, digests=None, debug=False):
+    """
+    Writes the parsed tables of a workbook to its cache. Nothing is written
+    when any worksheet is corrupt, so a bad workbook is always re-parsed and
+    reported.
+    :param input_fp: filepath to an Excel workbook
+    :param tables: dict, maps worksheet names to DataFrames
+    :param sheet_names: list of str, every worksheet in the workbook
+    :param corrupt_worksheets: list of str
+    :param compiled: dict, maps (name, result_col_header) to CompiledTable,
+        defaults to None
+    :param invalid: dict, maps the tables that failed validation to their
+        problems, defaults to None
+    :param digests: dict or NoneType, maps worksheet names to their
+        sheet_digests(), defaults to None, which means they were not
+        computed
+    :param debug: bool, defaults to False
+    :return: bool, True if the cache was written
+    """
+    if corrupt_worksheets:
+        _log.warning("write_cache: %s has corrupt worksheets %s. It was not "
+                     "cached.", input_fp, corrupt_worksheets)
+        return False
+    stat = os.stat(input_fp)
+    entry = {
+        'version': CACHE_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_digest(input_fp),
+        'sheet_names': list(sheet_names),
+        'corrupt': [],
+        'invalid': invalid if invalid is not None else {},
+        'tables': tables,
+        'compiled': compiled if compiled is not None else {},
+        'digests': digests,
+    }
+    path = cache_path(input_fp)
+    _write_entry(path, entry)
+    trace(_log, "write_cache: wrote %s.", path, debug=debug)
+    return True
+
+
+def _write_entry(path, entry):
+    # Write to a temporary file first so a reader never sees half a cache.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def invalidate_cache(input_fp):
+    """
+    Deletes the workbook's cache, if it has one.
+    :param input_fp: filepath to an Excel workbook
+    :return: bool, True if a cache file was removed
+    """
+    try:
+        os.remove(cache_path(input_fp))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def warm_cache(input_fp, debug=False):
+    """
+    Parses, validates, and compiles the workbook if its cache is missing or
+    out of date, and writes the cache.
+    :param input_fp: filepath to an Excel workbook
+    :param debug: bool, defaults to False
+    :return: dict, the check_workbook() report for the workbook
+    """
+    from functions.table_registry import TableRegistry
+    return TableRegistry(input_fp, use_cache=True, debug=debug).report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pre-warm, check, or invalidate the compiled table cache "
+                    "kept next to a workbook.")
+    parser.add_argument("action", choices=["warm", "invalidate", "status"])
+    parser.add_argument("workbook", help="path to the Excel workbook")
+    args = parser.parse_args()
+    match args.action:
+        case "warm":
+            report = warm_cache(args.workbook)
+            if report['corrupt']:
+                print(f"main: Not cached. Corrupt worksheets: {report['corrupt']}")
+            else:
+                print(f"main: Cache is current: {cache_path(args.workbook)}")
+        case "invalidate":
+            removed = invalidate_cache(args.workbook)
+            print(f"main: Cache removed: {removed}")
+        case "status":
+            current = load_cache(args.workbook) is not None
+            print(f"main: {cache_path(args.workbook)} is current: {current}")
@@ -0,0 +1,266 @@
+from functions.compiled_table import CompiledTable, compile_table
+from functions.data_checks import parse_workbook, build_report
+from functions.table_cache import load_cache, write_cache
+from functions.table_store import table_store
+from functions.profiling import instrumented
+from functions.table_validation import validate_tables
+from functions.tracing import trace
+from functions.workbook_watch import sheet_digests
+import logging
+import threading
+
+
+_log = logging.getLogger(__name__)
+
+
+class TableRegistry:
+    """
+    This class loads every table in a workbook such as tables.xlsx exactly
+    once and keeps them for the rest of the run. Each worksheet is parsed a
+    single time, validated the same way check_workbook() does it, and
+    compiled into a CompiledTable, so POI classes can take a table name
+    instead of a DataFrame.
+
+    The attributes are:
+        input_fp: str, the workbook path
+        tables: dict, maps worksheet names to their DataFrames
+        report: dict, the check_workbook() report with 'missing', 'extras',
+            'corrupt', and 'invalid' keys
+        digests: dict or NoneType, maps worksheet names to their
+            sheet_digests(), or None until track_changes() is called
+    Worksheets that are corrupt are not in tables. Tables that pass
+    validate_table() are compiled as trusted, so their lookups skip all
+    per-call checks; tables listed under 'invalid' keep the checked path.
+
+    With use_cache=True the parsed and compiled tables are read from the
+    cache kept next to the workbook (see functions.table_cache), and the
+    workbook itself is only parsed when it has changed since the cache was
+    written.
+
+    reload() brings the registry up to date after the workbook is edited,
+    re-parsing and re-validating only the worksheets whose contents changed
+    (see sheet_digests()), and WorkbookWatcher calls it whenever the file is
+    saved. The digests it compares against are only computed once
+    track_changes() is called, as WorkbookWatcher does, so a registry that
+    is never reloaded does not pay for them. The new tables are swapped in
+    together once they are all ready, so a caller sees either the old
+    tables or the new ones, never a mix. Compiled tables are never changed
+    in place: generators keep using the tables they already looked up. POIs
+    refer to tables by their ID in the table store, and reload() points
+    those IDs at the new tables, so the old ones are not kept alive by the
+    store and existing POIs reroll on the edited tables.
+    """
+    @instrumented("TableRegistry.__init__")
+    def __init__(self, input_fp, ws_list=None, debug=False, use_cache=False):
+        """
+        :param input_fp: filepath to an Excel workbook
+        :param ws_list: list of str, names of worksheets the caller expects,
+            defaults to None
+        :param debug: bool, defaults to False
+        :param use_cache: bool, defaults to False
+        """
+        self.input_fp = input_fp
+        self.ws_list = ws_list
+        self.debug = debug
+        self.use_cache = use_cache
+        # Held while compiling on request and while reload() swaps tables.
+        self._lock = threading.Lock()
+        entry = load_cache(input_fp, debug=debug) if use_cache else None
+        if entry is not None:
+            self.tables = entry['tables']
+            self._compiled = entry['compiled']
+            self.sheet_names = entry['sheet_names']
+            self.corrupt = entry['corrupt']
+            self.invalid = entry['invalid']
+            self.digests = entry['digests']
+        else:
+            self.digests = None
+            self.tables, self.sheet_names, self.corrupt = parse_workbook(input_fp)
+            self.invalid = validate_tables(self.tables, debug=debug)
+            self._compiled = self._compile_all(self.tables, self.invalid, list(self.tables))
+            if use_cache:
+                write_cache(input_fp, self.tables, self.sheet_names, self.corrupt,
+                            compiled=self._compiled, invalid=self.invalid,
+                            digests=self.digests, debug=debug)
+        self.report = build_report(self.sheet_names, self.corrupt, ws_list, self.invalid)
+        trace(_log, "TableRegistry.__init__: input_fp: %s, tables: %s, report: %s.",
+              input_fp, list(self.tables), self.report, debug=debug)
+
+    def __contains__(self, name):
+        return name in self.tables
+
+    def __getitem__(self, name):
+        return self.table(name)
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __repr__(self):
+        return f"TableRegistry({self.input_fp!r}, tables={len(self.tables)})"
+
+    def table(self, name):
+        """
+        Returns the DataFrame for the named worksheet.
+        :param name: str
+        :return: pd.DataFrame
+        """
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise KeyError(f"TableRegistry: There is no usable worksheet named "
+                           f"'{name}' in {self.input_fp}. Report: {self.report}.")
+
+    def compiled(self, name, result_col_header='Results', append_columns=False):
+        """
+        Returns the named worksheet as a CompiledTable. It is compiled the
+        first time it is requested for each result column and reused after.
+        It is marked trusted unless it failed validation.
+        :param name: str
+        :param result_col_header: str, defaults to 'Results'
+        :param append_columns: bool, defaults to False
+        :return: CompiledTable
+        """
+        key = (name, result_col_header, append_columns)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            with self._lock:
+                compiled = self._compiled.get(key)
+                if compiled is None:
+                    compiled = self._compile(self.table(name), key, self.invalid)
+                    self._compiled[key] = compiled
+        return compiled
+
+    def _compile(self, table, key, invalid):
+        name, result_col_header, append_columns = key
+        compiled = CompiledTable(table, result_col_header=result_col_header, name=name,
+                                 append_columns=append_columns, debug=self.debug)
+        if name not in invalid:
+            compiled.mark_trusted()
+        return compiled
+
+    def _compile_all(self, tables, invalid, names, previous=None):
+        # Compiles the default variant of each named table, and every other
+        # variant of it in previous, a dict of the compiled tables being
+        # replaced. Tables with more than two columns and no 'Results'
+        # column are compiled on request, when the result column is known.
+        # A variant in previous that no longer compiles is recorded in
+        # invalid and keeps its previous compiled table.
+        compiled = {}
+        for name in names:
+            try:
+                compiled[(name, 'Results', False)] = self._compile(
+                    tables[name], (name, 'Results', False), invalid)
+            except ValueError:
+                trace(_log, "TableRegistry: %s compiled on request only.", name,
+                      debug=self.debug)
+        for key, table in (previous or {}).items():
+            if key[0] not in names or key in compiled:
+                continue
+            try:
+                compiled[key] = self._compile(tables[key[0]], key, invalid)
+            except ValueError as e:
+                _log.warning("TableRegistry: %s no longer compiles with result column "
+                             "'%s'; keeping its previous version. %s", key[0], key[1], e)
+                invalid.setdefault(key[0], []).append(str(e))
+                compiled[key] = table
+        return compiled
+
+    def track_changes(self):
+        """
+        Computes the worksheet digests that reload() compares against, if
+        they have not been computed yet. Call it before the workbook can
+        change; WorkbookWatcher calls it when it is created.
+        :return: dict, the digests
+        """
+        with self._lock:
+            if self.digests is None:
+                self.digests = sheet_digests(self.input_fp)
+            return self.digests
+
+    @instrumented("TableRegistry.reload")
+    def reload(self, debug=False):
+        """
+        Brings the registry up to date with its workbook. Every worksheet's
+        contents are hashed, and only the worksheets that were added or
+        whose contents changed are parsed, validated, and compiled again;
+        the others keep their DataFrames and compiled tables. Every variant
+        of a changed table that had been compiled is compiled again. The new
+        tables, report, and compiled tables replace the old ones in one
+        step, once all of them are ready. With use_cache, the cache is
+        rewritten. If track_changes() was never called there is nothing to
+        compare against, so every worksheet is reloaded.
+        :param debug: bool, defaults to False
+        :return: dict, with 'changed', 'added', and 'removed' keys, each a
+            list of worksheet names
+        """
+        digests = sheet_digests(self.input_fp)
+        previous = self.digests
+        if previous is None:
+            previous = {name: None for name in self.sheet_names}
+        summary = {
+            'changed': [name for name in digests
+                        if name in previous and digests[name] != previous[name]],
+            'added': [name for name in digests if name not in previous],
+            'removed': [name for name in previous if name not in digests],
+        }
+        stale = summary['changed'] + summary['added']
+        if not stale and not summary['removed']:
+            self.digests = digests
+            trace(_log, "TableRegistry.reload: %s is unchanged.", self.input_fp,
+                  debug=debug)
+            return summary
+
+        parsed, sheet_names, corrupt = parse_workbook(self.input_fp, sheets=stale)
+        parsed_invalid = validate_tables(parsed, debug=debug)
+        kept = [name for name in sheet_names if name in self.tables and name not in stale]
+        tables = {name: parsed[name] if name in parsed else self.tables[name]
+                  for name in sheet_names if name in parsed or name in kept}
+        invalid = {name: problems for name, problems in self.invalid.items()
+                   if name in kept}
+        invalid.update(parsed_invalid)
+        corrupt = [name for name in sheet_names
+                   if name in corrupt or (name in self.corrupt and name not in stale)]
+        compiled = {key: table for key, table in self._compiled.items() if key[0] in kept}
+        compiled.update(self._compile_all(tables, invalid, list(parsed),
+                                          previous=self._compiled))
+        report = build_report(sheet_names, corrupt, self.ws_list, invalid)
+
+        with self._lock:
+            replaced = [(old, compiled[key]) for key, old in self._compiled.items()
+                        if key in compiled and compiled[key] is not old]
+            (self.tables, self._compiled, self.invalid, self.sheet_names, self.corrupt,
+             self.report, self.digests) = (tables, compiled, invalid, sheet_names, corrupt,
+                                           report, digests)
+        for old, new in replaced:
+            table_store.replace(old, new, debug=debug)
+        if self.use_cache:
+            write_cache(self.input_fp, tables, sheet_names, corrupt, compiled=compiled,
+                        invalid=invalid, digests=digests, debug=debug)
+        trace(_log, "TableRegistry.reload: %s: %s, report: %s.", self.input_fp, summary,
+              report, debug=debug)
+        return summary
+
+
+def resolve_table(table, registry=None, result_col_header='Results', append_columns=False,
+                  debug=False):
+    """
+    Returns table as a CompiledTable. table may be a worksheet name, which is
+    looked up in registry, a DataFrame, or a CompiledTable.
+    :param table: str, pd.DataFrame, or CompiledTable
+    :param registry: TableRegistry, required when table is a name
+    :param result_col_header: str, defaults to 'Results'
+    :param append_columns: bool, defaults to False
+    :param debug: bool, defaults to False
+    :return: CompiledTable
+    """
+    if isinstance(table, str):
+        if registry is None:
+            raise ValueError(f"resolve_table: A TableRegistry is required to look "
+                             f"up the table named '{table}'.")
+        return registry.compiled(table, result_col_header=result_col_header,
+                                 append_columns=append_columns)
+    return compile_table(table, result_col_header=result_col_header,
+                         append_columns=append_columns, debug=debug)
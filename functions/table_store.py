@@ -0,0 +1,117 @@
+from functions.tracing import trace
+import logging
+import threading
+
+
+_log = logging.getLogger(__name__)
+
+
+class TableStore:
+    """
+    This class is a process-wide list of compiled tables, so a POI can refer
+    to a table with a small integer ID instead of holding the table itself.
+    Registering the same CompiledTable twice returns the same ID, so every
+    POI built from a TableRegistry shares one entry per table. A table with
+    the same name, result columns, trust, and contents as one already in
+    the store gets that table's ID and is not kept, so POIs built straight
+    from DataFrames, or from copies of them, do not grow the store one
+    table per POI. IDs are only meaningful within the process that assigned
+    them; use the table name (CompiledTable.name) when a reference has to
+    leave the process.
+
+    The store keeps every table it adds until replace() swaps it for a newer
+    version, as TableRegistry.reload() does for the tables it compiles
+    again. It may be used from several threads at once.
+    """
+    def __init__(self):
+        self._tables = []
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tables)
+
+    def __getitem__(self, table_id):
+        return self._tables[table_id]
+
+    def __repr__(self):
+        return f"TableStore(tables={len(self._tables)})"
+
+    def register(self, compiled, debug=False):
+        """
+        Returns the ID of compiled, adding it to the store the first time it
+        is seen.
+        :param compiled: CompiledTable or SharedTable
+        :param debug: bool, defaults to False
+        :return: int
+        """
+        # The store keeps every table it holds alive, and replace() drops the
+        # keys of the tables it lets go, so the ids used as keys are never
+        # reused for other objects.
+        table_id = self._ids.get(id(compiled))
+        if table_id is not None:
+            return table_id
+        # A SharedTable has no DataFrame to compare, so it is only ever
+        # matched by identity.
+        content_key = compiled.content_key() if compiled.table is not None else None
+        with self._lock:
+            table_id = self._ids.get(id(compiled))
+            if table_id is None and content_key is not None:
+                table_id = self._ids.get(content_key)
+            if table_id is None:
+                table_id = len(self._tables)
+                self._tables.append(compiled)
+                self._ids[id(compiled)] = table_id
+                if content_key is not None:
+                    self._ids[content_key] = table_id
+                trace(_log, "TableStore.register: %r -> %s.", compiled, table_id,
+                      debug=debug)
+        return table_id
+
+    def replace(self, old, new, debug=False):
+        """
+        Points the ID of old at new and lets old go, so POIs that refer to
+        old look up new from then on. Nothing happens if old is not in the
+        store.
+        :param old: CompiledTable or SharedTable
+        :param new: CompiledTable or SharedTable
+        :param debug: bool, defaults to False
+        :return: int or NoneType, the ID, or None if old is not in the store
+        """
+        with self._lock:
+            table_id = self._ids.pop(id(old), None)
+            if table_id is None:
+                return None
+            if old.table is not None and self._ids.get(old.content_key()) == table_id:
+                del self._ids[old.content_key()]
+            self._tables[table_id] = new
+            self._ids.setdefault(id(new), table_id)
+            if new.table is not None:
+                self._ids.setdefault(new.content_key(), table_id)
+        trace(_log, "TableStore.replace: %r -> %r, id %s.", old, new, table_id,
+              debug=debug)
+        return table_id
+
+
+# The store shared by every POI in this process.
+table_store = TableStore()
+
+
+def register_table(compiled, debug=False):
+    """
+    Returns the ID of compiled in the process-wide table store.
+    :param compiled: CompiledTable
+    :param debug: bool, defaults to False
+    :return: int
+    """
+    return table_store.register(compiled, debug=debug)
+
+
+def stored_table(table_id):
+    """
+    Returns the CompiledTable with the given ID in the process-wide table
+    store.
+    :param table_id: int
+    :return: CompiledTable
+    """
+    return table_store[table_id]
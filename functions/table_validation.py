@@ -0,0 +1,99 @@
+from functions.dice_notation import expression_bounds
+from functions.profiling import instrumented
+from functions.text_manipulation import parse_range_column
+from functions.tracing import trace
+import logging
+
+
+_log = logging.getLogger(__name__)
+
+
+def validate_table(table, name=None, debug=False):
+    """
+    Checks a roll table against the format get_table_result() expects and
+    returns a list of the problems found. An empty list means the table is
+    sound: every roll its header's dice can produce is covered by exactly
+    one row, so a lookup can never miss. The checks are:
+        1) The header of the first column is a dice expression, such as
+            'd20' or '2d6'. Its smallest and largest totals (2 and 12 for
+            '2d6') are the roll range the table must cover.
+        2) Every cell of the first column is 'n', 'm-n', or '-', with m <= n.
+        3) The rows ascend going down the column, with no overlaps and no
+            gaps between one row and the next.
+        4) The first row starts at the smallest total and the last row ends
+            at the largest.
+    Rows whose roll cell is '-' are ignored, as they are in lookups.
+    :param table: pd.DataFrame or CompiledTable
+    :param name: str, the table (worksheet) name, used in messages, defaults
+        to None
+    :param debug: bool, defaults to False
+    :return: list of str
+    """
+    table = getattr(table, 'table', table)
+    col_names = list(table.columns)
+    label = name or (col_names[0] if col_names else "table")
+    if len(col_names) < 2:
+        return [f"{label}: must have at least 2 columns. Columns found: {col_names}."]
+
+    header = str(col_names[0])
+    problems = []
+    try:
+        min_total, max_total = expression_bounds(header)
+    except ValueError:
+        problems.append(f"{label}: the first column header, '{header}', is not a dice "
+                        f"expression such as 'd20' or '2d6'.")
+        min_total = max_total = None
+    try:
+        lows, highs, ignored = parse_range_column(table[col_names[0]])
+    except ValueError as e:
+        problems.append(f"{label}: {e}")
+        return problems
+
+    rows = [(idx, int(lows[idx]), int(highs[idx])) for idx in range(len(lows))
+            if not ignored[idx]]
+    if len(rows) == 0:
+        problems.append(f"{label}: has no usable rows.")
+        return problems
+
+    for idx, low, high in rows:
+        if low > high:
+            problems.append(f"{label}: row {idx}: range {low}-{high} is reversed.")
+    for (prev_idx, prev_low, prev_high), (idx, low, high) in zip(rows, rows[1:]):
+        if low < prev_low:
+            problems.append(f"{label}: row {idx}: range {low}-{high} is out of order; "
+                            f"it comes after {prev_low}-{prev_high}.")
+        elif low <= prev_high:
+            problems.append(f"{label}: row {idx}: range {low}-{high} overlaps "
+                            f"{prev_low}-{prev_high} in row {prev_idx}.")
+        elif low > prev_high + 1:
+            problems.append(f"{label}: rolls {prev_high + 1}-{low - 1} are not covered "
+                            f"between rows {prev_idx} and {idx}.")
+
+    if min_total is not None:
+        first_low = rows[0][1]
+        last_high = max(high for idx, low, high in rows)
+        if first_low != min_total:
+            problems.append(f"{label}: the first row starts at {first_low}, but "
+                            f"{header} rolls from {min_total}.")
+        if last_high != max_total:
+            problems.append(f"{label}: the last row ends at {last_high}, but "
+                            f"{header} rolls up to {max_total}.")
+    trace(_log, "validate_table: %s: problems: %s.", label, problems, debug=debug)
+    return problems
+
+
+@instrumented("validate_tables")
+def validate_tables(tables, debug=False):
+    """
+    Runs validate_table() on every table of a workbook.
+    :param tables: dict, maps worksheet names to DataFrames
+    :param debug: bool, defaults to False
+    :return: dict, maps the name of each table with problems to its list of
+        problems. Tables without problems are left out.
+    """
+    invalid = {}
+    for name, table in tables.items():
+        problems = validate_table(table, name=name, debug=debug)
+        if problems:
+            invalid[name] = problems
+    return invalid
@@ -1,3 +1,19 @@
+import logging
+import re
+from functions.tracing import trace
+import numpy as np
+
+
+_log = logging.getLogger(__name__)
+
+# A roll cell with its spaces removed: 'n' or 'm-n'.
+_RANGE = re.compile(r"^(\d+)(?:-(\d+))?$")
+# One line per roll cell of a joined column: 'n' or 'm-n' (Excel hands back
+# integer cells as '20.0' in columns that also contain blanks), '-', or
+# anything else, which is malformed.
+_RANGE_LINES = re.compile(r"^(?:(\d+)(?:\.0|-(\d+))?|(-)|(.*))$", re.MULTILINE)
+
+
 def return_range(s, debug=False):
     """
     This function takes a string in one of two forms: n or m-n, where
@@ -5,55 +21,98 @@ def return_range(s, debug=False):
     can handle a situation where 'n-m' in actually integers with extra
     spaces surrounding the values.
     If debug is True, more complete debugging messages are shown in
-    program output.
+    program output. To parse a whole roll column at once, use
+    parse_range_column().
     :param s:
     :param debug: bool, defaults to False
     :return: tuple in the form (m, m) or (m, n)
     """
-    print(f"return_range: s: {s}.")
+    trace(_log, "return_range: s: %s.", s, debug=debug)
     # First, make sure the string is not NoneType.
     if s is None:
         error_msg = (f"return_range: Fatal Error: The string cannot be "
                      f"NoneType.")
         raise TypeError(error_msg)
 
-    # Second, check the string for integers and dashes.
-    s = str(s)
-    if debug:
-        print(f"return_range: s: {s}.")
-    # Remove blank spaces.
-    s = s.replace(' ', '')
-    if debug:
-        print(f"return_range: s: {s}.")
-    ctr = 0
-    for c in s:
-        if debug:
-            print(f"return_range: c: {c}. ctr: {ctr}")
-        if c != '-':
-            try:
-                n = int(c.strip())
-            except ValueError:
-                error_msg = (f"return_range: Fatal Error: All characters"
-                             f" in the string must be integers with the"
-                             f" exception of a single dash (-). Spaces are"
-                             f" permitted, but no other characters.")
-                raise ValueError(error_msg)
-            else:
-                continue
+    # Second, check the string for integers and a dash, ignoring spaces.
+    s = str(s).replace(' ', '')
+    match = _RANGE.match(s)
+    if match is None:
+        if s.count('-') > 1:
+            error_msg = (f"return_range: Fatal Error: More than a pair of"
+                         f" values was included in the string.")
         else:
-            ctr += 1
-    if ctr > 1:
-        error_msg = (f"return_range: Fatal Error: More than a pair of"
-                     f" values was included in the string.")
+            error_msg = (f"return_range: Fatal Error: All characters"
+                         f" in the string must be integers with the"
+                         f" exception of a single dash (-). Spaces are"
+                         f" permitted, but no other characters.")
         raise ValueError(error_msg)
 
-    l = s.split('-')
-    m = int(l[0].strip())
-    if len(l) == 1:
+    m = int(match.group(1))
+    if match.group(2) is None:
         result = (m, m)
     else:
-        n = int(l[1].strip())
-        result = (m, n)
+        result = (m, int(match.group(2)))
+
+    trace(_log, "return_range: result: %s", result, debug=debug)
+    return result
+
+
+def parse_range_column(column, debug=False):
+    """
+    This function parses a whole roll column, such as the first column of a
+    table read by get_table_result(), in one pass. The cells are joined into
+    a single string and matched with one precompiled regex, so the per-cell
+    work happens inside the regex engine. Each cell is 'n', 'm-n', or '-',
+    with any number of spaces. Cells that hold integers rather than strings
+    are accepted too, and a column with an integer dtype is returned without
+    parsing.
+        1) A '-' cell marks a row that is ignored.
+        2) A blank (None/NaN) first cell is read as 1, the value it had
+            before Excel lost it.
+    Every malformed cell is reported in a single ValueError.
+    :param column: pd.Series or list
+    :param debug: bool, defaults to False
+    :return: tuple of np.ndarray, (lows, highs, ignored). lows and highs are
+        int arrays, with 0 for ignored rows; ignored is a bool array.
+    """
+    dtype = getattr(column, 'dtype', None)
+    if isinstance(dtype, np.dtype) and dtype.kind in "iu":
+        # A column of plain numbers needs no parsing.
+        lows = np.asarray(column, dtype=np.int64)
+        return lows, lows.copy(), np.zeros(len(lows), dtype=bool)
+
+    values = list(column)
+    size = len(values)
+    lows = np.zeros(size, dtype=np.int64)
+    highs = np.zeros(size, dtype=np.int64)
+    ignored = np.zeros(size, dtype=bool)
+    if size == 0:
+        return lows, highs, ignored
+
+    # Splitting on whitespace also removes any newline, so there is exactly
+    # one line per cell.
+    text = "\n".join("".join(str(item).split()) for item in values)
+    bad = []
+    for idx, (low, high, dash, other) in enumerate(_RANGE_LINES.findall(text)):
+        if low:
+            lows[idx] = int(low)
+            highs[idx] = int(high) if high else lows[idx]
+        elif dash:
+            ignored[idx] = True
+        elif idx == 0 and _is_blank(values[0]):
+            lows[0] = highs[0] = 1
+        else:
+            bad.append(f"row {idx}: {values[idx]!r}")
+    if bad:
+        raise ValueError(f"parse_range_column: Fatal Error: Every cell must be 'n', "
+                         f"'m-n', or '-', where m and n are integers. Spaces are "
+                         f"permitted. Malformed cells: {', '.join(bad)}.")
+    trace(_log, "parse_range_column: lows: %s, highs: %s, ignored: %s.", lows, highs,
+          ignored, debug=debug)
+    return lows, highs, ignored
+
 
-    print(f"return_range: result: {result}")
-    return result
\ No newline at end of file
+def _is_blank(item):
+    """Returns True for the None or NaN that Excel leaves in an empty cell."""
+    return item is None or (isinstance(item, float) and item != item)
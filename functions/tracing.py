@@ -0,0 +1,106 @@
+import logging
+
+
+# Every module in entities and functions traces through a logger named after
+# the module, e.g. 'functions.data_functions'. Compiled tables trace through
+# 'functions.tables.<table name>', so a single table can be traced on its own.
+PACKAGES = ("entities", "functions")
+TABLE_LOGGER_PREFIX = "functions.tables"
+TRACE_FORMAT = "%(name)s: %(message)s"
+
+# Records forced by a debug=True argument bypass the logger levels and are
+# written here, so the existing debug flags keep working without any logging
+# configuration.
+_debug_handler = logging.StreamHandler()
+_debug_handler.setFormatter(logging.Formatter(TRACE_FORMAT))
+
+# Handlers attached by enable_tracing(), keyed by logger name.
+_tracing_handlers = {}
+
+
+def table_logger_name(table_name):
+    """
+    Returns the logger name used to trace the named table.
+    :param table_name: str or NoneType
+    :return: str
+    """
+    if table_name is None:
+        return TABLE_LOGGER_PREFIX
+    return f"{TABLE_LOGGER_PREFIX}.{table_name}"
+
+
+def trace(logger, msg, *args, debug=False):
+    """
+    Emits a trace message. The message is formatted lazily, using logging's
+    %-style arguments, and only if it is actually emitted, so passing whole
+    DataFrames as arguments costs nothing while tracing is off. The message
+    is emitted if the logger is enabled for DEBUG, or if debug is True.
+    :param logger: logging.Logger
+    :param msg: str, %-style format string
+    :param args: arguments for msg
+    :param debug: bool, defaults to False
+    :return: None
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args, stacklevel=2)
+    elif debug:
+        record = logger.makeRecord(logger.name, logging.DEBUG, "", 0, msg, args, None)
+        _debug_handler.handle(record)
+
+
+def is_tracing(logger, debug=False):
+    """
+    Returns True if a trace sent to logger would be emitted. Use it to guard
+    trace arguments that are expensive to compute.
+    :param logger: logging.Logger
+    :param debug: bool, defaults to False
+    :return: bool
+    """
+    return debug or logger.isEnabledFor(logging.DEBUG)
+
+
+def enable_tracing(*modules, tables=(), level=logging.DEBUG, stream=None):
+    """
+    Turns on tracing for the named modules and tables. Module names are
+    logger names such as 'functions.data_functions' or 'entities'; a package
+    name enables every module in it. With no modules and no tables, both
+    packages are enabled. Each enabled logger gets a stream handler writing
+    to stream (stderr by default).
+    :param modules: str, logger names
+    :param tables: iterable of str, table names
+    :param level: int, logging level, defaults to logging.DEBUG
+    :param stream: file-like object, defaults to sys.stderr
+    :return: None
+    """
+    names = list(modules) + [table_logger_name(t) for t in tables]
+    if not names:
+        names = list(PACKAGES)
+    for name in names:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        if name not in _tracing_handlers:
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(logging.Formatter(TRACE_FORMAT))
+            logger.addHandler(handler)
+            logger.propagate = False
+            _tracing_handlers[name] = handler
+
+
+def disable_tracing(*modules, tables=()):
+    """
+    Turns off tracing enabled by enable_tracing(). With no modules and no
+    tables, every logger enabled by enable_tracing() is turned off.
+    :param modules: str, logger names
+    :param tables: iterable of str, table names
+    :return: None
+    """
+    names = list(modules) + [table_logger_name(t) for t in tables]
+    if not names:
+        names = list(_tracing_handlers) + list(PACKAGES)
+    for name in names:
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.NOTSET)
+        handler = _tracing_handlers.pop(name, None)
+        if handler is not None:
+            logger.removeHandler(handler)
+            logger.propagate = True
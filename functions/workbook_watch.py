@@ -0,0 +1,208 @@
+from functions.tracing import trace
+import hashlib
+import logging
+import os
+import posixpath
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+
+
+_log = logging.getLogger(__name__)
+
+_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Polling interval of WorkbookWatcher, in seconds.
+POLL_INTERVAL = 1.0
+
+
+def sheet_digests(input_fp):
+    """
+    Returns a SHA-256 digest of every worksheet's cell contents, read
+    straight from the workbook's XML without parsing it into DataFrames.
+    Each cell contributes its reference and value; a shared string is
+    hashed as its text, not its index, so a worksheet keeps its digest when
+    an edit elsewhere renumbers the workbook's shared strings. Formatting and
+    empty cells are ignored.
+    :param input_fp: filepath to an .xlsx workbook
+    :return: dict, maps worksheet names, in workbook order, to hex digests
+    """
+    with zipfile.ZipFile(input_fp) as archive:
+        shared = _shared_strings(archive)
+        digests = {}
+        for name, path in _sheet_paths(archive).items():
+            digest = hashlib.sha256()
+            with archive.open(path) as f:
+                for event, element in ET.iterparse(f):
+                    if element.tag != f"{_MAIN}c":
+                        continue
+                    kind = element.get('t')
+                    if kind == 's':
+                        value = shared[int(element.findtext(f"{_MAIN}v"))]
+                    elif kind == 'inlineStr':
+                        value = "".join(t.text or "" for t in element.iter(f"{_MAIN}t"))
+                    else:
+                        value = element.findtext(f"{_MAIN}v")
+                    if value:
+                        text = "s" if kind in ('s', 'inlineStr', 'str') else kind or "n"
+                        digest.update(f"{element.get('r')}\x1f{text}\x1f{value}\x1e"
+                                      .encode())
+                    element.clear()
+            digests[name] = digest.hexdigest()
+    return digests
+
+
+def _sheet_paths(archive):
+    # Maps worksheet names to their XML parts through the workbook's
+    # relationships.
+    targets = {}
+    with archive.open("xl/_rels/workbook.xml.rels") as f:
+        for rel in ET.parse(f).getroot().iter(f"{_PACKAGE_REL}Relationship"):
+            target = rel.get('Target')
+            if target.startswith("/"):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join("xl", target))
+            targets[rel.get('Id')] = target
+    paths = {}
+    with archive.open("xl/workbook.xml") as f:
+        for sheet in ET.parse(f).getroot().iter(f"{_MAIN}sheet"):
+            paths[sheet.get('name')] = targets[sheet.get(f"{_REL}id")]
+    return paths
+
+
+def _shared_strings(archive):
+    try:
+        f = archive.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    strings = []
+    with f:
+        for event, element in ET.iterparse(f):
+            if element.tag == f"{_MAIN}si":
+                # Rich text is split into runs; phonetic hints are not text.
+                phonetic = {t for ph in element.iter(f"{_MAIN}rPh")
+                            for t in ph.iter(f"{_MAIN}t")}
+                strings.append("".join(t.text or "" for t in element.iter(f"{_MAIN}t")
+                                       if t not in phonetic))
+                element.clear()
+    return strings
+
+
+def file_signature(input_fp):
+    """
+    Returns the workbook's size and modification time, which change on
+    every save.
+    :param input_fp: filepath
+    :return: tuple, (st_size, st_mtime_ns)
+    """
+    stat = os.stat(input_fp)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class WorkbookWatcher:
+    """
+    This class watches a TableRegistry's workbook in a background thread
+    and reloads the registry when the file changes (see
+    TableRegistry.reload()). Creating it records the worksheet digests the
+    reloads compare against (see TableRegistry.track_changes()). The file's
+    size and modification time are polled every interval seconds, so an
+    idle watcher costs one stat() per poll. A save that is still being written, or that cannot be read, is
+    retried on the next poll and the registry keeps its current tables.
+
+    on_reload, if given, is called from the watcher thread with the
+    reload()'s summary after every reload that changed something.
+        with WorkbookWatcher(registry, on_reload=print):
+            ...
+    """
+    def __init__(self, registry, interval=POLL_INTERVAL, on_reload=None, debug=False):
+        """
+        :param registry: TableRegistry
+        :param interval: float, seconds between polls, defaults to POLL_INTERVAL
+        :param on_reload: callable, defaults to None
+        :param debug: bool, defaults to False
+        """
+        self.registry = registry
+        self.interval = interval
+        self.on_reload = on_reload
+        self.debug = debug
+        self._signature = file_signature(registry.input_fp)
+        registry.track_changes()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return (f"WorkbookWatcher({self.registry.input_fp!r}, interval={self.interval}, "
+                f"running={self.running})")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Starts polling in a daemon thread.
+        :return:
+        """
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="WorkbookWatcher",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops polling and waits for the thread, including a reload in
+        progress, to finish.
+        :return:
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self):
+        """
+        Reloads the registry if the workbook changed since the last check.
+        Called by the watcher thread; it can also be called directly instead
+        of starting the thread.
+        :return: dict or NoneType, the reload() summary, or None if the file
+            did not change or could not be read yet
+        """
+        try:
+            signature = file_signature(self.registry.input_fp)
+        except FileNotFoundError:
+            # Some editors save by deleting and renaming.
+            return None
+        if signature == self._signature:
+            return None
+        try:
+            summary = self.registry.reload(debug=self.debug)
+        except (OSError, zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            _log.warning("WorkbookWatcher.check: %s could not be read; will retry. "
+                         "%s", self.registry.input_fp, e)
+            return None
+        self._signature = signature
+        trace(_log, "WorkbookWatcher.check: %s.", summary, debug=self.debug)
+        if self.on_reload is not None and any(summary.values()):
+            self.on_reload(summary)
+        return summary
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                _log.exception("WorkbookWatcher: reload of %s failed.",
+                               self.registry.input_fp)
@@ -0,0 +1,454 @@
+"""
+Local HTTP/JSON server that keeps a workbook's tables loaded and answers
+dice, table, and POI generation requests, so tools do not have to import
+pandas and read the workbook on every run. It listens on localhost only
+and needs nothing beyond the standard library and this repository:
+    python poi_server.py tables.xlsx [--port 8765]
+
+Endpoints (request and response bodies are JSON):
+    GET  /health     {"status": "ok"}
+    GET  /tables     the worksheets and the check_workbook() report
+    POST /roll       {"expression": "4d6kh3", "n": 1, "seed": null}
+                     -> {"rolls": [...]}
+    POST /lookup     {"table": "Divine POI", "rolls": [3, 17]} or "roll": 3,
+                     optional "result_col_header" and "append_columns"
+                     -> {"results": [...]}
+    POST /generate   {"type": "divine_poi", "n": 10, "seed": 1,
+                     "record_rolls": true} -> {"pois": [{...}, ...]}
+"n" and the length of "rolls" are at most MAX_COUNT. Malformed requests are answered with status 400
+and {"error": "..."}.
+
+Requests without a seed that arrive close together are coalesced: rolls of
+the same dice expression, lookups on the same table, and generation of the
+same POI type are queued for a few milliseconds and served by one batched
+roll-and-lookup pass, then split among the requests. Seeded requests are
+always served on their own, so the same seed gives the same answer.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+from entities.dice import compile_dice_expression
+from entities.parallel_generation import POI_GENERATORS
+from functions import TableRegistry, get_rng
+from functions.tracing import trace
+import argparse
+import asyncio
+import json
+import logging
+import numpy as np
+
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+
+# How long the first request of a batch waits for others, in seconds.
+BATCH_WINDOW = 0.002
+
+# A batch is served at once when it reaches this many draws.
+MAX_BATCH = 4096
+
+# Requests for more rolls or POIs than this are served on a worker thread,
+# so the server keeps answering small requests meanwhile.
+LARGE_REQUEST = 10_000
+
+# Largest 'n' a single request may ask for.
+MAX_COUNT = 1_000_000
+
+# Rolls sent to /lookup must fit in a signed 64-bit integer.
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+
+class RequestError(Exception):
+    """A request the server cannot serve, answered with status."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """
+    This class coalesces concurrent requests that can be served together.
+    Requests are queued under a key and flushed together window seconds
+    after the first of them arrives, or as soon as they ask for max_batch
+    draws in all. handler(key, items) serves a whole batch, given each
+    request's item, and returns one result per request, in order. If it
+    raises, the batch is served again one request at a time, so a bad
+    request only fails itself. With window 0 every request is served on its
+    own.
+    """
+    def __init__(self, handler, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        """
+        :param handler: callable, (key, list) -> list
+        :param window: float, seconds, defaults to BATCH_WINDOW
+        :param max_batch: int, defaults to MAX_BATCH
+        """
+        self.handler = handler
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.requests = 0
+        self._pending = {}
+
+    async def submit(self, key, item, size):
+        """
+        Queues one request and waits for its result.
+        :param key: hashable, requests with equal keys are batched
+        :param item: the request's share of the work, passed to handler
+        :param size: int, the number of draws the request needs
+        :return: the request's result from handler
+        """
+        self.requests += 1
+        if self.window <= 0:
+            self.batches += 1
+            return self.handler(key, [item])[0]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.get(key)
+        if pending is None:
+            # [requests, draws, the timer that flushes them]
+            pending = self._pending[key] = [[], 0, None]
+            pending[2] = loop.call_later(self.window, self._flush, key)
+        pending[0].append((item, future))
+        pending[1] += size
+        if pending[1] >= self.max_batch:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        batch, _, timer = pending
+        timer.cancel()
+        self.batches += 1
+        items = [item for item, _ in batch]
+        try:
+            results = self.handler(key, items)
+        except Exception as e:
+            if len(batch) == 1:
+                _settle(batch[0][1], error=e)
+                return
+            trace(_log, "MicroBatcher._flush: %s: a batch of %s requests failed; "
+                  "serving them one at a time.", key, len(batch))
+            results = []
+            for item in items:
+                try:
+                    results.append(self.handler(key, [item])[0])
+                except Exception as e:
+                    results.append(_Failed(e))
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, _Failed):
+                _settle(future, error=result.error)
+            else:
+                _settle(future, result)
+
+
+class _Failed:
+    # The error of one request of a batch served one request at a time.
+    def __init__(self, error):
+        self.error = error
+
+
+def _settle(future, result=None, error=None):
+    # A request whose client went away has a cancelled future.
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _split(values, sizes):
+    return np.split(values, np.cumsum(sizes)[:-1])
+
+
+class PoiServer:
+    """
+    This class answers the requests described in the module docstring from
+    one TableRegistry that stays loaded for the life of the server. Unseeded
+    requests draw from the server's own random stream, which seed fixes for
+    reproducible sessions.
+    """
+    def __init__(self, workbook, host="127.0.0.1", port=DEFAULT_PORT, seed=None,
+                 window=BATCH_WINDOW, use_cache=True, debug=False):
+        """
+        :param workbook: filepath to the Excel workbook
+        :param host: str, defaults to '127.0.0.1'
+        :param port: int, 0 picks a free port, defaults to DEFAULT_PORT
+        :param seed: None or int, defaults to None
+        :param window: float, the batching window in seconds, defaults to
+            BATCH_WINDOW
+        :param use_cache: bool, defaults to True
+        :param debug: bool, defaults to False
+        """
+        self.registry = TableRegistry(workbook, use_cache=use_cache, debug=debug)
+        self.host = host
+        self.port = port
+        self.rng = get_rng(seed)
+        self.debug = debug
+        self.rolls = MicroBatcher(self._roll_batch, window=window)
+        self.lookups = MicroBatcher(self._lookup_batch, window=window)
+        self.generation = MicroBatcher(self._generate_batch, window=window)
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix="PoiServer")
+        self._server = None
+
+    def __repr__(self):
+        return f"PoiServer({self.registry.input_fp!r}, {self.host}:{self.port})"
+
+    async def start(self):
+        """
+        Starts listening. With port 0, self.port is the port picked.
+        :return:
+        """
+        self._server = await asyncio.start_server(self._serve_connection, self.host,
+                                                  self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._executor.shutdown(wait=True)
+
+    async def handle(self, method, path, body):
+        """
+        Answers one request.
+        :param method: str
+        :param path: str
+        :param body: bytes
+        :return: tuple, (HTTPStatus, payload) where payload is JSON-able
+        """
+        try:
+            match method, path:
+                case "GET", "/health":
+                    return HTTPStatus.OK, {'status': 'ok'}
+                case "GET", "/tables":
+                    return HTTPStatus.OK, {'tables': list(self.registry),
+                                           'report': self.registry.report}
+                case "POST", "/roll":
+                    return HTTPStatus.OK, await self.roll(_parse_body(body))
+                case "POST", "/lookup":
+                    return HTTPStatus.OK, await self.lookup(_parse_body(body))
+                case "POST", "/generate":
+                    return HTTPStatus.OK, await self.generate(_parse_body(body))
+                case _, ("/health" | "/tables" | "/roll" | "/lookup" | "/generate"):
+                    raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED,
+                                       f"{method} is not allowed on {path}.")
+                case _:
+                    raise RequestError(HTTPStatus.NOT_FOUND, f"There is no {path}.")
+        except RequestError as e:
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            _log.exception("PoiServer.handle: %s %s failed.", method, path)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+    async def roll(self, request):
+        expression = _field(request, 'expression', str).lower()
+        n = _count(request)
+        try:
+            dice = compile_dice_expression(expression)
+        except ValueError as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, str(e)) from None
+        if request.get('seed') is not None or n > LARGE_REQUEST:
+            rng = _seed(request) if request.get('seed') is not None else self.rng
+            loop = asyncio.get_running_loop()
+            rolls = await loop.run_in_executor(self._executor, dice.roll, n, rng)
+        else:
+            rolls = await self.rolls.submit(expression, n, n)
+        return {'rolls': rolls.tolist()}
+
+    async def lookup(self, request):
+        name = _field(request, 'table', str)
+        key = (name, _field(request, 'result_col_header', str, default='Results'),
+               bool(request.get('append_columns', False)))
+        try:
+            self.registry.compiled(*key)
+        except KeyError as e:
+            raise RequestError(HTTPStatus.NOT_FOUND, e.args[0]) from None
+        except ValueError as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, str(e)) from None
+        if 'rolls' in request:
+            rolls = request['rolls']
+        else:
+            rolls = [_field(request, 'roll', int)]
+        # The length is checked first, so an oversized list is refused
+        # before its rolls are checked one by one.
+        if isinstance(rolls, list) and len(rolls) > MAX_COUNT:
+            raise RequestError(HTTPStatus.BAD_REQUEST,
+                               f"'rolls' must hold at most {MAX_COUNT} rolls. Length "
+                               f"provided is {len(rolls)}.")
+        if not isinstance(rolls, list) or not all(
+                isinstance(roll, int) and not isinstance(roll, bool)
+                and _INT64_MIN <= roll <= _INT64_MAX for roll in rolls):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "'rolls' must be a list of integers "
+                                                       "that fit in 64 bits.")
+        results = await self.lookups.submit(key, rolls, len(rolls))
+        return {'results': results.tolist()}
+
+    async def generate(self, request):
+        poi_type = _field(request, 'type', str)
+        if poi_type not in POI_GENERATORS:
+            raise RequestError(HTTPStatus.BAD_REQUEST,
+                               f"Unknown POI type '{poi_type}'. Known types are "
+                               f"{list(POI_GENERATORS)}.")
+        n = _count(request)
+        record_rolls = bool(request.get('record_rolls', True))
+        if request.get('seed') is not None or n > LARGE_REQUEST:
+            rng = _seed(request) if request.get('seed') is not None else self.rng
+            loop = asyncio.get_running_loop()
+            frame = await loop.run_in_executor(
+                self._executor, lambda: POI_GENERATORS[poi_type](
+                    n, self.registry, rng=rng, record_rolls=record_rolls))
+            records = _records(frame)
+        else:
+            records = await self.generation.submit((poi_type, record_rolls), n, n)
+        return {'pois': records}
+
+    def _roll_batch(self, expression, sizes):
+        rolls = compile_dice_expression(expression).roll(sum(sizes), rng=self.rng)
+        trace(_log, "PoiServer._roll_batch: %s: %s requests, %s rolls.", expression,
+              len(sizes), len(rolls), debug=self.debug)
+        return _split(rolls, sizes)
+
+    def _lookup_batch(self, key, batch):
+        # Rolls come from clients, so they are checked even on trusted
+        # tables: a roll that no row covers gives None.
+        compiled = self.registry.compiled(*key)
+        rolls = np.fromiter((roll for rolls in batch for roll in rolls), dtype=np.int64)
+        rows = compiled.row_indices(rolls)
+        results = compiled.results[np.maximum(rows, 0)]
+        results[rows < 0] = None
+        trace(_log, "PoiServer._lookup_batch: %s: %s requests, %s rolls.", key[0],
+              len(batch), len(rolls), debug=self.debug)
+        return _split(results, [len(rolls) for rolls in batch])
+
+    def _generate_batch(self, key, sizes):
+        poi_type, record_rolls = key
+        frame = POI_GENERATORS[poi_type](sum(sizes), self.registry, rng=self.rng,
+                                         record_rolls=record_rolls)
+        records = _records(frame)
+        trace(_log, "PoiServer._generate_batch: %s: %s requests, %s POIs.", poi_type,
+              len(sizes), len(records), debug=self.debug)
+        bounds = np.cumsum([0] + sizes).tolist()
+        return [records[start:stop] for start, stop in zip(bounds, bounds[1:])]
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.handle(method, urlsplit(target).path, body)
+                data = json.dumps(payload).encode()
+                keep_alive = (version == "HTTP/1.1"
+                              and headers.get('connection', '').lower() != "close")
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                             f"\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def _parse_body(body):
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "The body is not valid JSON.") from None
+    if not isinstance(request, dict):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "The body must be a JSON object.")
+    return request
+
+
+def _field(request, name, kind, default=None):
+    value = request.get(name, default)
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise RequestError(HTTPStatus.BAD_REQUEST,
+                           f"'{name}' must be a {kind.__name__}. Value provided is "
+                           f"{value!r}.")
+    return value
+
+
+def _count(request):
+    n = request.get('n', 1)
+    if not isinstance(n, int) or isinstance(n, bool) or n < 0 or n > MAX_COUNT:
+        raise RequestError(HTTPStatus.BAD_REQUEST,
+                           f"'n' must be an integer from 0 to {MAX_COUNT}. Value "
+                           f"provided is {n!r}.")
+    return n
+
+
+def _seed(request):
+    seed = request['seed']
+    if not isinstance(seed, int) or isinstance(seed, bool) or seed < 0:
+        raise RequestError(HTTPStatus.BAD_REQUEST,
+                           f"'seed' must be a positive integer or 0. Value provided "
+                           f"is {seed!r}.")
+    return np.random.default_rng(seed)
+
+
+def _records(frame):
+    # tolist() turns numpy scalars into Python ones, which json can encode.
+    columns = {name: frame[name].tolist() for name in frame.columns}
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve dice rolls, table lookups, "
+                                                 "and POIs over HTTP on localhost.")
+    parser.add_argument("workbook", help="path to the Excel workbook")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="0 picks a free port")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW * 1000,
+                        help="batching window; 0 turns batching off")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args(argv)
+
+    async def run():
+        server = PoiServer(args.workbook, host=args.host, port=args.port, seed=args.seed,
+                           window=args.window_ms / 1000, use_cache=not args.no_cache)
+        await server.start()
+        print(f"main: Serving {args.workbook} on http://{server.host}:{server.port}",
+              flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+from benchmarks.synthetic_workbook import write_synthetic_workbook
+from functions import TableRegistry
+import pytest
+
+
+@pytest.fixture(scope="session")
+def workbook(tmp_path_factory):
+    """
+    A synthetic tables.xlsx with the four worksheets the POI classes use.
+    """
+    path = tmp_path_factory.mktemp("workbook") / "tables.xlsx"
+    write_synthetic_workbook(str(path))
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def registry(workbook):
+    return TableRegistry(workbook)
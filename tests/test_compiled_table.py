@@ -0,0 +1,77 @@
+from functions import CompiledTable, compile_table, get_table_result
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _table(rows, width=2):
+    # rows rows of width rolls each, starting at roll 1.
+    rolls = [f"{i * width + 1}-{(i + 1) * width}" for i in range(rows)]
+    return pd.DataFrame({f"d{rows * width}": rolls,
+                         'Results': [f"row {i}" for i in range(rows)],
+                         'Other': [f"other {i}" for i in range(rows)]})
+
+
+def _compiled(rows, width=2, trusted=False):
+    compiled = CompiledTable(_table(rows, width))
+    if trusted:
+        compiled.mark_trusted()
+    return compiled
+
+
+# A 10 row table uses the dense roll -> row array; a 1000 row table of 2000
+# rolls is over DENSE_LIMIT and uses bisection.
+TABLES = [(10, 2), (1000, 2)]
+
+
+@pytest.mark.parametrize("rows, width", TABLES)
+def test_lookup_at_and_outside_the_bounds(rows, width):
+    compiled = _compiled(rows, width)
+    assert compiled.lookup(1) == "row 0"
+    assert compiled.lookup(rows * width) == f"row {rows - 1}"
+    assert compiled.lookup(0) is None
+    assert compiled.lookup(rows * width + 1) is None
+    assert compiled.lookup(-5) is None
+
+
+@pytest.mark.parametrize("rows, width", TABLES)
+def test_lookup_trusted_at_and_outside_the_bounds(rows, width):
+    compiled = _compiled(rows, width, trusted=True)
+    assert (compiled._dense is not None) == (rows * width <= CompiledTable.DENSE_LIMIT)
+    assert compiled.lookup_trusted(1) == "row 0"
+    assert compiled.lookup_trusted(rows * width) == f"row {rows - 1}"
+    assert compiled.lookup_trusted(0) is None
+    assert compiled.lookup_trusted(rows * width + 1) is None
+    assert compiled.lookup_trusted(-5) is None
+
+
+@pytest.mark.parametrize("rows, width", TABLES)
+@pytest.mark.parametrize("trusted", [False, True])
+def test_lookup_many_at_and_outside_the_bounds(rows, width, trusted):
+    compiled = _compiled(rows, width, trusted=trusted)
+    top = rows * width
+    results = compiled.lookup_many([0, 1, width, width + 1, top, top + 1])
+    assert results.tolist() == [None, "row 0", "row 0", "row 1", f"row {rows - 1}", None]
+    assert compiled.lookup_many(np.arange(1, top + 1)).tolist() == [
+        f"row {i}" for i in range(rows) for _ in range(width)]
+
+
+def test_get_table_result_uses_the_requested_column():
+    compiled = _compiled(10, trusted=True)
+    assert get_table_result(compiled, 3) == "row 1"
+    assert get_table_result(compiled, 3, result_col_header='Other') == "other 1"
+    assert get_table_result(compiled, 21) is None
+
+
+def test_compile_table_reuses_the_compiled_dataframe():
+    table = _table(10)
+    assert compile_table(table) is compile_table(table)
+    assert compile_table(table, 'Other') is not compile_table(table)
+    assert compile_table(table, 'Other').lookup(1) == "other 0"
+
+
+def test_ignored_rows_and_dash_results():
+    table = pd.DataFrame({'d6': ['1-2', '-', '3-6'], 'Results': ['low', 'gone', '-']})
+    compiled = CompiledTable(table)
+    assert len(compiled) == 2
+    assert compiled.lookup_many([1, 3, 7]).tolist() == ["low", "nothing", None]
@@ -0,0 +1,59 @@
+from entities import AdventureSite, DivinePOI, write_pois, read_pois
+from entities.export import iter_records
+import numpy as np
+import pytest
+
+
+def _pois(registry):
+    return [
+        AdventureSite('POI Discoverability', registry=registry, rng=1),
+        DivinePOI('POI Discoverability', 'Divine POI', 'Current Divine Factions',
+                  'Divine Faction Action', registry=registry, rng=2),
+    ]
+
+
+@pytest.mark.parametrize("fmt", ["jsonl", "csv"])
+def test_round_trip(tmp_path, registry, fmt):
+    pois = _pois(registry)
+    path = str(tmp_path / f"pois.{fmt}")
+    assert write_pois(pois, path, seed=5) == len(pois)
+    assert [r['seed'] for r in iter_records(path)] == [5, 5]
+    restored = list(read_pois(path, registry))
+    assert [p.to_record(seed=5) for p in restored] == [p.to_record(seed=5) for p in pois]
+
+
+@pytest.mark.parametrize("fmt", ["jsonl", "csv"])
+@pytest.mark.parametrize("seed", [np.int64(7), np.uint32(7)])
+def test_round_trip_numpy_seed(tmp_path, registry, fmt, seed):
+    path = str(tmp_path / f"pois.{fmt}")
+    write_pois(_pois(registry), path, seed=seed)
+    records = list(iter_records(path))
+    assert [r['seed'] for r in records] == [7, 7]
+    assert all(type(r['seed']) is int for r in records)
+
+
+def test_round_trip_record_with_numpy_seed(tmp_path, registry):
+    record = AdventureSite('POI Discoverability', registry=registry, rng=1).to_record()
+    record['seed'] = np.int64(11)
+    path = str(tmp_path / "pois.jsonl")
+    write_pois([record], path)
+    (restored,) = iter_records(path)
+    assert restored == dict(record, seed=11)
+
+
+def test_parquet_round_trip(tmp_path, registry):
+    pytest.importorskip("pyarrow")
+    pois = _pois(registry)
+    path = str(tmp_path / "pois.parquet")
+    write_pois(pois, path, seed=np.int64(3))
+    assert [r['seed'] for r in iter_records(path)] == [3, 3]
+    restored = list(read_pois(path, registry))
+    assert [p.to_record() for p in restored] == [p.to_record() for p in pois]
+
+
+def test_reading_rebuilds_rerollable_pois(tmp_path, registry):
+    path = str(tmp_path / "pois.jsonl")
+    write_pois(_pois(registry), path)
+    for poi in read_pois(path, registry, rng=4):
+        poi.reroll()
+        assert poi.discoverability in {"hidden", "obscure", "obvious"}
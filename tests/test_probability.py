@@ -0,0 +1,48 @@
+from collections import Counter
+from fractions import Fraction
+from functions import dice_pmf
+from itertools import product
+import numpy as np
+import pytest
+
+
+def _brute_force(dice_size, dice_number, roll_type, drop_number, highest):
+    # Every roll of every die, each pair kept as Dice keeps it for advantage
+    # and disadvantage, with the dropped dice removed.
+    pairs = 1 if roll_type == "normal" else 2
+    keep = max if roll_type == "advantage" else min
+    totals = Counter()
+    for faces in product(range(1, dice_size + 1), repeat=dice_number * pairs):
+        dice = [keep(faces[i:i + pairs]) for i in range(0, len(faces), pairs)]
+        dice.sort(reverse=highest)
+        totals[sum(dice[:dice_number - drop_number])] += 1
+    count = sum(totals.values())
+    return {total: Fraction(n, count) for total, n in totals.items()}
+
+
+@pytest.mark.parametrize("dice_size, dice_number, roll_type, drop_number, highest", [
+    (6, 1, "normal", 0, True),
+    (6, 3, "normal", 0, True),
+    (20, 1, "advantage", 0, True),
+    (20, 1, "disadvantage", 0, True),
+    (6, 4, "normal", 1, True),
+    (6, 4, "normal", 1, False),
+    (4, 3, "advantage", 1, True),
+    (4, 3, "disadvantage", 2, False),
+    (10, 2, "normal", 1, True),
+])
+def test_dice_pmf_matches_brute_force(dice_size, dice_number, roll_type, drop_number,
+                                      highest):
+    expected = _brute_force(dice_size, dice_number, roll_type, drop_number, highest)
+    min_total, probs = dice_pmf(dice_size, dice_number, roll_type, drop_number, highest)
+    assert min_total == min(expected)
+    assert len(probs) == max(expected) - min(expected) + 1
+    for offset, prob in enumerate(probs):
+        assert prob == pytest.approx(float(expected.get(min_total + offset, 0)), abs=1e-12)
+
+
+def test_dice_pmf_is_read_only():
+    min_total, probs = dice_pmf(6, 2)
+    assert probs.sum() == pytest.approx(1.0)
+    with pytest.raises(ValueError):
+        probs[0] = 1.0
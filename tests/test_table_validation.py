@@ -0,0 +1,45 @@
+from functions.table_validation import validate_table, validate_tables
+import pandas as pd
+import pytest
+
+
+def _table(header, rolls, results=None):
+    results = results or [f"result {i}" for i in range(len(rolls))]
+    return pd.DataFrame({header: rolls, 'Result': results})
+
+
+def test_valid_table_has_no_problems():
+    assert validate_table(_table('d6', ['1-2', '3-4', '5-6']), name='ok') == []
+
+
+def test_ignored_rows_and_blank_first_cell_are_accepted():
+    assert validate_table(_table('d6', [None, '2-5', '-', '6']), name='ok') == []
+
+
+@pytest.mark.parametrize("table, expected", [
+    (pd.DataFrame({'d6': ['1-6']}), "must have at least 2 columns"),
+    (_table('Roll', ['1-6']), "is not a dice expression"),
+    (_table('d6', ['1-3', 'four', '5-6']), "Malformed cells: row 1: 'four'"),
+    (_table('d6', ['-', '-']), "has no usable rows"),
+    (_table('d6', ['1-3', '5-4', '6']), "range 5-4 is reversed"),
+    (_table('d6', ['1-3', '3-6']), "range 3-6 overlaps 1-3 in row 0"),
+    (_table('d6', ['1-2', '5-6', '3-4']), "range 3-4 is out of order"),
+    (_table('d6', ['1-2', '5-6']), "rolls 3-4 are not covered between rows 0 and 1"),
+    (_table('2d6', ['1-12']), "the first row starts at 1, but 2d6 rolls from 2"),
+    (_table('d6', ['1-3', '4-5']), "the last row ends at 5, but d6 rolls up to 6"),
+])
+def test_problems_are_reported(table, expected):
+    problems = validate_table(table, name='bad')
+    assert any(problem.startswith("bad: ") and expected in problem
+               for problem in problems), problems
+
+
+def test_every_malformed_cell_is_reported_once():
+    problems = validate_table(_table('d6', ['x', '2-6', 'y']), name='bad')
+    assert len(problems) == 1
+    assert "row 0: 'x'" in problems[0] and "row 2: 'y'" in problems[0]
+
+
+def test_validate_tables_leaves_out_sound_tables():
+    invalid = validate_tables({'ok': _table('d4', ['1-4']), 'bad': _table('d4', ['1-3'])})
+    assert list(invalid) == ['bad']